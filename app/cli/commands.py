@@ -10,6 +10,7 @@ from datetime import datetime
 
 import datetime
 import click
+import time
 import logging
 import json
 from typing import Optional, List
@@ -21,11 +22,12 @@ from app.database import (
     UserProgress, Tag, UserSettings, FavoriteContent, SessionLocal, engine, Base
 )
 from app.services.aggregator import ContentAggregator, update_all_content
-from app.services.recommender import ContentRecommender
 from app.services.exporter import ProgressExporter
 from app.services.email_sender import EmailSender
+from app.services.scheduler import FETCH, JobResult, JobScheduler
+from app.services import catch_up
 from app.config import settings
-from app.interactive import InteractiveMenu
+from app.core import fts
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +39,8 @@ def cli(ctx):
     """CLI агрегатора образовательного контента"""
     if ctx.invoked_subcommand is None:
         try:
+            # Imported here: the interactive menu is not needed by the other commands
+            from app.interactive import InteractiveMenu
             menu = InteractiveMenu()
             menu.run()
         except KeyboardInterrupt:
@@ -121,6 +125,55 @@ def update_content(user_id: Optional[int], keywords: Optional[str]) -> None:
     click.echo(f"Добавлено {count} новых элементов контента.")
 
 
+@cli.command()
+@click.argument('query')
+@click.option('--max-results', default=20, help='Максимальное количество результатов')
+def search(query: str, max_results: int) -> None:
+    """Полнотекстовый поиск по сохранённым статьям."""
+    aggregator = ContentAggregator()
+    matches = aggregator.search_content_with_snippets([query], max_results)
+    if not matches:
+        click.echo("Ничего не найдено.")
+        return
+    for i, (item, snippet) in enumerate(matches, 1):
+        click.echo(f"{i}. {item.title} ({item.platform})")
+        click.echo(f"   URL: {item.url}")
+        if snippet:
+            click.echo(f"   {fts.format_snippet(snippet, Style.BRIGHT, Style.NORMAL)}")
+
+
+@cli.command()
+def rebuild_search_index() -> None:
+    """Перестроить полнотекстовый индекс по всем статьям в БД."""
+    aggregator = ContentAggregator()
+    count = aggregator.rebuild_search_index()
+    click.echo(f"Проиндексировано статей: {count}")
+
+
+@cli.command()
+def rebuild_similarity_index() -> None:
+    """Перестроить индекс похожих статей (соседи по тегам и совместная встречаемость тегов)."""
+    aggregator = ContentAggregator()
+    count = aggregator.rebuild_similarity_index()
+    click.echo(f"Проиндексировано статей: {count}")
+
+
+@cli.command()
+def rebuild_duplicate_index() -> None:
+    """Пересчитать сигнатуры MinHash и группы почти одинаковых статей."""
+    aggregator = ContentAggregator()
+    count = aggregator.rebuild_duplicate_index()
+    click.echo(f"Найдено дубликатов: {count}")
+
+
+@cli.command()
+def rebuild_text_index() -> None:
+    """Перестроить текстовый TF-IDF индекс (похожие статьи по тексту)."""
+    aggregator = ContentAggregator()
+    count = aggregator.rebuild_text_index()
+    click.echo(f"Проиндексировано статей: {count}")
+
+
 @cli.command()
 @click.option('--user-id', type=int, required=True, help='ID пользователя')
 @click.option('--max-items', default=15, help='Максимальное количество элементов для показа')
@@ -153,6 +206,7 @@ def daily_digest(user_id: int, max_items: int) -> None:
 @click.option('--max', 'max_recs', default=5, help='Максимальное количество рекомендаций')
 def get_recommendations(user_id: int, max_recs: int) -> None:
     """Получить персональные рекомендации."""
+    from app.services.recommender import ContentRecommender  # NumPy: not needed by the other commands
     recommender = ContentRecommender()
     recs = recommender.get_recommendations(user_id, max_recs)
     click.echo(f"\n--- Рекомендации для пользователя {user_id} ---")
@@ -215,7 +269,7 @@ def send_digest(user_id: int, max_items: int = 15, test: bool = False) -> None:
         session.close()
         return
     aggregator = ContentAggregator()
-    digest = aggregator.get_daily_digest(user_id, max_items)
+    digest = aggregator.get_daily_digest(user_id, max_items, with_description=True)
     if not digest:
         click.echo("Интересы не найдены или нет нового контента по ним. Используем свежие материалы.")
         digest = aggregator.get_fallback_content(max_items)
@@ -240,29 +294,70 @@ def send_digest(user_id: int, max_items: int = 15, test: bool = False) -> None:
 
 
 @cli.command()
-@click.option('--interval', default=24, help='Интервал в часах')
-def run_scheduler(interval: int) -> None:
-    """Запустить планировщик для автоматических обновлений контента."""
-    click.echo(f"Запуск планировщика. Проверка каждые {interval} часов...")
-    import time
+@click.option('--workers', default=None, type=int, help='Количество параллельных задач')
+@click.option('--once', is_flag=True, help='Выполнить назначенные и пропущенные задачи и выйти')
+def run_scheduler(workers: Optional[int], once: bool) -> None:
+    """Запустить планировщик загрузок и дайджестов по расписанию пользователей."""
+    # Held for the scheduler's lifetime: no background catch-up starts while it runs jobs itself
+    scheduler_lock = catch_up.get_scheduler_lock()
+    if not scheduler_lock.acquire():
+        click.echo("Планировщик уже запущен другим процессом.")
+        return
+    scheduler = JobScheduler(workers=workers)
     try:
-        while True:
-            now = datetime.datetime.now()
-            click.echo(f"[{now}] Проверка условий обновления...")
-            aggregator = ContentAggregator()
-            results = aggregator.check_and_update_content_for_all_users()
-            if results:
-                total = sum(results.values())
-                click.echo(f"Обновление завершено. Добавлено: {total} элементов для {len(results)} пользователей")
-                for user_id, count in results.items():
-                    if count > 0:
-                        click.echo(f"  Пользователь {user_id}: {count} элементов")
-            else:
-                click.echo("Нет пользователей, требующих обновления контента")
-            click.echo(f"Ожидание {interval} часов до следующей проверки...")
-            time.sleep(interval * 3600)
+        # Missed jobs run under the catch-up lock, after a background catch-up already running
+        lock = catch_up.get_lock()
+        if not lock.acquire():
+            click.echo("Ожидание завершения фоновой догрузки...")
+            while not lock.acquire():
+                time.sleep(5)
+        try:
+            results = scheduler.run_pending()
+        finally:
+            lock.release()
+        for result in results:
+            _echo_job_result(result)
+        if once:
+            return
+        click.echo("Запуск планировщика: загрузки по auto_download_hour, дайджесты по digest_hour (UTC)...")
+        scheduler.run_forever(on_result=_echo_job_result)
     except KeyboardInterrupt:
+        scheduler.stop()
         click.echo("Планировщик остановлен.")
     except Exception as e:
         logger.error(f"Ошибка планировщика: {e}")
-        click.echo(f"Ошибка: {e}")
\ No newline at end of file
+        click.echo(f"Ошибка: {e}")
+    finally:
+        scheduler_lock.release()
+
+
+@cli.command('catch-up')
+@click.option('--report', is_flag=True, hidden=True, help='Сохранить итог для интерактивного меню')
+def catch_up_command(report: bool) -> None:
+    """Выполнить пропущенные загрузки и дайджесты (обычно запускается в фоне при старте)."""
+    results = catch_up.run(write_report=report)
+    if results is None:
+        if catch_up.scheduler_is_running():
+            click.echo("Задачи выполняет запущенный планировщик.")
+        else:
+            click.echo("Догрузка уже выполняется другим процессом.")
+        return
+    if not results:
+        click.echo("Пропущенных задач нет.")
+    for result in results:
+        _echo_job_result(result)
+
+
+def _echo_job_result(result: JobResult) -> None:
+    """Print a one-line summary of a finished scheduler job."""
+    now = datetime.datetime.now()
+    if not result.ok:
+        click.echo(f"[{now}] Ошибка задачи {result.kind} для пользователей {result.user_ids}: {result.error}")
+    elif result.kind == FETCH:
+        total = sum(len(titles) for titles in result.titles.values())
+        click.echo(f"[{now}] Загрузка завершена: {total} новых элементов для {len(result.user_ids)} пользователей")
+        for user_id, titles in result.titles.items():
+            if titles:
+                click.echo(f"  Пользователь {user_id}: {len(titles)} элементов")
+    else:
+        click.echo(f"[{now}] Дайджест обработан для пользователя {result.user_ids[0]}")
\ No newline at end of file
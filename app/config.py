@@ -15,16 +15,51 @@ class Settings(BaseSettings):
     # Database
     database_url: str = "sqlite:///content_aggregator.db"
 
+    # SQLite connection tuning (applied to every new connection)
+    sqlite_tuning_enabled: bool = True
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 268435456  # 256 MB
+    sqlite_cache_size: int = -65536  # negative = KiB, i.e. 64 MB
+    sqlite_temp_store: str = "MEMORY"
+    sqlite_busy_timeout_ms: int = 5000
+
     # Application settings
     daily_digest_hour: int = 9  # 9 AM
     content_update_interval_hours: int = 24
     max_recommendations_per_day: int = 5
+    similarity_neighbors: int = 20  # precomputed similar items kept per article
+    text_index_enabled: bool = True
+    text_index_path: str = ".cache/text_index"
+    duplicate_threshold: float = 0.7  # estimated shingle Jaccard above which articles are near-duplicates
+    feed_watermark_retention_days: int = 30  # marks of keywords not searched for this long are removed
 
     # Content source settings
     youtube_max_results: int = 50
     habr_max_articles: int = 30
     coursera_max_courses: int = 20
 
+    # Habr full-text download settings
+    habr_fetch_workers: int = 8
+    habr_max_connections_per_host: int = 4
+    habr_search_requests_per_second: float = 4.0
+    habr_shard_max_query_length: int = 200
+    habr_html_parser: str = "auto"  # auto (lxml if installed), lxml, html.parser
+    habr_parse_processes: int = 0  # 0 = number of CPU cores, 1 = parse in the main process
+    habr_parse_process_threshold: int = 8  # smaller batches are parsed in the main process
+
+    # Shared HTTP session (connection pool and retries)
+    http_pool_connections: int = 10
+    http_pool_maxsize: int = 16
+    http_max_retries: int = 3
+    http_backoff_factor: float = 0.5
+
+    # HTTP response cache (RSS feeds and article pages)
+    http_cache_enabled: bool = True
+    http_cache_path: str = ".cache/http_cache.sqlite"
+    http_cache_ttl_seconds: int = 3600
+    http_cache_max_mb: int = 200
+
     # Source configuration
     youtube_enabled: bool = True
     habr_enabled: bool = True
@@ -53,6 +88,21 @@ class Settings(BaseSettings):
     digest_max_items: int = 10
     digest_retry_days: int = 3
 
+    # Job scheduler (run-scheduler)
+    scheduler_workers: int = 4
+    scheduler_jobs_per_source: int = 1  # concurrent fetch batches per content source
+    scheduler_source_batches_per_minute: float = 2.0
+    scheduler_spread_minutes: int = 60  # per-user offset within the scheduled hour
+    scheduler_refresh_minutes: int = 10  # how often user settings are re-read
+    scheduler_retry_minutes: int = 15  # first retry delay, doubled on every failure
+    scheduler_max_attempts: int = 4
+    scheduler_lock_path: str = ".cache/scheduler.lock"  # held while run-scheduler is running
+
+    # Background catch-up of missed jobs on startup
+    catch_up_lock_path: str = ".cache/catch_up.lock"
+    catch_up_report_path: str = ".cache/catch_up_report.json"
+    catch_up_log_path: str = ".cache/catch_up.log"
+
     class Config:
             """
             Configuration for Pydantic settings.
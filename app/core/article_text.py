@@ -0,0 +1,16 @@
+"""
+Layout of extracted article text: the article body optionally followed by an extra materials block.
+"""
+
+import re
+
+EXTRA_MATERIALS_TITLE = '[ДОПОЛНИТЕЛЬНЫЕ МАТЕРИАЛЫ]'
+EXTRA_MATERIALS_HEADER = '\n\n' + '=' * 40 + '\n' + EXTRA_MATERIALS_TITLE + '\n' + '=' * 40 + '\n\n'
+# The header as it appears in stored text (blank lines around it may be collapsed)
+EXTRA_MATERIALS_PATTERN = re.compile(r'\n+=+\n' + re.escape(EXTRA_MATERIALS_TITLE) + r'\n=+\n')
+
+
+def strip_extra_materials(text: str) -> str:
+    """Return the article body of an extracted text, without the extra materials block."""
+    match = EXTRA_MATERIALS_PATTERN.search(text)
+    return text[:match.start()] if match else text
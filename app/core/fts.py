@@ -0,0 +1,148 @@
+"""
+SQLite FTS5 full-text index over content items (title, description, article body, tags).
+
+External content table: column values (for snippets and deletes) are read from
+the FTS_SOURCE view over content_items, so texts are not stored a second time.
+The view decompresses full_text with ARTICLE_BODY_FUNCTION, registered by the
+application on every SQLite connection. Entries are indexed from the view too,
+so they must be removed before the row changes.
+"""
+
+import logging
+import re
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy.exc import DBAPIError
+
+from app.core.sqlite_tables import BULK_QUERY_BATCH_SIZE, IndexTables
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'content_fts'
+FTS_SOURCE = 'content_fts_source'
+
+# SQL function: compressed full_text -> article body without the extra materials block
+ARTICLE_BODY_FUNCTION = 'article_body'
+
+# Control characters used to mark highlighted terms in snippets
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+# BM25 column weights: title, description, full_text, tags
+BM25_WEIGHTS = (10.0, 4.0, 1.0, 6.0)
+
+_COLUMNS = 'title, description, full_text, tags'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_tables = IndexTables([FTS_TABLE], "FTS5 недоступен, поиск будет использовать LIKE")
+
+
+def ensure_fts_table(connection) -> bool:
+    """Create the source view and FTS5 table if SQLite supports it. Returns True if full-text search is available."""
+    return _tables.ensure(connection, [
+        f"CREATE VIEW IF NOT EXISTS {FTS_SOURCE} AS "
+        f"SELECT c.id AS id, c.title AS title, c.description AS description, "
+        f"{ARTICLE_BODY_FUNCTION}(c.full_text) AS full_text, "
+        "(SELECT group_concat(t.name, ' ') FROM content_tags ct JOIN tags t ON t.id = ct.tag_id "
+        "WHERE ct.content_id = c.id) AS tags "
+        "FROM content_items c",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{_COLUMNS}, content = '{FTS_SOURCE}', content_rowid = 'id', "
+        "tokenize = 'unicode61 remove_diacritics 2')",
+    ])
+
+
+def drop_stored_content_table(connection) -> bool:
+    """Drop an FTS table of older versions that kept its own copy of the texts. Returns True if dropped."""
+    if connection.dialect.name != 'sqlite':
+        return False
+    row = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).first()
+    if row is None or re.search(r'\bcontent\s*=', row[0] or ''):
+        return False
+    connection.exec_driver_sql(f"DROP TABLE {FTS_TABLE}")
+    return True
+
+
+def is_enabled(connection) -> bool:
+    """Check whether the FTS5 table exists on this database."""
+    return _tables.is_enabled(connection)
+
+
+def is_empty(connection) -> bool:
+    """Check whether no item is indexed yet (the table itself reads rows from the view)."""
+    return connection.exec_driver_sql(f"SELECT 1 FROM {FTS_TABLE}_docsize LIMIT 1").first() is None
+
+
+def _for_ids(connection, statement: str, content_ids: Iterable[int]) -> None:
+    """Run a statement selecting from the source view for batches of content ids."""
+    content_ids = sorted(set(content_ids))
+    for start in range(0, len(content_ids), BULK_QUERY_BATCH_SIZE):
+        batch = content_ids[start:start + BULK_QUERY_BATCH_SIZE]
+        connection.exec_driver_sql(
+            f"{statement} WHERE id IN ({','.join('?' * len(batch))})", tuple(batch)
+        )
+
+
+def index_items(connection, content_ids: Iterable[int]) -> None:
+    """Index stored content items (new ones, or ones removed with remove_items before a change)."""
+    if is_enabled(connection):
+        _for_ids(connection, f"INSERT INTO {FTS_TABLE} (rowid, {_COLUMNS}) "
+                             f"SELECT id, {_COLUMNS} FROM {FTS_SOURCE}", content_ids)
+
+
+def remove_items(connection, content_ids: Iterable[int]) -> None:
+    """Remove index entries of content items; call before the rows are deleted or changed."""
+    if is_enabled(connection):
+        _for_ids(connection, f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {_COLUMNS}) "
+                             f"SELECT 'delete', id, {_COLUMNS} FROM {FTS_SOURCE}", content_ids)
+
+
+def rebuild(connection) -> int:
+    """Rebuild the whole index from the source view. Returns number of indexed items."""
+    if not is_enabled(connection):
+        return 0
+    connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+    return connection.exec_driver_sql(f"SELECT COUNT(*) FROM {FTS_TABLE}_docsize").scalar()
+
+
+def build_match_query(keywords: List[str]) -> Optional[str]:
+    """Build an FTS5 MATCH expression: words of a keyword are ANDed (prefix match), keywords are ORed."""
+    groups = []
+    for keyword in keywords:
+        tokens = _TOKEN_RE.findall((keyword or '').lower())
+        if tokens:
+            groups.append('(' + ' '.join(f'"{token}"*' for token in tokens) + ')')
+    return ' OR '.join(groups) if groups else None
+
+
+def search(connection, keywords: List[str], limit: int = 50) -> Optional[List[Tuple[int, str]]]:
+    """Search the index with BM25 ranking.
+
+    Returns (content_id, snippet) pairs, best match first, or None if the
+    index cannot be used and the caller should fall back to LIKE search.
+    """
+    if not is_enabled(connection):
+        return None
+    match_query = build_match_query(keywords)
+    if match_query is None:
+        return []
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    try:
+        rows = connection.exec_driver_sql(
+            f"SELECT rowid, snippet({FTS_TABLE}, -1, ?, ?, '…', 16) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH ? ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT ?",
+            (HIGHLIGHT_START, HIGHLIGHT_END, match_query, limit)
+        ).fetchall()
+    except DBAPIError as e:
+        logger.warning(f"Ошибка полнотекстового поиска ({match_query}): {e}")
+        return None
+    return [(row[0], row[1] or '') for row in rows]
+
+
+def format_snippet(snippet: str, start: str, end: str) -> str:
+    """Replace highlight markers in a snippet with display-specific markup."""
+    text = ' '.join(snippet.split())
+    return text.replace(HIGHLIGHT_START, start).replace(HIGHLIGHT_END, end)
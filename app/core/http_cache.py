@@ -0,0 +1,211 @@
+"""
+Persistent HTTP response cache with conditional GET support.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+from requests.exceptions import RequestException
+
+from app.config import settings
+from app.core.http_client import get_http_session
+
+logger = logging.getLogger(__name__)
+
+# Pending last-access updates are written once this many cache hits accumulate
+TOUCH_FLUSH_SIZE = 256
+
+
+class CachedResponse(NamedTuple):
+    """Cached response body with its validators."""
+    url: str
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+    def is_fresh(self, ttl_seconds: int) -> bool:
+        """Check whether the response can be served without revalidation."""
+        return time.time() - self.fetched_at < ttl_seconds
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Build If-None-Match / If-Modified-Since headers for revalidation."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """On-disk HTTP cache keyed by URL, stored in SQLite with zlib-compressed bodies.
+
+    Entries younger than ``ttl_seconds`` are served locally; older ones are
+    revalidated with a conditional GET. When the total size of stored bodies
+    exceeds ``max_bytes`` the least recently used entries are evicted. Cache
+    hits only record the access time in memory; the times are written with the
+    next store (before eviction) or once TOUCH_FLUSH_SIZE hits accumulate, so
+    reads never wait for a write transaction.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = 3600, max_bytes: int = 200 * 1024 * 1024):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT, last_modified TEXT, "
+            "fetched_at REAL NOT NULL, last_access REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """Return cached response for URL (fresh or stale) and mark it as recently used."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touched[url] = time.time()
+            if len(self._touched) >= TOUCH_FLUSH_SIZE:
+                self._flush_touched_locked()
+                self._conn.commit()
+        try:
+            body = zlib.decompress(row[0])
+        except zlib.error:
+            logger.warning(f"Повреждённая запись HTTP кэша для {url}, запись удалена")
+            self.delete(url)
+            return None
+        return CachedResponse(url, body, row[1], row[2], row[3])
+
+    def store(self, url: str, body: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """Store response body with validators, evicting old entries if the size limit is exceeded."""
+        compressed = zlib.compress(body, 6)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (url, body, etag, last_modified, fetched_at, last_access, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, compressed, etag, last_modified, now, now, len(compressed))
+            )
+            self._touched.pop(url, None)
+            self._flush_touched_locked()
+            self._evict_locked()
+            self._conn.commit()
+
+    def refresh(self, url: str) -> None:
+        """Mark cached entry as revalidated (after 304 Not Modified)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET fetched_at = ?, last_access = ? WHERE url = ?", (now, now, url)
+            )
+            self._conn.commit()
+
+    def delete(self, url: str) -> None:
+        """Remove a single entry from the cache."""
+        with self._lock:
+            self._touched.pop(url, None)
+            self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Remove all cached responses."""
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def _flush_touched_locked(self) -> None:
+        """Write last-access times recorded by cache hits."""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE responses SET last_access = ? WHERE url = ?",
+                [(accessed_at, url) for url, accessed_at in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _evict_locked(self) -> None:
+        """Delete least recently used entries until total size fits into max_bytes."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT url, size FROM responses ORDER BY last_access ASC").fetchall()
+        to_delete = []
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            to_delete.append((url,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE url = ?", to_delete)
+        logger.debug(f"HTTP кэш: вытеснено {len(to_delete)} записей")
+
+
+_cache: Optional[HttpCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> Optional[HttpCache]:
+    """Return the shared HTTP cache instance, or None if caching is disabled."""
+    global _cache
+    if not settings.http_cache_enabled:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = HttpCache(
+                    settings.http_cache_path,
+                    ttl_seconds=settings.http_cache_ttl_seconds,
+                    max_bytes=settings.http_cache_max_mb * 1024 * 1024,
+                )
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"HTTP кэш недоступен ({settings.http_cache_path}): {e}")
+                return None
+        return _cache
+
+
+def cached_get(url: str, headers: Optional[Dict[str, str]] = None, timeout: int = 10) -> Optional[bytes]:
+    """GET URL through the persistent cache.
+
+    Returns response body, or None if the server answered with a non-200 status.
+    Network errors are raised unless a stale cached copy can be served instead.
+    """
+    cache = get_http_cache()
+    cached = cache.get(url) if cache else None
+    if cached and cached.is_fresh(cache.ttl_seconds):
+        return cached.body
+
+    request_headers = dict(headers or {})
+    if cached:
+        request_headers.update(cached.conditional_headers())
+
+    try:
+        response = get_http_session().get(url, headers=request_headers, timeout=timeout)
+    except RequestException as e:
+        if cached:
+            logger.warning(f"Ошибка запроса {url}: {e}, используется копия из кэша")
+            return cached.body
+        raise
+
+    if response.status_code == 304 and cached:
+        cache.refresh(url)
+        return cached.body
+    if response.status_code != 200:
+        return None
+
+    body = response.content
+    if cache:
+        cache.store(url, body, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return body
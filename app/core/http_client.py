@@ -0,0 +1,97 @@
+"""
+Shared HTTP session with connection pooling, keep-alive and retry/backoff.
+"""
+
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+from app.config import settings
+
+DEFAULT_USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+)
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    """Thread-safe limiter spacing out calls to at most ``rate_per_second`` per second."""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self) -> None:
+        """Block until the caller is allowed to perform the next request."""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def create_http_session() -> requests.Session:
+    """Create a requests.Session with a tuned connection pool and retry policy.
+
+    Retries use exponential backoff on connection errors and 429/5xx responses
+    (honouring Retry-After). Accept-Encoding advertises brotli/zstd only when
+    urllib3 can decode them.
+    """
+    retry = Retry(
+        total=settings.http_max_retries,
+        connect=settings.http_max_retries,
+        read=settings.http_max_retries,
+        status=settings.http_max_retries,
+        backoff_factor=settings.http_backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    pool_size = max(settings.http_pool_maxsize, settings.habr_fetch_workers)
+    adapter = HTTPAdapter(
+        pool_connections=settings.http_pool_connections,
+        pool_maxsize=pool_size,
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': DEFAULT_USER_AGENT,
+        'Accept-Encoding': ACCEPT_ENCODING,
+        'Connection': 'keep-alive',
+    })
+    return session
+
+
+def get_http_session() -> requests.Session:
+    """Return the process-wide HTTP session shared by all content sources."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_http_session()
+        return _session
+
+
+def close_http_session() -> None:
+    """Close the shared session and release pooled connections."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,121 @@
+"""
+Inter-process lock backed by an OS file lock.
+
+The lock is an exclusive ``fcntl.flock`` (``msvcrt.locking`` on Windows) on a
+lock file that is never removed, so taking it is a single atomic call and two
+processes can never both win. The operating system drops the lock when its
+owner exits or dies, so there is no stale lock to take over. The file holds the
+owner's pid for diagnostics. ``acquire`` can wait for the lock, and the lock
+works as a context manager that waits as long as it takes.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import IO, Optional
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+logger = logging.getLogger(__name__)
+
+# Seconds between attempts of a waiting acquire()
+POLL_INTERVAL = 0.05
+
+
+def _try_lock(f: IO) -> bool:
+    """Take an exclusive lock on an open file without blocking."""
+    try:
+        if os.name == 'nt':
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(f: IO) -> None:
+    if os.name == 'nt':
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class LockFile:
+    """Non-blocking lock shared by processes through a file (see module docstring)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file: Optional[IO] = None
+        self._guard = threading.Lock()
+
+    def _open(self) -> IO:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        return open(self.path, 'a+', encoding='utf-8')
+
+    def is_locked(self) -> bool:
+        """Check whether a process (this one included) holds the lock."""
+        if self._file is not None:
+            return True
+        if not self.path.exists():
+            return False
+        with self._open() as f:
+            if not _try_lock(f):
+                return True
+            _unlock(f)
+            return False
+
+    def _try_acquire(self) -> bool:
+        with self._guard:
+            if self._file is not None:
+                return False
+            f = self._open()
+            if not _try_lock(f):
+                f.close()
+                return False
+            f.seek(0)
+            f.truncate()
+            json.dump({'pid': os.getpid(), 'started_at': time.time()}, f)
+            f.flush()
+            self._file = f
+            return True
+
+    def acquire(self, timeout: Optional[float] = 0.0) -> bool:
+        """Take the lock, waiting up to ``timeout`` seconds (None: as long as it takes).
+
+        Returns False if another holder kept it for the whole time.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._try_acquire():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(POLL_INTERVAL)
+        return True
+
+    def __enter__(self) -> 'LockFile':
+        self.acquire(timeout=None)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    def release(self) -> None:
+        """Release the lock if this process holds it."""
+        with self._guard:
+            if self._file is None:
+                return
+            try:
+                _unlock(self._file)
+            except OSError as e:
+                logger.warning(f"Не удалось снять блокировку {self.path}: {e}")
+            finally:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,184 @@
+"""
+Near-duplicate detection: word-shingle MinHash signatures and an LSH band index in SQLite.
+"""
+
+import logging
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.article_text import strip_extra_materials
+from app.core.sqlite_tables import BULK_QUERY_BATCH_SIZE, IndexTables
+
+logger = logging.getLogger(__name__)
+
+LSH_TABLE = 'content_lsh'
+
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+
+# Words per shingle
+SHINGLE_SIZE = 3
+
+# Universal hashing (a * x + b) mod p; a < 2^31 and x < 2^32 keep the product within uint64
+_PRIME = np.uint64(4294967311)
+_rng = np.random.RandomState(20240601)  # fixed: stored signatures must stay comparable
+_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+
+WORD_PATTERN = re.compile(r'\w+')
+
+_tables = IndexTables([LSH_TABLE], "Индекс дубликатов недоступен")
+
+
+def document_text(title: Optional[str], description: Optional[str], full_text: Optional[str]) -> str:
+    """Text compared for duplicates: title and article body (description when there is no full text).
+
+    The extra materials block is left out: it repeats across Habr pages and
+    would make unrelated short articles look like duplicates.
+    """
+    body = strip_extra_materials(full_text) if full_text else None
+    return '\n'.join(part for part in (title, body or description) if part)
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """Hashes of the distinct word n-grams of a text."""
+    words = WORD_PATTERN.findall(text.lower().replace('ё', 'е'))
+    if len(words) < SHINGLE_SIZE:
+        grams = [' '.join(words)] if words else []
+    else:
+        grams = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+def signature(text: str) -> Optional[bytes]:
+    """MinHash signature (NUM_PERM uint32 values) of a text, or None for an empty text."""
+    hashes = shingle_hashes(text or '')
+    if not len(hashes):
+        return None
+    minimums = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    # Chunked so long articles don't allocate a huge (shingles x permutations) matrix
+    for start in range(0, len(hashes), 4096):
+        chunk = hashes[start:start + 4096, None]
+        np.minimum(minimums, ((chunk * _A + _B) % _PRIME).min(axis=0), out=minimums)
+    return minimums.astype(np.uint32).tobytes()
+
+
+def similarity(signature_a: bytes, signature_b: bytes) -> float:
+    """Estimated Jaccard similarity of two texts from their signatures."""
+    a = np.frombuffer(signature_a, dtype=np.uint32)
+    b = np.frombuffer(signature_b, dtype=np.uint32)
+    return float(np.mean(a == b))
+
+
+def band_keys(sig: bytes) -> List[Tuple[int, int]]:
+    """(band, bucket) pairs of a signature; texts sharing any pair are duplicate candidates."""
+    width = ROWS_PER_BAND * 4
+    return [(band, zlib.crc32(sig[band * width:(band + 1) * width])) for band in range(BANDS)]
+
+
+def ensure_table(connection) -> bool:
+    """Create the LSH band table on SQLite. Returns True if the index is available."""
+    return _tables.ensure(connection, [
+        f"CREATE TABLE IF NOT EXISTS {LSH_TABLE} ("
+        "band INTEGER NOT NULL, bucket INTEGER NOT NULL, content_id INTEGER NOT NULL, "
+        "PRIMARY KEY (bucket, band, content_id)) WITHOUT ROWID"
+    ])
+
+
+def is_enabled(connection) -> bool:
+    """Check whether the LSH table exists on this database."""
+    return _tables.is_enabled(connection)
+
+
+def is_empty(connection) -> bool:
+    """Check whether the band table has no rows yet."""
+    return _tables.is_empty(connection)
+
+
+def clear(connection) -> None:
+    """Remove all band rows."""
+    _tables.clear(connection)
+
+
+def remove_items(connection, content_ids: Iterable[int]) -> None:
+    """Remove deleted items from the band table."""
+    params = [(content_id,) for content_id in content_ids]
+    if params and is_enabled(connection):
+        connection.exec_driver_sql(f"DELETE FROM {LSH_TABLE} WHERE content_id = ?", params)
+
+
+def _stored_candidates(connection, keys: Set[Tuple[int, int]]) -> Dict[Tuple[int, int], List[int]]:
+    """Content ids stored under the given (band, bucket) keys."""
+    found: Dict[Tuple[int, int], List[int]] = {}
+    buckets = sorted({bucket for _, bucket in keys})
+    for start in range(0, len(buckets), BULK_QUERY_BATCH_SIZE):
+        batch = buckets[start:start + BULK_QUERY_BATCH_SIZE]
+        for band, bucket, content_id in connection.exec_driver_sql(
+            f"SELECT band, bucket, content_id FROM {LSH_TABLE} "
+            f"WHERE bucket IN ({','.join('?' * len(batch))})", tuple(batch)
+        ).fetchall():
+            if (band, bucket) in keys:
+                found.setdefault((band, bucket), []).append(content_id)
+    return found
+
+
+def _stored_signatures(connection, content_ids: Iterable[int]) -> Dict[int, Tuple[bytes, Optional[int]]]:
+    """(signature, duplicate_of) of stored items."""
+    content_ids = sorted(set(content_ids))
+    rows = {}
+    for start in range(0, len(content_ids), BULK_QUERY_BATCH_SIZE):
+        batch = content_ids[start:start + BULK_QUERY_BATCH_SIZE]
+        for content_id, sig, duplicate_of in connection.exec_driver_sql(
+            f"SELECT id, minhash, duplicate_of FROM content_items "
+            f"WHERE id IN ({','.join('?' * len(batch))}) AND minhash IS NOT NULL", tuple(batch)
+        ).fetchall():
+            rows[content_id] = (sig, duplicate_of)
+    return rows
+
+
+def index_items(connection, items: List[Tuple[int, bytes]], threshold: float = 0.8) -> Dict[int, int]:
+    """Add (content id, signature) pairs to the band index and detect near-duplicates.
+
+    Items are processed in the given order (oldest first), so every cluster
+    is represented by its first item. Returns content id -> representative
+    id for the items that duplicate an earlier one.
+    """
+    if not items or not is_enabled(connection):
+        return {}
+
+    item_keys = {content_id: band_keys(sig) for content_id, sig in items}
+    stored = _stored_candidates(connection, {key for keys in item_keys.values() for key in keys})
+    known = _stored_signatures(connection, {cid for ids in stored.values() for cid in ids})
+
+    duplicates: Dict[int, int] = {}
+    batch_buckets: Dict[Tuple[int, int], List[int]] = {}
+    for content_id, sig in items:
+        candidates = set()
+        for key in item_keys[content_id]:
+            candidates.update(stored.get(key, ()))
+            candidates.update(batch_buckets.get(key, ()))
+        candidates.discard(content_id)
+
+        best_id, best_score = None, threshold
+        for candidate in sorted(candidates):
+            if candidate not in known:
+                continue
+            score = similarity(sig, known[candidate][0])
+            if score >= best_score and (best_id is None or score > best_score):
+                best_id, best_score = candidate, score
+        if best_id is not None:
+            duplicates[content_id] = known[best_id][1] or best_id
+
+        known[content_id] = (sig, duplicates.get(content_id))
+        for key in item_keys[content_id]:
+            batch_buckets.setdefault(key, []).append(content_id)
+
+    connection.exec_driver_sql(
+        f"INSERT OR IGNORE INTO {LSH_TABLE} (band, bucket, content_id) VALUES (?, ?, ?)",
+        [(band, bucket, content_id) for content_id, keys in item_keys.items() for band, bucket in keys]
+    )
+    return duplicates
@@ -0,0 +1,83 @@
+"""
+Process pool for CPU-bound work (HTML parsing) that would otherwise serialize on the GIL.
+
+One pool is kept for the life of the process and started with the ``spawn``
+method: workers are started once instead of on every batch, and forking a
+process with running threads (scheduler workers, HTTP downloads) is avoided.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pickle import PicklingError
+from typing import Any, Callable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def resolve_process_count(configured: int) -> int:
+    """Return number of worker processes: the configured value, or the CPU core count for 0."""
+    if configured > 0:
+        return configured
+    return os.cpu_count() or 1
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the shared pool, started on first use with ``workers`` processes."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool, so the next batch starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def shutdown_pool() -> None:
+    """Stop the worker processes of the shared pool."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def map_cpu_bound(func: Callable[[Any], Any], payloads: Iterable[Any],
+                  processes: int = 0, min_batch: int = 1) -> List[Any]:
+    """Apply a module-level function to picklable payloads, preserving order.
+
+    Work runs in the shared process pool when there is more than one core and
+    the batch has at least ``min_batch`` payloads; small batches, single-core
+    machines and pool failures fall back to the current process. The pool is
+    sized by the first call that starts it.
+    """
+    payloads = list(payloads)
+    workers = resolve_process_count(processes)
+    if workers > 1 and len(payloads) >= max(2, min_batch):
+        pool = None
+        try:
+            pool = _get_pool(workers)
+            chunksize = max(1, len(payloads) // (min(_pool_workers, len(payloads)) * 4))
+            return list(pool.map(func, payloads, chunksize=chunksize))
+        except (BrokenProcessPool, OSError, PicklingError) as e:
+            logger.warning(f"Пул процессов недоступен ({e}), обработка в текущем процессе")
+            if pool is not None:
+                _discard_pool(pool)
+    return [func(payload) for payload in payloads]
@@ -0,0 +1,322 @@
+"""
+Materialized item-to-item similarity (Jaccard over tags) and tag co-occurrence index.
+"""
+
+import logging
+from collections import Counter
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.sqlite_tables import BULK_QUERY_BATCH_SIZE, IndexTables
+
+logger = logging.getLogger(__name__)
+
+NEIGHBORS_TABLE = 'content_neighbors'
+COOCCURRENCE_TABLE = 'tag_cooccurrence'
+
+# Only the most recent items of very popular tags are compared, to bound the cost per item
+MAX_TAG_POSTINGS = 5000
+
+_tables = IndexTables([NEIGHBORS_TABLE, COOCCURRENCE_TABLE], "Индекс похожих статей недоступен")
+
+
+def ensure_tables(connection) -> bool:
+    """Create the index tables on SQLite. Returns True if the index is available."""
+    return _tables.ensure(connection, [
+        f"CREATE TABLE IF NOT EXISTS {NEIGHBORS_TABLE} ("
+        "content_id INTEGER NOT NULL, neighbor_id INTEGER NOT NULL, score REAL NOT NULL, "
+        "PRIMARY KEY (content_id, neighbor_id))",
+        f"CREATE TABLE IF NOT EXISTS {COOCCURRENCE_TABLE} ("
+        "tag_id INTEGER NOT NULL, other_tag_id INTEGER NOT NULL, count INTEGER NOT NULL, "
+        "PRIMARY KEY (tag_id, other_tag_id))",
+    ])
+
+
+def is_enabled(connection) -> bool:
+    """Check whether the index tables exist on this database."""
+    return _tables.is_enabled(connection)
+
+
+def is_empty(connection) -> bool:
+    """Check whether the neighbour table has no rows yet."""
+    return _tables.is_empty(connection)
+
+
+def _int_matrix(rows) -> np.ndarray:
+    """Convert two-column integer result rows into an (n x 2) array."""
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=2 * len(rows)).reshape(-1, 2)
+
+
+def _load_postings(connection, tag_ids: Optional[List[int]] = None) -> Dict[int, np.ndarray]:
+    """Return tag id -> sorted content ids (capped to the most recent MAX_TAG_POSTINGS)."""
+    if tag_ids is not None:
+        # The cap is applied in SQL, reading at most MAX_TAG_POSTINGS index entries per tag
+        postings = {}
+        for tag_id in tag_ids:
+            content_ids = [row[0] for row in connection.exec_driver_sql(
+                "SELECT content_id FROM content_tags WHERE tag_id = ? ORDER BY content_id DESC LIMIT ?",
+                (tag_id, MAX_TAG_POSTINGS)
+            )]
+            if content_ids:
+                postings[tag_id] = np.array(content_ids[::-1], dtype=np.int64)
+        return postings
+
+    rows = connection.exec_driver_sql("SELECT tag_id, content_id FROM content_tags").fetchall()
+    if not rows:
+        return {}
+
+    pairs = _int_matrix(rows)
+    pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+    tags, starts = np.unique(pairs[:, 0], return_index=True)
+    postings = {}
+    for tag_id, content_ids in zip(tags, np.split(pairs[:, 1], starts[1:])):
+        postings[int(tag_id)] = content_ids[-MAX_TAG_POSTINGS:]
+    return postings
+
+
+def _load_tag_counts(connection, content_ids: Optional[List[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (content ids, number of tags) arrays sorted by content id, for all or the given items."""
+    if content_ids is None:
+        rows = connection.exec_driver_sql(
+            "SELECT content_id, COUNT(*) FROM content_tags GROUP BY content_id ORDER BY content_id"
+        ).fetchall()
+    else:
+        rows = []
+        for start in range(0, len(content_ids), BULK_QUERY_BATCH_SIZE):
+            batch = content_ids[start:start + BULK_QUERY_BATCH_SIZE]
+            rows.extend(connection.exec_driver_sql(
+                f"SELECT content_id, COUNT(*) FROM content_tags "
+                f"WHERE content_id IN ({','.join('?' * len(batch))}) GROUP BY content_id ORDER BY content_id",
+                tuple(batch)
+            ).fetchall())
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    counts = _int_matrix(rows)
+    return counts[:, 0], counts[:, 1]
+
+
+def _similarities(content_id: int, tag_ids: List[int], postings: Dict[int, np.ndarray],
+                  count_ids: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Jaccard similarity of one item's tag set to every item sharing a tag with it."""
+    lists = [postings[tag_id] for tag_id in tag_ids if tag_id in postings]
+    if not lists:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    candidates, shared = np.unique(np.concatenate(lists), return_counts=True)
+    keep = candidates != content_id
+    candidates, shared = candidates[keep], shared[keep]
+    sizes = counts[np.searchsorted(count_ids, candidates)]
+    return candidates, shared / (len(tag_ids) + sizes - shared)
+
+
+def _top_k(candidates: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """Return the k best (id, score) pairs, best first (ties by lower id)."""
+    if len(scores) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        candidates, scores = candidates[part], scores[part]
+    order = np.lexsort((candidates, -scores))
+    return [(int(candidates[i]), float(scores[i])) for i in order]
+
+
+def _cooccurrence_counts(item_tags: Dict[int, List[int]]) -> Counter:
+    """Count ordered tag pairs appearing together on the same item."""
+    pairs = Counter()
+    for tag_ids in item_tags.values():
+        unique_tags = sorted(set(tag_ids))
+        for a in unique_tags:
+            for b in unique_tags:
+                if a != b:
+                    pairs[(a, b)] += 1
+    return pairs
+
+
+def update_for_items(connection, item_tags: Dict[int, List[int]], k: int = 20) -> int:
+    """Add newly inserted items (content id -> tag ids) to the index.
+
+    Computes neighbours of the new items and inserts each new item into the
+    neighbour lists of its neighbours when it beats their current k-th entry.
+    Returns number of indexed items.
+    """
+    item_tags = {content_id: tags for content_id, tags in item_tags.items() if tags}
+    if not item_tags or not is_enabled(connection):
+        return 0
+
+    pairs = _cooccurrence_counts(item_tags)
+    if pairs:
+        connection.exec_driver_sql(
+            f"INSERT INTO {COOCCURRENCE_TABLE} (tag_id, other_tag_id, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (tag_id, other_tag_id) DO UPDATE SET count = count + excluded.count",
+            [(a, b, count) for (a, b), count in pairs.items()]
+        )
+
+    postings = _load_postings(connection, sorted({tag for tags in item_tags.values() for tag in tags}))
+    candidate_ids = np.unique(np.concatenate(list(postings.values()))) if postings else np.empty(0, dtype=np.int64)
+    count_ids, counts = _load_tag_counts(connection, candidate_ids.tolist())
+    new_ids = np.array(sorted(item_tags), dtype=np.int64)
+    neighbors = {}
+    targets, sources, target_scores = [], [], []
+    for content_id, tags in item_tags.items():
+        candidates, scores = _similarities(content_id, tags, postings, count_ids, counts)
+        neighbors[content_id] = _top_k(candidates, scores, k)
+        # Reverse direction: the new item may enter the lists of existing items
+        existing = ~np.isin(candidates, new_ids)
+        targets.append(candidates[existing])
+        sources.append(np.full(int(existing.sum()), content_id, dtype=np.int64))
+        target_scores.append(scores[existing])
+
+    connection.exec_driver_sql(
+        f"DELETE FROM {NEIGHBORS_TABLE} WHERE content_id = ?", [(content_id,) for content_id in neighbors]
+    )
+    rows = [(content_id, neighbor_id, score)
+            for content_id, items in neighbors.items() for neighbor_id, score in items]
+    if rows:
+        connection.exec_driver_sql(
+            f"INSERT INTO {NEIGHBORS_TABLE} (content_id, neighbor_id, score) VALUES (?, ?, ?)", rows
+        )
+
+    targets = np.concatenate(targets)
+    if not len(targets):
+        return len(neighbors)
+    sources, target_scores = np.concatenate(sources), np.concatenate(target_scores)
+
+    touched = np.unique(targets).tolist()
+    sizes = np.zeros(len(touched), dtype=np.int64)
+    worst = np.zeros(len(touched))
+    for start in range(0, len(touched), BULK_QUERY_BATCH_SIZE):
+        batch = touched[start:start + BULK_QUERY_BATCH_SIZE]
+        stats = connection.exec_driver_sql(
+            f"SELECT content_id, COUNT(*), MIN(score) FROM {NEIGHBORS_TABLE} "
+            f"WHERE content_id IN ({','.join('?' * len(batch))}) GROUP BY content_id",
+            tuple(batch)
+        ).fetchall()
+        if stats:
+            positions = np.searchsorted(touched, [row[0] for row in stats])
+            sizes[positions] = [row[1] for row in stats]
+            worst[positions] = [row[2] for row in stats]
+
+    # New ids are the highest, so on equal scores the existing entry wins, as in rebuild()
+    positions = np.searchsorted(touched, targets)
+    accepted = (sizes[positions] < k) | (target_scores > worst[positions])
+    # At most k of the new items can enter any one list
+    order = np.flatnonzero(accepted)
+    order = order[np.lexsort((sources[order], -target_scores[order], targets[order]))]
+    group_starts = np.searchsorted(targets[order], targets[order], side='left')
+    accepted = np.zeros(len(targets), dtype=bool)
+    accepted[order[np.arange(len(order)) - group_starts < k]] = True
+    if accepted.any():
+        connection.exec_driver_sql(
+            f"INSERT OR REPLACE INTO {NEIGHBORS_TABLE} (content_id, neighbor_id, score) VALUES (?, ?, ?)",
+            list(zip(targets[accepted].tolist(), sources[accepted].tolist(), target_scores[accepted].tolist()))
+        )
+        added = np.bincount(positions[accepted], minlength=len(touched))
+        overfull = np.flatnonzero(sizes + added > k)
+        if len(overfull):
+            connection.exec_driver_sql(
+                f"DELETE FROM {NEIGHBORS_TABLE} WHERE content_id = ? AND neighbor_id NOT IN ("
+                f"SELECT neighbor_id FROM {NEIGHBORS_TABLE} WHERE content_id = ? "
+                "ORDER BY score DESC, neighbor_id LIMIT ?)",
+                [(touched[i], touched[i], k) for i in overfull.tolist()]
+            )
+    return len(neighbors)
+
+
+def rebuild(connection, k: int = 20) -> int:
+    """Rebuild the whole index from content_tags. Returns number of indexed items."""
+    if not is_enabled(connection):
+        return 0
+    _tables.clear(connection)
+    connection.exec_driver_sql(
+        f"INSERT INTO {COOCCURRENCE_TABLE} (tag_id, other_tag_id, count) "
+        "SELECT a.tag_id, b.tag_id, COUNT(*) FROM content_tags a "
+        "JOIN content_tags b ON a.content_id = b.content_id AND a.tag_id != b.tag_id "
+        "GROUP BY a.tag_id, b.tag_id"
+    )
+
+    postings = _load_postings(connection)
+    count_ids, counts = _load_tag_counts(connection)
+    item_tags: Dict[int, List[int]] = {}
+    for content_id, tag_id in connection.exec_driver_sql("SELECT content_id, tag_id FROM content_tags"):
+        item_tags.setdefault(content_id, []).append(tag_id)
+
+    rows = []
+    for content_id, tag_ids in item_tags.items():
+        candidates, scores = _similarities(content_id, tag_ids, postings, count_ids, counts)
+        rows.extend((content_id, neighbor_id, score) for neighbor_id, score in _top_k(candidates, scores, k))
+        if len(rows) >= 10000:
+            connection.exec_driver_sql(
+                f"INSERT INTO {NEIGHBORS_TABLE} (content_id, neighbor_id, score) VALUES (?, ?, ?)", rows
+            )
+            rows = []
+    if rows:
+        connection.exec_driver_sql(
+            f"INSERT INTO {NEIGHBORS_TABLE} (content_id, neighbor_id, score) VALUES (?, ?, ?)", rows
+        )
+    return len(item_tags)
+
+
+def remove_items(connection, content_ids: Iterable[int]) -> None:
+    """Remove items from the neighbour lists and their tag pairs from the co-occurrence counts.
+
+    Call while the items' content_tags rows still exist.
+    """
+    content_ids = sorted(set(content_ids))
+    if not content_ids or not is_enabled(connection):
+        return
+    item_tags: Dict[int, List[int]] = {}
+    for start in range(0, len(content_ids), BULK_QUERY_BATCH_SIZE):
+        batch = content_ids[start:start + BULK_QUERY_BATCH_SIZE]
+        for content_id, tag_id in connection.exec_driver_sql(
+            f"SELECT content_id, tag_id FROM content_tags WHERE content_id IN ({','.join('?' * len(batch))})",
+            tuple(batch)
+        ):
+            item_tags.setdefault(content_id, []).append(tag_id)
+    pairs = _cooccurrence_counts(item_tags)
+    if pairs:
+        connection.exec_driver_sql(
+            f"UPDATE {COOCCURRENCE_TABLE} SET count = count - ? WHERE tag_id = ? AND other_tag_id = ?",
+            [(count, a, b) for (a, b), count in pairs.items()]
+        )
+        connection.exec_driver_sql(
+            f"DELETE FROM {COOCCURRENCE_TABLE} WHERE tag_id = ? AND other_tag_id = ? AND count <= 0",
+            list(pairs)
+        )
+    connection.exec_driver_sql(
+        f"DELETE FROM {NEIGHBORS_TABLE} WHERE content_id = ? OR neighbor_id = ?",
+        [(content_id, content_id) for content_id in content_ids]
+    )
+
+
+def neighbors(connection, content_ids: Iterable[int]) -> List[Tuple[int, int, float]]:
+    """Return (seed id, neighbour id, score) rows for the given seed items, best first per seed."""
+    content_ids = sorted(set(content_ids))
+    if not content_ids or not is_enabled(connection):
+        return []
+    rows = []
+    for start in range(0, len(content_ids), BULK_QUERY_BATCH_SIZE):
+        batch = content_ids[start:start + BULK_QUERY_BATCH_SIZE]
+        rows.extend(tuple(row) for row in connection.exec_driver_sql(
+            f"SELECT content_id, neighbor_id, score FROM {NEIGHBORS_TABLE} "
+            f"WHERE content_id IN ({','.join('?' * len(batch))}) ORDER BY content_id, score DESC",
+            tuple(batch)
+        ))
+    return rows
+
+
+def related_tags(connection, tag_ids: Iterable[int], limit: int = 20) -> List[int]:
+    """Return tags that most often co-occur with the given ones (excluding them), most frequent first."""
+    tag_ids = sorted(set(tag_ids))
+    if not tag_ids or not is_enabled(connection):
+        return []
+    totals = Counter()
+    for start in range(0, len(tag_ids), BULK_QUERY_BATCH_SIZE):
+        batch = tag_ids[start:start + BULK_QUERY_BATCH_SIZE]
+        for other_tag_id, count in connection.exec_driver_sql(
+            f"SELECT other_tag_id, SUM(count) FROM {COOCCURRENCE_TABLE} "
+            f"WHERE tag_id IN ({','.join('?' * len(batch))}) GROUP BY other_tag_id",
+            tuple(batch)
+        ):
+            totals[other_tag_id] += count
+    for tag_id in tag_ids:
+        totals.pop(tag_id, None)
+    return [tag_id for tag_id, _ in totals.most_common(limit)]
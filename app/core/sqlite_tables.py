@@ -0,0 +1,62 @@
+"""
+Helper tables of the SQLite-only indexes (full-text, similarity, duplicates) and shared query limits.
+"""
+
+import logging
+from typing import List, Optional, Sequence
+
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+# Max number of bound parameters per IN query (SQLite default limit is 999)
+BULK_QUERY_BATCH_SIZE = 400
+
+
+class IndexTables:
+    """Tables backing one index; whether they exist is checked once per process.
+
+    The first table is the one probed in sqlite_master and checked for rows.
+    Other databases have no such tables and the index reports itself disabled.
+    """
+
+    def __init__(self, tables: Sequence[str], unavailable_message: str):
+        self.tables: List[str] = list(tables)
+        self.unavailable_message = unavailable_message
+        self._enabled: Optional[bool] = None
+
+    def ensure(self, connection, statements: Sequence[str]) -> bool:
+        """Run the CREATE statements on SQLite. Returns True if the index is available."""
+        if connection.dialect.name != 'sqlite':
+            self._enabled = False
+            return False
+        try:
+            for statement in statements:
+                connection.exec_driver_sql(statement)
+            self._enabled = True
+        except DBAPIError as e:
+            logger.warning(f"{self.unavailable_message}: {e}")
+            self._enabled = False
+        return self._enabled
+
+    def is_enabled(self, connection) -> bool:
+        """Check whether the tables exist on this database."""
+        if self._enabled is None:
+            if connection.dialect.name != 'sqlite':
+                self._enabled = False
+            else:
+                row = connection.exec_driver_sql(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.tables[0],)
+                ).first()
+                self._enabled = row is not None
+        return self._enabled
+
+    def is_empty(self, connection) -> bool:
+        """Check whether the main table has no rows yet."""
+        return connection.exec_driver_sql(f"SELECT 1 FROM {self.tables[0]} LIMIT 1").first() is None
+
+    def clear(self, connection) -> None:
+        """Remove all rows (before a full rebuild)."""
+        if self.is_enabled(connection):
+            for table in self.tables:
+                connection.exec_driver_sql(f"DELETE FROM {table}")
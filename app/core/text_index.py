@@ -0,0 +1,436 @@
+"""
+TF-IDF text index over article title, description and full text.
+
+Vectors are stored as memory-mapped NumPy arrays in segment directories:
+each segment keeps document rows (CSR: ids, indptr, terms, weights) and the
+transposed term postings (CSC) used to answer "more like this" queries
+without scanning every document. New documents go to a small delta segment
+that is merged into the main one when it grows. Deleted documents are listed
+in the manifest and skipped until a merge drops their rows. Writers from different
+processes are serialized by a lock file in the index directory, and segment
+files get unique names, so concurrent updates never overwrite each other.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import uuid
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.core.article_text import strip_extra_materials
+from app.core.lock_file import LockFile
+
+logger = logging.getLogger(__name__)
+
+# Terms are hashed into a fixed feature space, so documents can be added without a vocabulary rebuild
+N_FEATURES = 1 << 18
+
+# Most frequent terms kept per document
+MAX_DOC_TERMS = 128
+
+# Heaviest query terms used to look up postings
+MAX_QUERY_TERMS = 32
+
+# Delta segment is merged into the main one above max(MIN_MERGE_DOCS, main size * MERGE_RATIO)
+MIN_MERGE_DOCS = 2000
+MERGE_RATIO = 0.1
+
+MANIFEST = 'manifest.json'
+WRITE_LOCK = 'write.lock'
+SEGMENT_ARRAYS = ('ids', 'indptr', 'terms', 'weights', 'postings_ptr', 'postings_rows', 'postings_weights')
+
+TOKEN_PATTERN = re.compile(r'[a-zа-яё][a-zа-яё0-9+#]*')
+
+STOP_WORDS = frozenset("""
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было вот от
+меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него до вас нибудь опять уж
+вам ведь там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без
+будто чего раз тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом один
+почти мой тем чтобы нее сейчас были куда зачем всех никогда можно при наконец два об другой хоть после
+над больше тот через эти нас про всего них какая много разве три эту моя впрочем хорошо свою этой перед
+иногда лучше чуть том нельзя такой им более всегда конечно всю между это также который которые которых
+the a an and or of to in on for is are was were be been it this that with as by at from not but if
+then than so we you they he she its our your their can will would should there here what which who
+""".split())
+
+# Light stemming: longest matching ending is removed if at least MIN_STEM letters remain
+RU_ENDINGS = sorted("""
+ировать ирования ировании ированный ость ости остью ение ения ении ением ениями ениях ание ания ании
+анием ания ями ами ого его ому ему ыми ими ых их ой ей ий ый ая яя ое ее ые ие ую юю ов ев ах ях ам ям
+ом ем ешь ете ить ать ять еть уть ет ют ут ит ат ят ил ла ли ло а я о е ы и у ю ь
+""".split(), key=len, reverse=True)
+RU_REFLEXIVE = ('ся', 'сь')
+EN_ENDINGS = ('ations', 'ation', 'ings', 'ing', 'ies', 'es', 'ed', 'ly', 's')
+MIN_STEM = 3
+
+
+@lru_cache(maxsize=200000)
+def stem(word: str) -> str:
+    """Strip common inflectional endings (Russian or English)."""
+    if 'а' <= word[0] <= 'я' or word[0] == 'ё':
+        for reflexive in RU_REFLEXIVE:
+            if word.endswith(reflexive) and len(word) - len(reflexive) >= MIN_STEM:
+                word = word[:-len(reflexive)]
+                break
+        endings = RU_ENDINGS
+    else:
+        endings = EN_ENDINGS
+    for ending in endings:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split into words, drop stop words and stem."""
+    words = TOKEN_PATTERN.findall(text.lower().replace('ё', 'е'))
+    return [stem(word) for word in words if len(word) > 1 and word not in STOP_WORDS]
+
+
+def term_counts(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed term ids and their counts for a text (at most MAX_DOC_TERMS most frequent)."""
+    tokens = tokenize(text)
+    if not tokens:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+    hashed = np.fromiter((zlib.crc32(token.encode('utf-8')) for token in tokens),
+                         dtype=np.int64, count=len(tokens)) & (N_FEATURES - 1)
+    terms, counts = np.unique(hashed, return_counts=True)
+    if len(terms) > MAX_DOC_TERMS:
+        keep = np.sort(np.argpartition(-counts, MAX_DOC_TERMS - 1)[:MAX_DOC_TERMS])
+        terms, counts = terms[keep], counts[keep]
+    return terms.astype(np.int32), counts.astype(np.int32)
+
+
+def document_text(title: Optional[str], description: Optional[str], full_text: Optional[str]) -> str:
+    """Text indexed for an item: the title (repeated to weigh it above body text), description and article body.
+
+    The extra materials block repeats across Habr pages and would pull unrelated articles together.
+    """
+    body = strip_extra_materials(full_text) if full_text else None
+    return '\n'.join(part for part in (title, title, description, body) if part)
+
+
+def _weigh(counts: np.ndarray, idf: np.ndarray) -> np.ndarray:
+    """Sublinear tf * idf, L2-normalized."""
+    weights = (1.0 + np.log(counts)) * idf
+    norm = np.sqrt(np.dot(weights, weights))
+    return (weights / norm if norm else weights).astype(np.float32)
+
+
+class _Segment:
+    """One immutable, memory-mapped group of document vectors."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.ids = arrays['ids']
+        self.indptr = arrays['indptr']
+        self.terms = arrays['terms']
+        self.weights = arrays['weights']
+        self.postings_ptr = arrays['postings_ptr']
+        self.postings_rows = arrays['postings_rows']
+        self.postings_weights = arrays['postings_weights']
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, path: Path) -> '_Segment':
+        return cls({name: np.load(path / f"{name}.npy", mmap_mode='r') for name in SEGMENT_ARRAYS})
+
+    @staticmethod
+    def write(path: Path, ids: np.ndarray, indptr: np.ndarray, terms: np.ndarray, weights: np.ndarray) -> None:
+        """Write a segment from CSR rows (ids sorted ascending), deriving the term postings."""
+        path.mkdir(parents=True)
+        rows = np.repeat(np.arange(len(ids), dtype=np.int32), np.diff(indptr))
+        order = np.argsort(terms, kind='stable')
+        postings_ptr = np.zeros(N_FEATURES + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=N_FEATURES), out=postings_ptr[1:])
+        arrays = {
+            'ids': ids.astype(np.int64), 'indptr': indptr.astype(np.int64),
+            'terms': terms.astype(np.int32), 'weights': weights.astype(np.float32),
+            'postings_ptr': postings_ptr, 'postings_rows': rows[order],
+            'postings_weights': weights[order].astype(np.float32),
+        }
+        for name, array in arrays.items():
+            np.save(path / f"{name}.npy", array)
+
+    def row(self, content_id: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Return (terms, weights) of a document or None."""
+        position = int(np.searchsorted(self.ids, content_id))
+        if position >= len(self.ids) or self.ids[position] != content_id:
+            return None
+        start, end = self.indptr[position], self.indptr[position + 1]
+        return self.terms[start:end], self.weights[start:end]
+
+    def scores(self, terms: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Dot product of the query with every document (zero for documents sharing no term)."""
+        starts, ends = self.postings_ptr[terms], self.postings_ptr[terms + 1]
+        lengths = ends - starts
+        if not lengths.sum():
+            return np.zeros(len(self.ids), dtype=np.float32)
+        # Gather all postings of the query terms at once
+        offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        positions = np.arange(lengths.sum()) + offsets
+        contributions = self.postings_weights[positions] * np.repeat(weights, lengths)
+        return np.bincount(self.postings_rows[positions], weights=contributions, minlength=len(self.ids))
+
+
+class TextIndex:
+    """TF-IDF index stored under a directory (see module docstring)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._loaded_version = None
+        self._segments: List[_Segment] = []
+        self._deleted: np.ndarray = np.empty(0, dtype=np.int64)
+        self._write_lock = LockFile(self.path / WRITE_LOCK)
+
+    # --- storage ---
+
+    def _read_manifest(self) -> Optional[dict]:
+        try:
+            return json.loads((self.path / MANIFEST).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def exists(self) -> bool:
+        return self._read_manifest() is not None
+
+    def _segments_for_reading(self) -> List[_Segment]:
+        """Return the current segments, reloading them and the deleted ids if the manifest changed."""
+        for _ in range(3):
+            manifest = self._read_manifest()
+            version = manifest and manifest['generation']
+            if version == self._loaded_version:
+                break
+            try:
+                self._segments = [] if manifest is None else [
+                    _Segment.load(self.path / name) for name in manifest['segments']
+                ]
+            except FileNotFoundError:
+                # Another process committed and dropped these segments meanwhile
+                continue
+            self._deleted = np.array(manifest.get('deleted', []) if manifest else [], dtype=np.int64)
+            self._loaded_version = version
+            break
+        return self._segments
+
+    def _load_doc_freq(self, manifest: Optional[dict]) -> np.ndarray:
+        if manifest is None:
+            return np.zeros(N_FEATURES, dtype=np.int32)
+        return np.load(self.path / manifest['df'])
+
+    @staticmethod
+    def _file_name(prefix: str, manifest: Optional[dict]) -> str:
+        """Unique name of a file written for the next generation."""
+        generation = (manifest['generation'] if manifest else 0) + 1
+        return f"{prefix}-{generation}-{uuid.uuid4().hex[:12]}"
+
+    def _commit(self, manifest: Optional[dict], segments: List[str], doc_freq: np.ndarray, documents: int,
+                deleted: Iterable[int] = ()) -> None:
+        """Publish new segments atomically by replacing the manifest, then drop the old files."""
+        generation = (manifest['generation'] if manifest else 0) + 1
+        df_name = self._file_name('df', manifest) + '.npy'
+        np.save(self.path / df_name, doc_freq)
+        new_manifest = {'generation': generation, 'segments': segments, 'df': df_name, 'documents': documents,
+                        'deleted': sorted(deleted)}
+        tmp_path = self.path / f"{MANIFEST}.{os.getpid()}.tmp"
+        tmp_path.write_text(json.dumps(new_manifest), encoding='utf-8')
+        os.replace(tmp_path, self.path / MANIFEST)
+
+        if manifest:
+            for name in set(manifest['segments']) - set(segments):
+                shutil.rmtree(self.path / name, ignore_errors=True)
+            if manifest['df'] != df_name:
+                (self.path / manifest['df']).unlink(missing_ok=True)
+
+    @staticmethod
+    def _vectorize(documents: Iterable[Tuple[int, str]]) -> Tuple[List[int], List[np.ndarray], List[np.ndarray]]:
+        ids, terms, counts = [], [], []
+        for content_id, text in documents:
+            doc_terms, doc_counts = term_counts(text or '')
+            if len(doc_terms):
+                ids.append(content_id)
+                terms.append(doc_terms)
+                counts.append(doc_counts)
+        return ids, terms, counts
+
+    @staticmethod
+    def _csr(ids: List[int], terms: List[np.ndarray], weights: List[np.ndarray]):
+        order = np.argsort(np.asarray(ids, dtype=np.int64), kind='stable')
+        lengths = np.array([len(terms[i]) for i in order], dtype=np.int64)
+        indptr = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return (np.asarray(ids, dtype=np.int64)[order], indptr,
+                np.concatenate([terms[i] for i in order]), np.concatenate([weights[i] for i in order]))
+
+    # --- building ---
+
+    def build(self, documents: Iterable[Tuple[int, str]]) -> int:
+        """Index (content id, text) pairs from scratch. Returns number of indexed documents."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        ids, terms, counts = self._vectorize(documents)
+        doc_freq = np.zeros(N_FEATURES, dtype=np.int32)
+        for doc_terms in terms:
+            doc_freq[doc_terms] += 1
+        idf = self._idf(doc_freq, len(ids))
+        weights = [_weigh(doc_counts, idf[doc_terms]) for doc_terms, doc_counts in zip(terms, counts)]
+
+        with self._write_lock:
+            manifest = self._read_manifest()
+            segments = []
+            if ids:
+                name = self._file_name('segment', manifest)
+                _Segment.write(self.path / name, *self._csr(ids, terms, weights))
+                segments.append(name)
+            self._commit(manifest, segments, doc_freq, len(ids))
+        return len(ids)
+
+    def add(self, documents: Iterable[Tuple[int, str]]) -> int:
+        """Add new documents into the delta segment, merging segments when it grows too large."""
+        ids, terms, counts = self._vectorize(documents)
+        if not ids:
+            return 0
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._write_lock:
+            manifest = self._read_manifest()
+            doc_freq = self._load_doc_freq(manifest)
+            for doc_terms in terms:
+                doc_freq[doc_terms] += 1
+            total = (manifest['documents'] if manifest else 0) + len(ids)
+            idf = self._idf(doc_freq, total)
+            weights = [_weigh(doc_counts, idf[doc_terms]) for doc_terms, doc_counts in zip(terms, counts)]
+
+            # A reused id is live again
+            deleted = set(manifest.get('deleted', []) if manifest else []) - set(ids)
+            names = list(manifest['segments']) if manifest else []
+            main_names, delta_names = names[:1], names[1:]
+            merge_from = delta_names
+            delta_size = len(ids) + sum(len(_Segment.load(self.path / name)) for name in delta_names)
+            main_size = sum(len(_Segment.load(self.path / name)) for name in main_names)
+            if main_names and delta_size > max(MIN_MERGE_DOCS, main_size * MERGE_RATIO):
+                merge_from = names
+                main_names = []
+
+            # Existing rows of merged segments are kept as they are (weights from their indexing time);
+            # rows of deleted documents are dropped
+            skipped = set(ids) | deleted
+            for name in merge_from:
+                segment = _Segment.load(self.path / name)
+                for position, content_id in enumerate(segment.ids.tolist()):
+                    if content_id in skipped:
+                        continue
+                    start, end = segment.indptr[position], segment.indptr[position + 1]
+                    ids.append(content_id)
+                    terms.append(np.asarray(segment.terms[start:end]))
+                    weights.append(np.asarray(segment.weights[start:end]))
+
+            if deleted:
+                # Only the unmerged main segment can still hold deleted rows
+                kept = [_Segment.load(self.path / name) for name in main_names]
+                deleted = {content_id for content_id in deleted
+                           if any(segment.row(content_id) is not None for segment in kept)}
+            name = self._file_name('segment', manifest)
+            _Segment.write(self.path / name, *self._csr(ids, terms, weights))
+            self._commit(manifest, main_names + [name], doc_freq, total, deleted)
+        return len(ids)
+
+    def remove(self, content_ids: Iterable[int]) -> int:
+        """Mark documents of deleted items as deleted. Returns number of documents removed."""
+        content_ids = set(content_ids)
+        if not content_ids:
+            return 0
+        with self._write_lock:
+            manifest = self._read_manifest()
+            if manifest is None:
+                return 0
+            deleted = set(manifest.get('deleted', []))
+            segments = [_Segment.load(self.path / name) for name in manifest['segments']]
+            doc_freq = self._load_doc_freq(manifest)
+            removed = 0
+            for content_id in content_ids - deleted:
+                # The newest row is the one that was counted in the document frequencies
+                row = next((row for row in (segment.row(content_id) for segment in reversed(segments))
+                            if row is not None), None)
+                if row is not None:
+                    doc_freq[row[0]] -= 1
+                    deleted.add(content_id)
+                    removed += 1
+            if removed:
+                self._commit(manifest, manifest['segments'], doc_freq, manifest['documents'] - removed, deleted)
+        return removed
+
+    @staticmethod
+    def _idf(doc_freq: np.ndarray, documents: int) -> np.ndarray:
+        return (np.log((1.0 + documents) / (1.0 + doc_freq)) + 1.0).astype(np.float32)
+
+    # --- queries ---
+
+    def vector(self, content_ids: Iterable[int]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Centroid of the given documents as (terms, weights), or None if none is indexed."""
+        segments = self._segments_for_reading()
+        accumulated: Dict[int, float] = {}
+        deleted = set(self._deleted.tolist())
+        for content_id in content_ids:
+            if content_id in deleted:
+                continue
+            for segment in reversed(segments):
+                row = segment.row(content_id)
+                if row is not None:
+                    for term, weight in zip(row[0].tolist(), row[1].tolist()):
+                        accumulated[term] = accumulated.get(term, 0.0) + weight
+                    break
+        if not accumulated:
+            return None
+        terms = np.fromiter(accumulated.keys(), dtype=np.int64, count=len(accumulated))
+        weights = np.fromiter(accumulated.values(), dtype=np.float64, count=len(accumulated))
+        if len(terms) > MAX_QUERY_TERMS:
+            keep = np.argpartition(-weights, MAX_QUERY_TERMS - 1)[:MAX_QUERY_TERMS]
+            terms, weights = terms[keep], weights[keep]
+        return terms, weights / math.sqrt(float(np.dot(weights, weights)))
+
+    def similar(self, content_ids: Iterable[int], k: int = 10) -> List[Tuple[int, float]]:
+        """Documents most similar to the given ones (excluding them), as (content id, score), best first."""
+        seeds = set(content_ids)
+        query = self.vector(seeds)
+        if query is None:
+            return []
+        segments = self._segments_for_reading()
+        seen = np.concatenate((np.fromiter(seeds, dtype=np.int64, count=len(seeds)), self._deleted))
+        all_ids, all_scores = [], []
+        # Newest segment first: a re-added document shadows its older row
+        for segment in reversed(segments):
+            scores = segment.scores(*query)
+            matched = np.flatnonzero(scores > 0)
+            segment_ids = np.asarray(segment.ids[matched])
+            keep = ~np.isin(segment_ids, seen)
+            all_ids.append(segment_ids[keep])
+            all_scores.append(scores[matched][keep])
+            seen = np.concatenate((seen, np.asarray(segment.ids)))
+        ids, scores = np.concatenate(all_ids), np.concatenate(all_scores)
+        if len(ids) > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[part], scores[part]
+        order = np.lexsort((ids, -scores))
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+_index: Optional[TextIndex] = None
+
+
+def get_index() -> Optional[TextIndex]:
+    """Return the configured text index, or None if disabled."""
+    global _index
+    if not settings.text_index_enabled:
+        return None
+    if _index is None or _index.path != Path(settings.text_index_path):
+        _index = TextIndex(settings.text_index_path)
+    return _index
@@ -1,41 +1,54 @@
-from sqlalchemy import (
-    create_engine, Column, Integer, String, Text, DateTime,
-    Boolean, Float, ForeignKey, Table, Enum
-)
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker, Session
-from sqlalchemy.sql import func
 import datetime
+import heapq
 import logging
-from typing import List, Optional
-from enum import Enum as PyEnum
-
-from app.config import settings
-
-logger = logging.getLogger(__name__)
-from sqlalchemy import (
-    create_engine, Column, Integer, String, Text, DateTime, 
-)
+import re
 import sqlite3
+import threading
+import zlib
+from enum import Enum as PyEnum
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 from sqlalchemy import (
     create_engine, Column, Integer, String, Text, DateTime,
-    Boolean, Float, ForeignKey, Table, Enum
+    Boolean, Float, ForeignKey, Table, Enum,
+    Index, LargeBinary, bindparam, event, inspect, tuple_
 )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker, Session
+from sqlalchemy.orm import relationship, sessionmaker, Session, deferred, load_only, selectinload, undefer
 from sqlalchemy.sql import func
-import datetime
-import logging
-from typing import List, Optional
-from enum import Enum as PyEnum
+from sqlalchemy.types import TypeDecorator
 
 from app.config import settings
+from app.core import fts
+from app.core.article_text import strip_extra_materials
+from app.core.sqlite_tables import BULK_QUERY_BATCH_SIZE
+
+# app.core.minhash, similarity and text_index need NumPy: they are imported in the functions
+# that save, delete or index items, so that startup does not pay for NumPy
 
 logger = logging.getLogger(__name__)
 
+# Migrations in init_database run again only when this is raised (stored in PRAGMA user_version);
+# raise it with every new column, index, table or backfill
+SCHEMA_VERSION = 4
+
+# Version 2 leaves the extra materials block out of MinHash signatures
+_MINHASH_TEXT_VERSION = 2
+# Version 4 leaves it out of the TF-IDF text index
+_TEXT_INDEX_BODY_VERSION = 4
+
+# Session.info key: ids of items deleted in the transaction, dropped from the text index on commit
+_TEXT_INDEX_REMOVED = 'text_index_removed'
+
 def get_sqlite_column_type(column_type) -> str:
     """Convert SQLAlchemy column type to SQLite type string."""
+    if isinstance(column_type, TypeDecorator):
+        column_type = column_type.impl
+    if isinstance(column_type, LargeBinary):
+        return 'BLOB'
     if isinstance(column_type, (Integer, Boolean)):
         return 'INTEGER'
     if isinstance(column_type, Float):
@@ -46,8 +59,83 @@ def get_sqlite_column_type(column_type) -> str:
         return 'DATETIME'
     return 'TEXT'
 
+class CompressedText(TypeDecorator):
+    """Text stored as a zlib-compressed BLOB and decompressed transparently on load.
+
+    Values written before compression was introduced are plain TEXT and are
+    returned as is.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, level: int = 6):
+        super().__init__()
+        self.level = level
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, bytes):
+            return value
+        return zlib.compress(value.encode('utf-8'), self.level)
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+        try:
+            return zlib.decompress(value).decode('utf-8')
+        except zlib.error:
+            return bytes(value).decode('utf-8', errors='replace')
+
+def sqlite_pragmas_from_settings() -> Dict[str, object]:
+    """Return the SQLite PRAGMA profile configured in settings (empty if tuning is disabled)."""
+    if not settings.sqlite_tuning_enabled:
+        return {}
+    return {
+        'busy_timeout': int(settings.sqlite_busy_timeout_ms),
+        'journal_mode': settings.sqlite_journal_mode.upper(),
+        'synchronous': settings.sqlite_synchronous.upper(),
+        'mmap_size': int(settings.sqlite_mmap_size),
+        'cache_size': int(settings.sqlite_cache_size),
+        'temp_store': settings.sqlite_temp_store.upper(),
+    }
+
+
+def attach_sqlite_pragmas(target_engine, pragmas: Dict[str, object]) -> None:
+    """Apply PRAGMA settings to every new DBAPI connection of a SQLite engine."""
+    if target_engine.url.get_backend_name() != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(target_engine, 'connect')
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                if not re.fullmatch(r'-?\w+', str(value)):
+                    logger.warning(f"Ignoring invalid SQLite PRAGMA value {name}={value!r}")
+                    continue
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+_full_text_type = CompressedText()
+
+
+def _article_body(value) -> Optional[str]:
+    """SQL function fts.ARTICLE_BODY_FUNCTION: stored full_text -> article body to index."""
+    text = _full_text_type.process_result_value(value, None)
+    return strip_extra_materials(text) if text else text
+
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    """Register the functions the full-text index view needs on every SQLite connection."""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function(fts.ARTICLE_BODY_FUNCTION, 1, _article_body, deterministic=True)
+
+
 Base = declarative_base()
 engine = create_engine(settings.database_url)
+attach_sqlite_pragmas(engine, sqlite_pragmas_from_settings())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 class ContentType(PyEnum):
@@ -66,8 +154,10 @@ class DifficultyLevel(PyEnum):
 content_tags = Table(
     'content_tags',
     Base.metadata,
-    Column('content_id', Integer, ForeignKey('content_items.id')),
-    Column('tag_id', Integer, ForeignKey('tags.id'))
+    Column('content_id', Integer, ForeignKey('content_items.id'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    # Covers lookups by tag and the most recent items of a tag (similarity.MAX_TAG_POSTINGS)
+    Index('ix_content_tags_tag_content', 'tag_id', 'content_id')
 )
 
 class Tag(Base):
@@ -91,12 +181,18 @@ class Tag(Base):
 class ContentItem(Base):
     """Educational content item from any source."""
     __tablename__ = 'content_items'
+    __table_args__ = (
+        Index('uq_content_items_source_platform', 'source_id', 'platform', unique=True),
+        Index('ix_content_items_published_at', 'published_at'),
+        Index('ix_content_items_added_at_id', 'added_at', 'id'),
+        Index('ix_content_items_duplicate_of', 'duplicate_of'),
+    )
 
     id = Column(Integer, primary_key=True)
     source_id = Column(String, nullable=False)
     title = Column(String, nullable=False)
     description = Column(Text)
-    full_text = Column(Text, nullable=True)
+    full_text = deferred(Column(CompressedText(), nullable=True))  # loaded on first access
     url = Column(String, nullable=False)
     content_type = Column(Enum(ContentType))
     platform = Column(String)
@@ -105,6 +201,8 @@ class ContentItem(Base):
     published_at = Column(DateTime)
     added_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    minhash = deferred(Column(LargeBinary, nullable=True))  # near-duplicate signature (app.core.minhash)
+    duplicate_of = Column(Integer, nullable=True)  # id of the first item of a near-duplicate cluster
 
     tags = relationship("Tag", secondary=content_tags, back_populates="content_items")
     user_progress = relationship("UserProgress", back_populates="content")
@@ -193,6 +291,9 @@ class User(Base):
 class UserInterest(Base):
     """User's interest in specific tags or topics."""
     __tablename__ = 'user_interests'
+    __table_args__ = (
+        Index('ix_user_interests_user_tag', 'user_id', 'tag_name'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -205,6 +306,19 @@ class UserInterest(Base):
 
     def __init__(self, user_id: int, tag_name: str, priority: int = 5, last_used: Optional[datetime.datetime] = None):
         """Initialize user interest with priority and usage tracking."""
+        tag_name = self.normalize_tag_name(tag_name)
+        self.user_id = user_id
+        self.tag_name = tag_name
+        self.priority = priority
+        self.created_at = datetime.datetime.utcnow()
+        self.last_used = last_used or datetime.datetime.utcnow()
+
+    def __repr__(self) -> str:
+        return f"<UserInterest(user_id={self.user_id}, tag='{self.tag_name}', priority={self.priority})>"
+
+    @staticmethod
+    def normalize_tag_name(tag_name: str) -> str:
+        """Normalize tag name the way it is stored: lowercase, max 50 chars, special characters quoted."""
         tag_name = tag_name.lower().strip()
         if not tag_name:
             raise ValueError("Имя тега не может быть пустым")
@@ -214,14 +328,7 @@ class UserInterest(Base):
         if any(c in tag_name for c in ['&', '?', '#', '%', '+']):
             import urllib.parse
             tag_name = urllib.parse.quote(tag_name, safe='')
-        self.user_id = user_id
-        self.tag_name = tag_name
-        self.priority = priority
-        self.created_at = datetime.datetime.utcnow()
-        self.last_used = last_used or datetime.datetime.utcnow()
-
-    def __repr__(self) -> str:
-        return f"<UserInterest(user_id={self.user_id}, tag='{self.tag_name}', priority={self.priority})>"
+        return tag_name
 
     def mark_used(self, priority_increment: int = 1) -> None:
         """Обновить время использования и увеличить приоритет."""
@@ -231,6 +338,9 @@ class UserInterest(Base):
 class UserProgress(Base):
     """Tracks user progress on content items."""
     __tablename__ = 'user_progress'
+    __table_args__ = (
+        Index('ix_user_progress_user_content', 'user_id', 'content_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -300,6 +410,9 @@ class UserSettings(Base):
 class FavoriteContent(Base):
     """Tracks content items marked as favorite by users."""
     __tablename__ = 'favorite_content'
+    __table_args__ = (
+        Index('ix_favorite_content_user_content', 'user_id', 'content_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -319,6 +432,9 @@ class FavoriteContent(Base):
 class SearchQuery(Base):
     """Поисковые запросы пользователей для анализа интересов."""
     __tablename__ = 'search_queries'
+    __table_args__ = (
+        Index('ix_search_queries_user_id', 'user_id'),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -332,23 +448,682 @@ class SearchQuery(Base):
         self.query = query.strip().lower()
         self.created_at = datetime.datetime.utcnow()
 
+class FeedWatermark(Base):
+    """High-water mark of a feed keyword (e.g. 'search:python'): newest publication time already ingested."""
+    __tablename__ = 'feed_watermarks'
+
+    feed_key = Column(String, primary_key=True)
+    last_published = Column(DateTime, nullable=False)
+    last_entry_ids = Column(Text, nullable=True)  # newline-separated ids published at last_published
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())  # last run that used the mark
+
+    def entry_ids(self) -> Set[str]:
+        return set(filter(None, (self.last_entry_ids or '').split('\n')))
+
+
+class ScheduledJob(Base):
+    """Persistent state of a per-user scheduled job (see app.services.scheduler)."""
+    __tablename__ = 'scheduled_jobs'
+    __table_args__ = (
+        Index('ix_scheduled_jobs_user_kind', 'user_id', 'kind', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    kind = Column(String, nullable=False)  # 'fetch' or 'digest'
+    hour = Column(Integer, nullable=False)  # hour of day (UTC) the job is scheduled for
+    next_run_at = Column(DateTime, nullable=False)
+    last_run_at = Column(DateTime, nullable=True)
+    last_status = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)  # failed attempts since the last success
+
+# Columns needed to render article lists; description, full_text and tags load on demand
+LIST_COLUMNS = (
+    ContentItem.id, ContentItem.source_id, ContentItem.title, ContentItem.url,
+    ContentItem.content_type, ContentItem.platform, ContentItem.difficulty,
+    ContentItem.duration_minutes, ContentItem.published_at, ContentItem.added_at,
+    ContentItem.duplicate_of,
+)
+
+
+def list_view_options(*extra_columns):
+    """Loader option for list queries: load only LIST_COLUMNS (plus ``extra_columns``)."""
+    return load_only(*LIST_COLUMNS, *extra_columns)
+
+
+def load_full_content_item(session: Session, content_id: int) -> Optional[ContentItem]:
+    """Load a content item with description, full text and tags for the article view."""
+    return session.query(ContentItem).options(
+        undefer(ContentItem.full_text), selectinload(ContentItem.tags)
+    ).populate_existing().filter(ContentItem.id == content_id).first()
+
+
+def get_content_page(session: Session, after: Optional[Tuple[datetime.datetime, int]] = None,
+                     limit: int = 15) -> List[ContentItem]:
+    """Return a page of items, newest first, using keyset pagination on (added_at, id).
+
+    ``after`` is the (added_at, id) of the last row of the previous page.
+    Unlike OFFSET, the cost of a page does not grow with its position.
+    """
+    query = session.query(ContentItem).options(list_view_options())
+    if after is not None:
+        query = query.filter(tuple_(ContentItem.added_at, ContentItem.id) < tuple_(*after))
+    return query.order_by(ContentItem.added_at.desc(), ContentItem.id.desc()).limit(limit).all()
+
+
+# Cached total count of content items: (MAX(id) when counted, count)
+_content_count_cache: Optional[Tuple[Optional[int], int]] = None
+
+
+def invalidate_content_count() -> None:
+    """Drop the cached content item count (after inserts or deletes)."""
+    global _content_count_cache
+    _content_count_cache = None
+
+
+def count_content_items(session: Session) -> int:
+    """Return number of content items, cached until items are inserted or deleted.
+
+    MAX(id) is checked on every call (a cheap rowid lookup), so inserts made by
+    other processes also invalidate the cached value.
+    """
+    global _content_count_cache
+    max_id = session.query(func.max(ContentItem.id)).scalar()
+    if _content_count_cache is None or _content_count_cache[0] != max_id:
+        _content_count_cache = (max_id, session.query(func.count(ContentItem.id)).scalar())
+    return _content_count_cache[1]
+
+
+def content_key(item: ContentItem) -> Tuple[str, str]:
+    """Return the (source_id, platform) deduplication key of a content item."""
+    return (str(item.source_id), item.platform)
+
+
+def get_content_items_by_keys(session: Session, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], ContentItem]:
+    """Load stored content items for (source_id, platform) pairs with one IN query per batch."""
+    keys = list({(str(source_id), platform) for source_id, platform in keys})
+    found = {}
+    for start in range(0, len(keys), BULK_QUERY_BATCH_SIZE):
+        batch = keys[start:start + BULK_QUERY_BATCH_SIZE]
+        rows = session.query(ContentItem).filter(
+            tuple_(ContentItem.source_id, ContentItem.platform).in_(batch)
+        ).all()
+        for row in rows:
+            found[content_key(row)] = row
+    return found
+
+
+def existing_content_keys(session: Session, keys: Iterable[Tuple[str, str]]) -> Set[Tuple[str, str]]:
+    """Return the subset of (source_id, platform) pairs already stored, with one IN query per batch."""
+    keys = list({(str(source_id), platform) for source_id, platform in keys})
+    existing = set()
+    for start in range(0, len(keys), BULK_QUERY_BATCH_SIZE):
+        batch = keys[start:start + BULK_QUERY_BATCH_SIZE]
+        rows = session.query(ContentItem.source_id, ContentItem.platform).filter(
+            tuple_(ContentItem.source_id, ContentItem.platform).in_(batch)
+        ).all()
+        existing.update((str(source_id), platform) for source_id, platform in rows)
+    return existing
+
+
+def load_feed_watermarks(session: Session) -> Dict[str, Tuple[datetime.datetime, Set[str]]]:
+    """Return feed key -> (last published time, entry ids at that time) for all feeds."""
+    return {mark.feed_key: (mark.last_published, mark.entry_ids()) for mark in session.query(FeedWatermark).all()}
+
+
+def save_feed_watermarks(session: Session, marks: Dict[str, Tuple[datetime.datetime, Set[str]]]) -> None:
+    """Insert or move forward feed high-water marks; an older mark never replaces a newer one.
+
+    Marks not used for ``feed_watermark_retention_days`` (keywords no longer
+    searched) are removed.
+    """
+    if not marks:
+        return
+    now = datetime.datetime.utcnow()
+    stored = {}
+    keys = list(marks)
+    for start in range(0, len(keys), BULK_QUERY_BATCH_SIZE):
+        batch = keys[start:start + BULK_QUERY_BATCH_SIZE]
+        stored.update((mark.feed_key, mark) for mark in
+                      session.query(FeedWatermark).filter(FeedWatermark.feed_key.in_(batch)).all())
+    for feed_key, (published, entry_ids) in marks.items():
+        mark = stored.get(feed_key)
+        if mark is None:
+            session.add(FeedWatermark(feed_key=feed_key, last_published=published,
+                                      last_entry_ids='\n'.join(sorted(entry_ids)), updated_at=now))
+            continue
+        if published > mark.last_published:
+            mark.last_published = published
+            mark.last_entry_ids = '\n'.join(sorted(entry_ids))
+        elif published == mark.last_published:
+            mark.last_entry_ids = '\n'.join(sorted(mark.entry_ids() | entry_ids))
+        mark.updated_at = now
+    session.query(FeedWatermark).filter(
+        FeedWatermark.updated_at < now - datetime.timedelta(days=settings.feed_watermark_retention_days)
+    ).delete(synchronize_session=False)
+    session.commit()
+
+
+def resolve_tags(session: Session, names: Iterable[str]) -> Dict[str, Tag]:
+    """Return Tag objects for the given names, inserting missing ones in bulk."""
+    names = sorted({name.lower() for name in names if name})
+    tags = {}
+
+    def load(batch_names: List[str]) -> None:
+        for start in range(0, len(batch_names), BULK_QUERY_BATCH_SIZE):
+            batch = batch_names[start:start + BULK_QUERY_BATCH_SIZE]
+            for tag in session.query(Tag).filter(Tag.name.in_(batch)).all():
+                tags[tag.name] = tag
+
+    load(names)
+    missing = [name for name in names if name not in tags]
+    if missing:
+        if session.get_bind().dialect.name == 'sqlite':
+            # INSERT ... ON CONFLICT DO NOTHING tolerates tags created concurrently by another process
+            session.execute(
+                sqlite_insert(Tag.__table__).on_conflict_do_nothing(index_elements=['name']),
+                [{'name': name} for name in missing]
+            )
+            load(missing)
+        else:
+            new_tags = [Tag(name=name) for name in missing]
+            session.add_all(new_tags)
+            session.flush()
+            tags.update((tag.name, tag) for tag in new_tags)
+    return tags
+
+
+def rank_user_interests(session: Session, user_id: int,
+                        limit: Optional[int] = None) -> Tuple[List[Tuple[int, str]], int]:
+    """Rank user interests by decayed priority in one pass over (id, tag, priority, dates) tuples.
+
+    Score is ``priority * 0.9 ** (days_unused / 30)``. Returns the top ``limit``
+    (id, tag_name) pairs, best first, and the total number of interests.
+    """
+    rows = session.query(
+        UserInterest.id, UserInterest.tag_name, UserInterest.priority,
+        UserInterest.last_used, UserInterest.created_at
+    ).filter(UserInterest.user_id == user_id).all()
+
+    now = datetime.datetime.utcnow()
+
+    def score(row) -> float:
+        # Защита от None в last_used - использовать created_at или now как fallback
+        last_used = row.last_used or row.created_at or now
+        return (row.priority or 0) * 0.9 ** ((now - last_used).days / 30)
+
+    # nlargest is stable, like the full sort it replaces: ties keep table order
+    top = heapq.nlargest(len(rows) if limit is None else limit, rows, key=score)
+    return [(row.id, row.tag_name) for row in top], len(rows)
+
+
+# SQLite has a single writer: concurrent savers in this process (scheduler workers) queue here
+# instead of on busy_timeout, and the file-based text index is updated by one thread at a time
+_save_lock = threading.Lock()
+
+
+def save_new_content_items(session: Session, items: Iterable[ContentItem],
+                           prepare: Optional[Callable[[List[ContentItem]], None]] = None,
+                           commit: bool = True) -> List[ContentItem]:
+    """Save items whose (source_id, platform) is not stored yet and return the stored rows.
+
+    Existing keys are resolved with one IN query per batch, tags are resolved or
+    inserted in bulk, and items and content_tags rows are written with executemany
+    (INSERT ... ON CONFLICT DO NOTHING on SQLite). ``prepare`` is called with the new
+    items before insertion, e.g. to download full texts only for articles that will
+    actually be saved. The returned objects are the persistent rows, not the inputs.
+    """
+    unique_items = []
+    seen = set()
+    for item in items:
+        key = content_key(item)
+        if key not in seen:
+            seen.add(key)
+            unique_items.append(item)
+    if not unique_items:
+        return []
+
+    existing = existing_content_keys(session, seen)
+    new_items = [item for item in unique_items if content_key(item) not in existing]
+    if not new_items:
+        return []
+
+    if prepare:
+        prepare(new_items)
+    from app.core import minhash
+    for item in new_items:
+        item.minhash = minhash.signature(minhash.document_text(item.title, item.description, item.full_text))
+    with _save_lock:
+        return _insert_new_items(session, new_items, commit)
+
+
+def _insert_new_items(session: Session, new_items: List[ContentItem], commit: bool) -> List[ContentItem]:
+    """Write new items, their tag links and index entries (see save_new_content_items)."""
+    from app.core import similarity, text_index
+    tag_map = resolve_tags(session, (tag.name for item in new_items for tag in (item.tags or [])))
+    item_tag_ids = {}
+    for item in new_items:
+        tag_ids = []
+        for tag in (item.tags or []):
+            db_tag = tag_map.get(tag.name.lower()) if tag.name else None
+            if db_tag is not None and db_tag.id not in tag_ids:
+                tag_ids.append(db_tag.id)
+        item_tag_ids[content_key(item)] = tag_ids
+
+    # Core executemany: the ORM falls back to one INSERT per row for SQLite RETURNING
+    columns = [column for column in ContentItem.__table__.columns if not column.primary_key]
+    rows = [{column.key: getattr(item, column.key) for column in columns} for item in new_items]
+    is_sqlite = session.get_bind().dialect.name == 'sqlite'
+    if is_sqlite:
+        session.execute(sqlite_insert(ContentItem.__table__).on_conflict_do_nothing(), rows)
+    else:
+        session.execute(ContentItem.__table__.insert(), rows)
+    invalidate_content_count()
+
+    stored = get_content_items_by_keys(session, item_tag_ids.keys())
+    link_rows = [
+        {'content_id': stored[key].id, 'tag_id': tag_id}
+        for key, tag_ids in item_tag_ids.items() if key in stored
+        for tag_id in tag_ids
+    ]
+    if link_rows:
+        if is_sqlite:
+            session.execute(sqlite_insert(content_tags).on_conflict_do_nothing(), link_rows)
+        else:
+            session.execute(content_tags.insert(), link_rows)
+
+    saved_items = [stored[content_key(item)] for item in new_items if content_key(item) in stored]
+    fts.index_items(session.connection(), [item.id for item in saved_items])
+    similarity.update_for_items(session.connection(), {
+        stored[key].id: tag_ids for key, tag_ids in item_tag_ids.items() if key in stored
+    }, settings.similarity_neighbors)
+    _mark_duplicates(session, [
+        (stored[content_key(item)].id, item.minhash)
+        for item in new_items if content_key(item) in stored and item.minhash
+    ])
+    for item in saved_items:
+        # Tags were written via Core; refresh the relationship on the loaded objects
+        session.expire(item, ['tags'])
+    if commit:
+        session.commit()
+    else:
+        session.flush()
+    _add_to_text_index([
+        (stored[content_key(item)].id, text_index.document_text(item.title, item.description, item.full_text))
+        for item in new_items if content_key(item) in stored
+    ])
+    return saved_items
+
+def _mark_duplicates(session: Session, signatures: List[Tuple[int, bytes]]) -> int:
+    """Index signatures in the LSH table and set duplicate_of on near-duplicates. Returns their number."""
+    from app.core import minhash
+    duplicates = minhash.index_items(session.connection(), signatures, settings.duplicate_threshold)
+    if duplicates:
+        session.execute(
+            ContentItem.__table__.update().where(ContentItem.__table__.c.id == bindparam('item_id')),
+            [{'item_id': content_id, 'duplicate_of': root_id} for content_id, root_id in duplicates.items()]
+        )
+        for content_id in duplicates:
+            item = session.identity_map.get(session.identity_key(ContentItem, content_id))
+            if item is not None:
+                session.expire(item, ['duplicate_of'])
+    return len(duplicates)
+
+
+def _remove_from_text_index(content_ids: List[int]) -> None:
+    """Drop deleted items from the TF-IDF index; a failure only affects text recommendations."""
+    if not settings.text_index_enabled or not content_ids:
+        return
+    from app.core import text_index
+    try:
+        text_index.get_index().remove(content_ids)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Не удалось обновить текстовый индекс: {e}")
+
+
+def _add_to_text_index(documents: List[Tuple[int, str]]) -> None:
+    """Add saved items to the TF-IDF index; a failure only affects text recommendations."""
+    if not settings.text_index_enabled or not documents:
+        return
+    from app.core import text_index
+    index = text_index.get_index()
+    try:
+        index.add(documents)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Не удалось обновить текстовый индекс: {e}")
+
+
+# Attributes of ContentItem that the full-text index reads
+_FTS_ATTRIBUTES = ('title', 'description', 'full_text', 'tags')
+
+
+def _fts_changed_ids(session: Session) -> List[int]:
+    """Ids of stored content items whose indexed columns or tags change in this flush."""
+    return [
+        obj.id for obj in session.dirty
+        if isinstance(obj, ContentItem) and obj.id is not None
+        and any(inspect(obj).attrs[name].history.has_changes() for name in _FTS_ATTRIBUTES)
+    ]
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_content_count_on_flush(session: Session, flush_context) -> None:
+    """Reset the cached content count when content items are added or deleted via the ORM."""
+    if any(isinstance(obj, ContentItem) for obj in list(session.new) + list(session.deleted)):
+        invalidate_content_count()
+
+
+@event.listens_for(Session, 'before_flush')
+def _unindex_fulltext_before_flush(session: Session, flush_context, instances) -> None:
+    """Remove FTS entries of content items updated or deleted via the ORM while the rows are unchanged."""
+    ids = _fts_changed_ids(session) + [
+        obj.id for obj in session.deleted if isinstance(obj, ContentItem) and obj.id is not None
+    ]
+    if ids:
+        fts.remove_items(session.connection(), ids)
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_fulltext_index(session: Session, flush_context) -> None:
+    """Index content items inserted or updated via the ORM."""
+    ids = _fts_changed_ids(session) + [
+        obj.id for obj in session.new if isinstance(obj, ContentItem) and obj.id is not None
+    ]
+    if ids:
+        fts.index_items(session.connection(), ids)
+
+
+@event.listens_for(Session, 'before_flush')
+def _sync_similarity_index(session: Session, flush_context, instances) -> None:
+    """Drop content items deleted via the ORM from the similarity, duplicate and text indexes.
+
+    Runs before the flush: co-occurrence counts are decremented from the items' tag links.
+    """
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, ContentItem) and obj.id is not None]
+    if deleted:
+        from app.core import minhash, similarity
+        similarity.remove_items(session.connection(), deleted)
+        minhash.remove_items(session.connection(), deleted)
+        # The text index lives outside the database: updated once the deletion is committed
+        session.info.setdefault(_TEXT_INDEX_REMOVED, set()).update(deleted)
+
+
+@event.listens_for(Session, 'after_commit')
+def _sync_text_index_on_commit(session: Session) -> None:
+    """Drop items deleted in the committed transaction from the text index."""
+    removed = session.info.pop(_TEXT_INDEX_REMOVED, None)
+    if removed:
+        _remove_from_text_index(sorted(removed))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_text_index_removals(session: Session) -> None:
+    session.info.pop(_TEXT_INDEX_REMOVED, None)
+
+
+def _dedupe_content_items(connection) -> None:
+    """Merge duplicate (source_id, platform) rows into the oldest one before adding the unique index."""
+    connection.exec_driver_sql(
+        "CREATE TEMP TABLE _content_dup_map AS "
+        "SELECT c.id AS old_id, k.keep_id AS keep_id FROM content_items c "
+        "JOIN (SELECT source_id, platform, MIN(id) AS keep_id FROM content_items "
+        "      GROUP BY source_id, platform HAVING COUNT(*) > 1) k "
+        "ON c.source_id = k.source_id AND c.platform IS k.platform "
+        "WHERE c.id != k.keep_id"
+    )
+    try:
+        duplicates = connection.exec_driver_sql("SELECT COUNT(*) FROM _content_dup_map").scalar()
+        if duplicates:
+            from app.core import minhash, similarity
+            old_ids = [row[0] for row in connection.exec_driver_sql("SELECT old_id FROM _content_dup_map")]
+            keep_ids = [row[0] for row in connection.exec_driver_sql("SELECT DISTINCT keep_id FROM _content_dup_map")]
+            # Core statements skip the ORM flush hooks: update the indexes here. Kept rows gain the
+            # tags of their duplicates, so they are removed and indexed again as well.
+            fts.remove_items(connection, old_ids + keep_ids)
+            similarity.remove_items(connection, old_ids + keep_ids)
+            minhash.remove_items(connection, old_ids)
+            for table_name in ('content_tags', 'user_progress', 'favorite_content'):
+                connection.exec_driver_sql(
+                    f"UPDATE {table_name} SET content_id = "
+                    f"(SELECT keep_id FROM _content_dup_map WHERE old_id = {table_name}.content_id) "
+                    f"WHERE content_id IN (SELECT old_id FROM _content_dup_map)"
+                )
+            connection.exec_driver_sql("DELETE FROM content_items WHERE id IN (SELECT old_id FROM _content_dup_map)")
+            fts.index_items(connection, keep_ids)
+            keep_tags: Dict[int, Set[int]] = {}
+            for content_id, tag_id in connection.exec_driver_sql(
+                "SELECT content_id, tag_id FROM content_tags "
+                "WHERE content_id IN (SELECT keep_id FROM _content_dup_map)"
+            ):
+                keep_tags.setdefault(content_id, set()).add(tag_id)
+            similarity.update_for_items(
+                connection, {content_id: sorted(tags) for content_id, tags in keep_tags.items()},
+                settings.similarity_neighbors
+            )
+            _remove_from_text_index(old_ids)
+            logger.info(f"Removed {duplicates} duplicate content items before adding unique index.")
+    finally:
+        connection.exec_driver_sql("DROP TABLE _content_dup_map")
+
+
+def _migrate_sqlite_indexes(connection) -> None:
+    """Create indexes declared on the models that are missing in an existing SQLite database."""
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            if index.name == 'uq_content_items_source_platform':
+                _dedupe_content_items(connection)
+            index.create(bind=connection)
+            logger.info(f"Created index {index.name} on {table.name}.")
+
+    # Superseded by ix_content_tags_tag_content
+    connection.exec_driver_sql("DROP INDEX IF EXISTS ix_content_tags_tag_id")
+
+    # Old content_tags tables have no primary key: enforce uniqueness with an index instead
+    pk_columns = inspector.get_pk_constraint('content_tags').get('constrained_columns') or []
+    existing_indexes = {index['name'] for index in inspector.get_indexes('content_tags')}
+    if not pk_columns and 'uq_content_tags_content_tag' not in existing_indexes:
+        connection.exec_driver_sql(
+            "DELETE FROM content_tags WHERE rowid NOT IN "
+            "(SELECT MIN(rowid) FROM content_tags GROUP BY content_id, tag_id)"
+        )
+        connection.exec_driver_sql(
+            "CREATE UNIQUE INDEX uq_content_tags_content_tag ON content_tags (content_id, tag_id)"
+        )
+        logger.info("Created index uq_content_tags_content_tag on content_tags.")
+
+
+def _compress_full_texts(connection, batch_size: int = 500) -> int:
+    """Compress full texts stored as plain TEXT by older versions. Returns number of converted rows."""
+    column_type = CompressedText()
+    converted = 0
+    last_id = 0
+    while True:
+        rows = connection.exec_driver_sql(
+            "SELECT id, full_text FROM content_items "
+            "WHERE id > ? AND typeof(full_text) = 'text' ORDER BY id LIMIT ?",
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        connection.exec_driver_sql(
+            "UPDATE content_items SET full_text = ? WHERE id = ?",
+            [(column_type.process_bind_param(text, None), content_id) for content_id, text in rows]
+        )
+        converted += len(rows)
+        last_id = rows[-1][0]
+    return converted
+
+
+def _backfill_fulltext_index_if_empty(connection) -> None:
+    """Fill a freshly created FTS index from existing content items."""
+    has_items = connection.exec_driver_sql("SELECT 1 FROM content_items LIMIT 1").first()
+    if has_items and fts.is_empty(connection):
+        session = Session(bind=connection)
+        try:
+            count = rebuild_fulltext_index(session)
+            logger.info(f"Full-text index built for {count} content items.")
+        finally:
+            session.close()
+
+
+def rebuild_fulltext_index(session: Session) -> int:
+    """Rebuild the FTS index from all content items. Returns number of indexed items."""
+    return fts.rebuild(session.connection())
+
+
+def _backfill_similarity_index_if_empty(connection) -> None:
+    """Fill a freshly created similarity index from existing tag links."""
+    from app.core import similarity
+    has_links = connection.exec_driver_sql("SELECT 1 FROM content_tags LIMIT 1").first()
+    if has_links and similarity.is_empty(connection):
+        count = similarity.rebuild(connection, settings.similarity_neighbors)
+        logger.info(f"Similarity index built for {count} content items.")
+
+
+def rebuild_similarity_index(session: Session) -> int:
+    """Rebuild item neighbours and tag co-occurrence counts. Returns number of indexed items."""
+    from app.core import similarity
+    return similarity.rebuild(session.connection(), settings.similarity_neighbors)
+
+
+def rebuild_duplicate_index(session: Session, batch_size: int = 200) -> int:
+    """Recompute signatures and near-duplicate clusters of all items. Returns number of duplicates."""
+    from app.core import minhash
+    connection = session.connection()
+    if not minhash.is_enabled(connection):
+        return 0
+    minhash.clear(connection)
+    session.execute(ContentItem.__table__.update().values(duplicate_of=None))
+    duplicates = 0
+    last_id = 0
+    while True:
+        batch = session.query(
+            ContentItem.id, ContentItem.title, ContentItem.description, ContentItem.full_text
+        ).filter(ContentItem.id > last_id).order_by(ContentItem.id).limit(batch_size).all()
+        if not batch:
+            break
+        signatures = [
+            (row.id, minhash.signature(minhash.document_text(row.title, row.description, row.full_text)))
+            for row in batch
+        ]
+        session.execute(
+            ContentItem.__table__.update().where(ContentItem.__table__.c.id == bindparam('item_id')),
+            [{'item_id': content_id, 'minhash': sig} for content_id, sig in signatures]
+        )
+        duplicates += _mark_duplicates(session, [(content_id, sig) for content_id, sig in signatures if sig])
+        last_id = batch[-1].id
+    return duplicates
+
+
+def _backfill_duplicate_index(connection, force: bool = False) -> None:
+    """Compute signatures and duplicate clusters for items stored before the LSH table existed.
+
+    With ``force`` existing signatures are recomputed too (after the signed text changed).
+    """
+    from app.core import minhash
+    has_items = connection.exec_driver_sql("SELECT 1 FROM content_items LIMIT 1").first()
+    if has_items and (force or minhash.is_empty(connection)):
+        session = Session(bind=connection)
+        try:
+            count = rebuild_duplicate_index(session)
+            logger.info(f"Duplicate index built, {count} near-duplicate items found.")
+        finally:
+            session.close()
+
+
+def rebuild_text_index(session: Session, batch_size: int = 500) -> int:
+    """Rebuild the TF-IDF text index from all content items. Returns number of indexed items."""
+    from app.core import text_index
+    index = text_index.get_index()
+    if index is None:
+        return 0
+
+    def documents():
+        last_id = 0
+        while True:
+            batch = session.query(
+                ContentItem.id, ContentItem.title, ContentItem.description, ContentItem.full_text
+            ).filter(ContentItem.id > last_id).order_by(ContentItem.id).limit(batch_size).all()
+            if not batch:
+                break
+            for row in batch:
+                yield row.id, text_index.document_text(row.title, row.description, row.full_text)
+            last_id = batch[-1].id
+
+    return index.build(documents())
+
+
+def _build_text_index(rebuild: bool = False) -> None:
+    """Build the text index on first start with existing content, or rebuild it after its text changed.
+
+    NumPy is imported only to build it.
+    """
+    if not settings.text_index_enabled:
+        return
+    if not rebuild and (Path(settings.text_index_path) / 'manifest.json').exists():
+        return  # the manifest file is text_index.MANIFEST
+    session = SessionLocal()
+    try:
+        if session.query(ContentItem.id).first() is not None:
+            count = rebuild_text_index(session)
+            logger.info(f"Text index built for {count} content items.")
+    except (OSError, ValueError) as e:
+        logger.warning(f"Не удалось построить текстовый индекс: {e}")
+    finally:
+        session.close()
+
+
+def migrate_sqlite(target_engine, version: int) -> None:
+    """Bring a SQLite database from ``version`` up to SCHEMA_VERSION: columns, indexes, compression, index backfills."""
+    from app.core import minhash, similarity
+    conn = target_engine.raw_connection()
+    cursor = conn.cursor()
+    for table_name, table in Base.metadata.tables.items():
+        cursor.execute(f"PRAGMA table_info({table_name})")
+        existing_columns = [col[1] for col in cursor.fetchall()]
+        model_columns = {column.name: column for column in table.columns}
+        for column_name, column in model_columns.items():
+            if column_name not in existing_columns:
+                column_type = get_sqlite_column_type(column.type)
+                cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
+    conn.commit()
+    cursor.close()
+    with target_engine.begin() as connection:
+        # Before version 3 the FTS table kept its own uncompressed copy of every text
+        replaced_fts = fts.drop_stored_content_table(connection)
+        _migrate_sqlite_indexes(connection)
+        compressed = _compress_full_texts(connection)
+        if fts.ensure_fts_table(connection):
+            _backfill_fulltext_index_if_empty(connection)
+        if similarity.ensure_tables(connection):
+            _backfill_similarity_index_if_empty(connection)
+        if minhash.ensure_table(connection):
+            _backfill_duplicate_index(connection, force=version < _MINHASH_TEXT_VERSION)
+        connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    if compressed:
+        logger.info(f"Compressed full text of {compressed} content items.")
+    if compressed or replaced_fts:
+        # Return the space freed by compression and the old FTS copy to the filesystem
+        with target_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql("VACUUM")
+
+
 def init_database() -> None:
-    """Initialize database tables with migration for missing columns."""
+    """Initialize database tables; migrations run once per SCHEMA_VERSION (kept in PRAGMA user_version)."""
     try:
         Base.metadata.create_all(bind=engine)
+        version = SCHEMA_VERSION
         if engine.url.drivername == 'sqlite':
-            conn = engine.raw_connection()
-            cursor = conn.cursor()
-            for table_name, table in Base.metadata.tables.items():
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                existing_columns = [col[1] for col in cursor.fetchall()]
-                model_columns = {column.name: column for column in table.columns}
-                for column_name, column in model_columns.items():
-                    if column_name not in existing_columns:
-                        column_type = get_sqlite_column_type(column.type)
-                        cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
-            conn.commit()
-            cursor.close()
+            with engine.connect() as connection:
+                version = connection.exec_driver_sql("PRAGMA user_version").scalar() or 0
+            if version < SCHEMA_VERSION:
+                migrate_sqlite(engine, version)
+        _build_text_index(rebuild=version < _TEXT_INDEX_BODY_VERSION)
         logger.info("Database initialized successfully.")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
@@ -9,20 +9,20 @@ from typing import List, Optional, Dict, Any
 from sqlalchemy import func
 import click
 from colorama import init, Fore, Back, Style
-from docx import Document
 
 from app.database import (
     get_db_session, User, ContentItem, UserInterest,
     UserProgress, Tag, SessionLocal, UserSettings,
-    FavoriteContent, SearchQuery
+    FavoriteContent, SearchQuery, save_new_content_items,
+    load_full_content_item, get_content_page, count_content_items,
+    content_key, existing_content_keys
 )
+from app.core import fts
 from app.services.aggregator import ContentAggregator, update_all_content
 from app.services.recommender import ContentRecommender
 from app.services.email_sender import EmailSender
 from app.config import settings
-from app.sources.youtube import YouTubeSource
 from app.sources.habr import HabrSource
-from app.sources.coursera import CourseraSource
 
 logger = logging.getLogger(__name__)
 from app.database import (
@@ -52,15 +52,13 @@ from typing import List, Optional, Dict, Any
 from sqlalchemy import func
 import click
 from colorama import init, Fore, Back, Style
-from docx import Document
 
 from app.services.aggregator import ContentAggregator, update_all_content
 from app.services.recommender import ContentRecommender
 from app.services.email_sender import EmailSender
+from app.services import catch_up
 from app.config import settings
-from app.sources.youtube import YouTubeSource
 from app.sources.habr import HabrSource
-from app.sources.coursera import CourseraSource
 
 logger = logging.getLogger(__name__)
 
@@ -73,11 +71,13 @@ class InteractiveMenu:
         self.recommender = ContentRecommender(db_session=self.session)
         self.email_sender = EmailSender()
         self.sources = {
-            "youtube": {"enabled": bool(settings.youtube_api_key), "instance": YouTubeSource()},
+            # Only Habr is queried from the menu; other sources are just toggled here
+            "youtube": {"enabled": bool(settings.youtube_api_key)},
             "habr": {"enabled": True, "instance": HabrSource()},
-            "coursera": {"enabled": bool(settings.coursera_api_key), "instance": CourseraSource()},
+            "coursera": {"enabled": bool(settings.coursera_api_key)},
         }
         self.current_user_id: Optional[int] = self._load_current_user_id()
+        self._catch_up_notified = False
 
     def _load_current_user_id(self) -> Optional[int]:
         try:
@@ -105,7 +105,28 @@ class InteractiveMenu:
         finally:
             self.session.close()
 
+    def _show_catch_up_status(self) -> None:
+        """Сообщить о фоновой догрузке пропущенных обновлений и её результатах."""
+        report = catch_up.take_report(self.current_user_id)
+        if report:
+            for result in report['results']:
+                if not result['ok']:
+                    continue
+                titles = result['titles']
+                if result['kind'] == 'fetch' and titles:
+                    print(f"\n{Fore.CYAN}═══ АВТОЗАГРУЗКА ЗАВЕРШЕНА ═══{Style.RESET_ALL}")
+                    print(f"{Fore.GREEN}Загружено {len(titles)} новых статей:{Style.RESET_ALL}")
+                    for title in titles[:10]:
+                        print(f"  • {title[:60]}{'...' if len(title) > 60 else ''}")
+                    if len(titles) > 10:
+                        print(f"  ... и ещё {len(titles) - 10} статей")
+            self._catch_up_notified = True
+        elif not self._catch_up_notified and catch_up.is_running():
+            print(Fore.YELLOW + "⟳ В фоне загружаются пропущенные обновления, результаты появятся здесь.")
+            self._catch_up_notified = True
+
     def show_main_menu(self) -> int:
+        self._show_catch_up_status()
         print(Fore.CYAN + "\n" + "═"*40)
         if self.current_user_id:
             user = self.session.query(User).get(self.current_user_id)
@@ -181,15 +202,18 @@ class InteractiveMenu:
             except Exception as e:
                 print(f"{Fore.RED}Ошибка отслеживания интересов: {e}")
 
-        results = self.aggregator.search_content([query])
-        if not results:
+        matches = self.aggregator.search_content_with_snippets([query])
+        if not matches:
             print(Fore.YELLOW + "Ничего не найдено в БД.")
             return
 
+        results = [item for item, _ in matches]
         print(Fore.CYAN + f"\nНАЙДЕНО В БД: {len(results)} РЕЗУЛЬТАТОВ:")
-        for i, item in enumerate(results, 1):
+        for i, (item, snippet) in enumerate(matches, 1):
             platform_info = f" ({item.platform})" if item.platform else ""
             print(f"{Fore.YELLOW}{i}.{Fore.WHITE} {item.title}{platform_info}")
+            if snippet:
+                print("   " + fts.format_snippet(snippet, Fore.GREEN, Fore.WHITE))
         print(f"{Fore.YELLOW}0.{Fore.WHITE} Назад")
 
         choice = input(Fore.YELLOW + "\nВыберите статью для просмотра (номер): ").strip()
@@ -218,7 +242,8 @@ class InteractiveMenu:
         # Поиск в Habr
         habr_source = self.sources["habr"]["instance"]
         keywords = [kw.strip() for kw in query.split() if kw.strip()]
-        articles = habr_source.fetch_content(keywords, max_results=30)
+        # Полный текст загружается позже: при открытии превью или при сохранении
+        articles = habr_source.fetch_content(keywords, max_results=30, with_full_text=False)
 
         if not articles:
             print(Fore.YELLOW + "Ничего не найдено в Habr.")
@@ -231,6 +256,9 @@ class InteractiveMenu:
 
     def _display_article(self, item: ContentItem) -> None:
         """Отобразить полную информацию о статье с возможностью экспорта."""
+        if item.id is not None:
+            # Списки загружают только заголовки; текст и теги подгружаются при открытии
+            item = load_full_content_item(self.session, item.id) or item
         print(Fore.CYAN + "\n" + "═"*60)
         print(Fore.GREEN + f"ЗАГОЛОВОК: {item.title}")
         print(Fore.WHITE + f"Платформа: {item.platform or 'Неизвестно'}")
@@ -266,6 +294,7 @@ class InteractiveMenu:
         print(f"{Fore.YELLOW}1.{Fore.WHITE} Открыть в браузере")
         print(f"{Fore.YELLOW}2.{Fore.WHITE} Добавить в избранное")
         print(f"{Fore.YELLOW}3.{Fore.WHITE} Отметить как прочитанное")
+        print(f"{Fore.YELLOW}4.{Fore.WHITE} Похожие статьи")
         print(f"{Fore.YELLOW}0.{Fore.WHITE} Назад")
 
         action = input(Fore.YELLOW + "\nДействие: ").strip()
@@ -298,6 +327,25 @@ class InteractiveMenu:
                 existing.mark_completed()
                 self.session.commit()
                 print(Fore.GREEN + "✓ Отмечено как прочитанное")
+        elif action == "4" and item.id is not None:
+            self._show_similar_articles(item)
+
+    def _show_similar_articles(self, item: ContentItem) -> None:
+        """Показать статьи, похожие по тексту на выбранную."""
+        similar = self.aggregator.more_like_this(item.id, max_results=10)
+        if not similar:
+            print(Fore.YELLOW + "Похожие статьи не найдены.")
+            return
+
+        print(Fore.CYAN + f"\nПОХОЖИЕ НА «{item.title}»:")
+        for i, other in enumerate(similar, 1):
+            platform_info = f" ({other.platform})" if other.platform else ""
+            print(f"{Fore.YELLOW}{i}.{Fore.WHITE} {other.title}{platform_info}")
+        print(f"{Fore.YELLOW}0.{Fore.WHITE} Назад")
+
+        choice = input(Fore.YELLOW + "\nВыберите статью для просмотра (номер): ").strip()
+        if choice.isdigit() and 0 < int(choice) <= len(similar):
+            self._display_article(similar[int(choice) - 1])
 
     def manage_sources(self) -> None:
         """Управление источниками контента."""
@@ -382,9 +430,9 @@ class InteractiveMenu:
 
         print(Fore.WHITE + f"Поиск по интересам: {', '.join(keywords[:5])}{'...' if len(keywords) > 5 else ''}")
 
-        # Получить статьи из Habr (минимум 25)
+        # Получить статьи из Habr (минимум 25), только метаданные RSS
         habr_source = self.sources["habr"]["instance"]
-        articles = habr_source.fetch_content(keywords, max_results=30)
+        articles = habr_source.fetch_content(keywords, max_results=30, with_full_text=False)
 
         if not articles:
             print(Fore.YELLOW + "Не удалось найти статьи по вашим интересам.")
@@ -401,14 +449,12 @@ class InteractiveMenu:
 
     def _display_habr_articles_with_download(self, articles: List[ContentItem], title: str) -> None:
         """Отобразить список статей из Habr с возможностью скачивания в БД."""
+        # Какие статьи уже есть в БД: один запрос на весь список, дальше набор обновляется после сохранений
+        saved_keys = existing_content_keys(self.session, (content_key(item) for item in articles))
         while True:
             print(Fore.CYAN + f"\n{title} ({len(articles)} статей):")
             for i, item in enumerate(articles, 1):
-                # Проверить, есть ли уже в БД
-                exists = self.session.query(ContentItem).filter_by(
-                    source_id=item.source_id, platform=item.platform
-                ).first()
-                status = Fore.GREEN + " [В БД]" if exists else ""
+                status = Fore.GREEN + " [В БД]" if content_key(item) in saved_keys else ""
                 date_str = item.published_at.strftime('%d.%m') if item.published_at else ""
                 print(f"{Fore.YELLOW}{i}.{Fore.WHITE} {item.title[:60]}{'...' if len(item.title) > 60 else ''} {Fore.CYAN}{date_str}{status}")
 
@@ -422,16 +468,16 @@ class InteractiveMenu:
             if choice == "0":
                 return
             elif choice == "sa":
-                self._save_articles_to_db(articles)
+                saved_keys.update(content_key(item) for item in self._save_articles_to_db(articles))
             elif choice.startswith("s "):
                 indices = self._parse_indices(choice[2:], len(articles))
                 selected = [articles[i] for i in indices if i < len(articles)]
                 if selected:
-                    self._save_articles_to_db(selected)
+                    saved_keys.update(content_key(item) for item in self._save_articles_to_db(selected))
             elif choice.isdigit():
                 idx = int(choice) - 1
                 if 0 <= idx < len(articles):
-                    self._display_habr_article_preview(articles[idx])
+                    self._display_habr_article_preview(articles[idx], saved_keys)
 
     def _parse_indices(self, input_str: str, max_idx: int) -> List[int]:
         """Парсинг индексов из строки (поддержка диапазонов: 1-5, отдельных: 1 3 5)."""
@@ -451,38 +497,12 @@ class InteractiveMenu:
                     indices.add(idx)
         return sorted(indices)
 
-    def _save_articles_to_db(self, articles: List[ContentItem]) -> None:
-        """Сохранить статьи в БД и обновить интересы пользователя."""
-        saved_count = 0
-        saved_items = []
-        tag_cache = {}  # Кэш для предотвращения дублирования тегов
-
-        for item in articles:
-            exists = self.session.query(ContentItem).filter_by(
-                source_id=item.source_id, platform=item.platform
-            ).first()
-            if not exists:
-                # Обработка тегов с кэшем
-                new_tags = []
-                for tag in (item.tags or []):
-                    tag_name = tag.name.lower() if tag.name else ""
-                    if tag_name:
-                        # Проверить кэш
-                        if tag_name not in tag_cache:
-                            db_tag = self.session.query(Tag).filter_by(name=tag_name).first()
-                            if not db_tag:
-                                db_tag = Tag(name=tag_name)
-                                self.session.add(db_tag)
-                                self.session.flush()  # Немедленно сохранить тег в БД
-                            tag_cache[tag_name] = db_tag
-                        new_tags.append(tag_cache[tag_name])
-                item.tags = new_tags
-                self.session.add(item)
-                saved_items.append(item)
-                saved_count += 1
+    def _save_articles_to_db(self, articles: List[ContentItem]) -> List[ContentItem]:
+        """Сохранить статьи в БД и обновить интересы пользователя. Возвращает сохранённые статьи."""
+        saved_items = save_new_content_items(self.session, articles, prepare=self._load_missing_full_texts)
+        saved_count = len(saved_items)
 
         if saved_count > 0:
-            self.session.commit()
             print(Fore.GREEN + f"✓ Сохранено {saved_count} статей в БД")
 
             # Обновить интересы пользователя на основе тегов сохранённых статей
@@ -491,9 +511,20 @@ class InteractiveMenu:
                 print(Fore.CYAN + "✓ Интересы обновлены на основе тегов статей")
         else:
             print(Fore.YELLOW + "Все выбранные статьи уже есть в БД")
+        return saved_items
+
+    def _load_missing_full_texts(self, items: List[ContentItem]) -> None:
+        """Догрузить полный текст статей, полученных без него (пакетно, параллельно)."""
+        missing_text = [item for item in items if item.full_text is None and item.platform == "habr"]
+        if missing_text:
+            print(Fore.CYAN + f"Загрузка полного текста {len(missing_text)} статей...")
+            self.sources["habr"]["instance"].load_full_texts(missing_text)
 
-    def _display_habr_article_preview(self, item: ContentItem) -> None:
-        """Показать превью статьи из Habr с возможностью скачивания."""
+    def _display_habr_article_preview(self, item: ContentItem, saved_keys: Optional[set] = None) -> None:
+        """Показать превью статьи из Habr с возможностью скачивания.
+
+        ``saved_keys`` - набор ключей статей, уже сохранённых в БД (из списка, откуда открыто превью).
+        """
         print(Fore.CYAN + "\n" + "═"*60)
         print(Fore.GREEN + f"ЗАГОЛОВОК: {item.title}")
         print(Fore.WHITE + f"URL: {item.url or 'Нет ссылки'}")
@@ -509,6 +540,11 @@ class InteractiveMenu:
         print(Fore.WHITE + "ОПИСАНИЕ:")
         print(item.description or "Нет описания")
 
+        # Статьи из поиска приходят без полного текста - загрузить при открытии
+        if item.full_text is None and item.url and item.platform == "habr":
+            print(Fore.CYAN + "\nЗагрузка полного текста...")
+            self.sources["habr"]["instance"].load_full_texts([item])
+
         if item.full_text:
             print(Fore.CYAN + "\n" + "-"*60)
             print(Fore.WHITE + "ПОЛНЫЙ ТЕКСТ (первые 1500 символов):")
@@ -517,9 +553,9 @@ class InteractiveMenu:
         print(Fore.CYAN + "\n" + "═"*60)
 
         # Проверить, есть ли уже в БД
-        exists = self.session.query(ContentItem).filter_by(
-            source_id=item.source_id, platform=item.platform
-        ).first()
+        if saved_keys is None:
+            saved_keys = existing_content_keys(self.session, [content_key(item)])
+        exists = content_key(item) in saved_keys
 
         if exists:
             print(Fore.GREEN + "✓ Эта статья уже сохранена в БД")
@@ -539,7 +575,7 @@ class InteractiveMenu:
                 print(Fore.GREEN + "✓ Открыто в браузере")
         else:
             if action == "1":
-                self._save_articles_to_db([item])
+                saved_keys.update(content_key(saved) for saved in self._save_articles_to_db([item]))
             elif action == "2" and item.url:
                 import webbrowser
                 webbrowser.open(item.url)
@@ -582,22 +618,24 @@ class InteractiveMenu:
 
     def browse_all_articles(self) -> None:
         """Просмотр всех статей в базе данных с пагинацией."""
-        page = 0
         page_size = 15
+        # Курсор (added_at, id) начала каждой открытой страницы: keyset-пагинация без OFFSET
+        page_cursors = [None]
 
         while True:
-            total = self.session.query(ContentItem).count()
+            total = count_content_items(self.session)
             if total == 0:
                 print(Fore.YELLOW + "База данных пуста.")
                 return
 
-            articles = self.session.query(ContentItem).order_by(
-                ContentItem.added_at.desc()
-            ).offset(page * page_size).limit(page_size).all()
+            page = len(page_cursors) - 1
+            articles = get_content_page(self.session, after=page_cursors[-1], limit=page_size)
 
             if not articles:
                 print(Fore.YELLOW + "Больше статей нет.")
-                page = max(0, page - 1)
+                if len(page_cursors) == 1:
+                    return
+                page_cursors.pop()
                 continue
 
             total_pages = (total + page_size - 1) // page_size
@@ -619,19 +657,19 @@ class InteractiveMenu:
             if choice == "0":
                 return
             elif choice == "n":
-                if (page + 1) * page_size < total:
-                    page += 1
+                if (page + 1) * page_size < total and len(articles) == page_size:
+                    last = articles[-1]
+                    page_cursors.append((last.added_at, last.id))
             elif choice == "p":
-                page = max(0, page - 1)
+                if len(page_cursors) > 1:
+                    page_cursors.pop()
             elif choice.isdigit():
-                idx = int(choice) - 1
-                if 0 <= idx < total:
-                    # Получить конкретную статью по индексу
-                    article = self.session.query(ContentItem).order_by(
-                        ContentItem.added_at.desc()
-                    ).offset(idx).first()
-                    if article:
-                        self._display_article(article)
+                idx = int(choice) - 1 - page * page_size
+                if 0 <= idx < len(articles):
+                    # Статья открывается по id выбранной строки
+                    self._display_article(articles[idx])
+                else:
+                    print(Fore.YELLOW + "Выберите номер статьи с текущей страницы.")
 
     def configure_user_settings(self) -> None:
         """Настройка параметров пользователя."""
@@ -786,7 +824,8 @@ class InteractiveMenu:
 
         # Получить статьи из Habr
         habr_source = self.sources["habr"]["instance"]
-        articles = habr_source.fetch_content(keywords, max_results=50)
+        # Полный текст загружается при сохранении и только для новых статей
+        articles = habr_source.fetch_content(keywords, max_results=50, with_full_text=False)
 
         if not articles:
             print(Fore.YELLOW + "Не удалось найти статьи.")
@@ -795,14 +834,9 @@ class InteractiveMenu:
         # Сортировать по дате (свежие первыми)
         articles.sort(key=lambda x: x.published_at or datetime.min, reverse=True)
 
-        # Фильтровать уже существующие в БД
-        new_articles = []
-        for item in articles:
-            exists = self.session.query(ContentItem).filter_by(
-                source_id=item.source_id, platform=item.platform
-            ).first()
-            if not exists:
-                new_articles.append(item)
+        # Фильтровать уже существующие в БД (один запрос на все статьи)
+        existing = existing_content_keys(self.session, (content_key(item) for item in articles))
+        new_articles = [item for item in articles if content_key(item) not in existing]
 
         if not new_articles:
             print(Fore.YELLOW + "Все найденные статьи уже есть в БД.")
@@ -1,14 +1,29 @@
 """
 Services for content aggregation and user management.
+
+Service modules are imported on first attribute access, so importing one
+service does not pull in the others.
 """
 
-from app.services.aggregator import ContentAggregator, update_all_content
-from app.services.recommender import ContentRecommender
-from app.services.exporter import ProgressExporter
+import importlib
+
+_LAZY_EXPORTS = {
+    'ContentAggregator': 'app.services.aggregator',
+    'update_all_content': 'app.services.aggregator',
+    'ContentRecommender': 'app.services.recommender',
+    'ProgressExporter': 'app.services.exporter',
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_EXPORTS:
+        return getattr(importlib.import_module(_LAZY_EXPORTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     'ContentAggregator',
     'update_all_content',
     'ContentRecommender',
     'ProgressExporter',
-]
\ No newline at end of file
+]
@@ -29,106 +29,128 @@ import smtplib
 
 import logging
 import datetime
-from collections import defaultdict
+import re
+from collections import Counter, defaultdict
 from datetime import datetime, timedelta, time
 from typing import Dict, List, Optional, Any, Tuple
 
-from sqlalchemy import or_, and_, desc
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, and_, desc, insert
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session, load_only, selectinload
 
 from app.database import (
     ContentItem, Tag, User, UserSettings, UserInterest, UserProgress,
-    FavoriteContent, SearchQuery, get_db_session, SessionLocal
+    FavoriteContent, SearchQuery, get_db_session, SessionLocal,
+    get_content_items_by_keys, save_new_content_items, rebuild_fulltext_index, rebuild_similarity_index,
+    rebuild_text_index, rebuild_duplicate_index, list_view_options, rank_user_interests, BULK_QUERY_BATCH_SIZE
 )
-from app.sources.youtube import YouTubeSource
-from app.sources.habr import HabrSource
-from app.sources.coursera import CourseraSource
-from app.config import settings
+from app.core import fts
+from app.sources import available_sources
 
 logger = logging.getLogger(__name__)
 
+# Words of a title, description or keyword ('c++' and 'c#' stay whole)
+WORD_PATTERN = re.compile(r'[\w+#]+')
+
+
+def _words(text: str) -> List[str]:
+    return WORD_PATTERN.findall(text.lower().replace('ё', 'е'))
+
+
+def _matches_keyword(keyword: str, phrase: str, tag_names: set, words: set, text: str) -> bool:
+    """Whole-word match of a keyword: an exact tag name, a word, or a phrase of consecutive words.
+
+    ``phrase`` is the keyword's words joined by spaces, ``text`` the item's words
+    joined by spaces and padded with a space on both ends.
+    """
+    if keyword in tag_names:
+        return True
+    if ' ' in phrase:
+        return f" {phrase} " in text
+    return bool(phrase) and phrase in words
+
+
 class ContentAggregator:
     """Aggregates content from all available sources."""
 
     def __init__(self, sources: List[Any] = None, db_session: Session = None):
         """Initialize aggregator with sources and database session."""
-        self.sources = sources or self._get_available_sources()
+        self.sources = sources if sources is not None else self._get_available_sources()
         self.db_session = db_session or SessionLocal()
 
     def _get_available_sources(self) -> List[Any]:
         """Return list of enabled content sources based on configuration."""
-        sources = []
-        if settings.youtube_enabled and settings.youtube_api_key:
-            sources.append(YouTubeSource())
-        if settings.habr_enabled:
-            sources.append(HabrSource())
-        if settings.coursera_enabled and settings.coursera_api_key:
-            sources.append(CourseraSource())
-        return sources
+        return available_sources()
 
     def get_top_interests(self, user_id: int, limit: int = 95) -> List[str]:
         """Получить топ интересов пользователя с учетом приоритета и времени использования."""
         try:
-            interests = self.db_session.query(UserInterest).filter_by(
-                user_id=user_id
-            ).all()
-
-            if not interests:
-                return []
-
-            now = datetime.utcnow()
-            scored_interests = []
-
-            for interest in interests:
-                # Защита от None в last_used - использовать created_at или now как fallback
-                last_used = interest.last_used or interest.created_at or now
-                days_unused = (now - last_used).days
-                decay_factor = 0.9 ** (days_unused / 30)
-                adjusted_priority = interest.priority * decay_factor
-
-                scored_interests.append({
-                    'tag_name': interest.tag_name,
-                    'adjusted_priority': adjusted_priority
-                })
-
-            scored_interests.sort(key=lambda x: x['adjusted_priority'], reverse=True)
-            top_tags = [item['tag_name'] for item in scored_interests[:limit]]
-            return top_tags
+            top, _ = rank_user_interests(self.db_session, user_id, limit)
+            return [tag_name for _, tag_name in top]
 
         except Exception as e:
             logger.error(f"Ошибка получения топ интересов для пользователя {user_id}: {e}")
-            fallback = self.db_session.query(UserInterest).filter_by(user_id=user_id).all()
-            return [i.tag_name for i in fallback[:limit]]
+            fallback = self.db_session.query(UserInterest.tag_name).filter_by(user_id=user_id).limit(limit).all()
+            return [row.tag_name for row in fallback]
 
     def _trim_interests_to_limit(self, user_id: int, limit: int = 95) -> None:
         """Автоматически обрезать интересы пользователя до указанного лимита."""
         try:
-            all_interests = self.db_session.query(UserInterest).filter_by(user_id=user_id).all()
-            if len(all_interests) <= limit:
+            top, total = rank_user_interests(self.db_session, user_id, limit)
+            if total <= limit:
                 return
 
-            now = datetime.utcnow()
-            scored = []
-            for interest in all_interests:
-                # Защита от None в last_used - использовать created_at или now как fallback
-                last_used = interest.last_used or interest.created_at or now
-                days_unused = (now - last_used).days
-                decay_factor = 0.9 ** (days_unused / 30)
-                adjusted_priority = interest.priority * decay_factor
-                scored.append((interest, adjusted_priority))
-
-            scored.sort(key=lambda x: x[1], reverse=True)
-            to_delete = scored[limit:]
-            if to_delete:
-                for interest, _ in to_delete:
-                    self.db_session.delete(interest)
-                self.db_session.commit()
+            keep_ids = [interest_id for interest_id, _ in top]
+            self.db_session.query(UserInterest).filter(
+                UserInterest.user_id == user_id, UserInterest.id.notin_(keep_ids)
+            ).delete(synchronize_session='fetch')
+            self.db_session.commit()
         except Exception as e:
             logger.error(f"Ошибка при обрезке интересов пользователя {user_id}: {e}")
             self.db_session.rollback()
 
-    def aggregate_by_keywords(self, keywords: List[str], max_per_source: int = 20) -> List[ContentItem]:
-        """Fetch content from all sources for given keywords."""
+    def _bump_interests(self, user_id: int, tag_names: List[str], increment: int, new_priority: int) -> None:
+        """Upsert interests for a batch of tag names with one SELECT.
+
+        Existing interests are marked used (priority += increment per occurrence,
+        capped at 10); missing ones are inserted with ``new_priority`` in one
+        executemany. Does not commit.
+        """
+        counts = Counter(UserInterest.normalize_tag_name(name) for name in tag_names if name and name.strip())
+        if not counts:
+            return
+
+        names = list(counts)
+        existing = {}
+        for start in range(0, len(names), BULK_QUERY_BATCH_SIZE):
+            for interest in self.db_session.query(UserInterest).filter(
+                UserInterest.user_id == user_id,
+                UserInterest.tag_name.in_(names[start:start + BULK_QUERY_BATCH_SIZE])
+            ).order_by(UserInterest.id):
+                existing.setdefault(interest.tag_name, interest)
+
+        now = datetime.utcnow()
+        new_rows = []
+        for name, occurrences in counts.items():
+            interest = existing.get(name)
+            if interest:
+                interest.mark_used(increment * occurrences)
+            else:
+                new_rows.append({
+                    'user_id': user_id, 'tag_name': name,
+                    'priority': min(new_priority + increment * (occurrences - 1), 10),
+                    'created_at': now, 'last_used': now,
+                })
+        if new_rows:
+            self.db_session.execute(insert(UserInterest), new_rows)
+
+    def aggregate_by_keywords(self, keywords: List[str], max_per_source: int = 20,
+                              since_last_run: bool = False) -> List[ContentItem]:
+        """Fetch content from all sources for given keywords.
+
+        With ``since_last_run`` sources skip entries at or below their feeds'
+        high-water marks; call ``_commit_watermarks`` after saving the items.
+        """
         keywords = [kw.strip().lower() for kw in keywords if kw and kw.strip()]
 
         if len(keywords) > 95:
@@ -140,7 +162,10 @@ class ContentAggregator:
         results = []
         for source in self.sources:
             try:
-                items = source.fetch_content(keywords, max_per_source)
+                if since_last_run:
+                    items = source.fetch_new_content(keywords, max_per_source, self.db_session)
+                else:
+                    items = source.fetch_content(keywords, max_per_source)
                 results.extend(items)
             except Exception as e:
                 logger.error(f"Ошибка при запросе к источнику {source.__class__.__name__}: {e}")
@@ -156,55 +181,191 @@ class ContentAggregator:
 
     def save_content_items(self, content_items: List[ContentItem]) -> int:
         """Save new content items to database."""
-        saved_count = 0
-        tag_cache = {}
-        for item in content_items:
-            exists = self.db_session.query(ContentItem).filter_by(
-                source_id=item.source_id, platform=item.platform
-            ).first()
-            if exists:
-                continue
+        return len(self._save_new_content_items(content_items))
 
-            new_tags = []
-            for tag in (item.tags or []):
-                tag_name = tag.name.lower() if tag.name else ""
-                if tag_name not in tag_cache:
-                    db_tag = self.db_session.query(Tag).filter_by(name=tag_name).first()
-                    if not db_tag:
-                        db_tag = Tag(name=tag_name)
-                        self.db_session.add(db_tag)
-                    tag_cache[tag_name] = db_tag
-                new_tags.append(tag_cache[tag_name])
-            item.tags = new_tags
-            self.db_session.add(item)
-            saved_count += 1
-        self.db_session.commit()
-        return saved_count
+    def _save_new_content_items(self, content_items: List[ContentItem]) -> List[ContentItem]:
+        """Save content items that are not in the database yet and return them."""
+        return save_new_content_items(self.db_session, content_items)
+
+    def _commit_watermarks(self) -> None:
+        """Advance the sources' feed high-water marks once fetched items are saved."""
+        for source in self.sources:
+            try:
+                source.commit_watermarks(self.db_session)
+            except Exception as e:
+                self.db_session.rollback()
+                logger.error(f"Ошибка сохранения отметок лент {source.__class__.__name__}: {e}")
 
-    def get_daily_digest(self, user_id: int, max_items: int = 15) -> List[ContentItem]:
-        """Get personalized daily digest for user."""
+    def get_daily_digest(self, user_id: int, max_items: int = 15, with_description: bool = False) -> List[ContentItem]:
+        """Get personalized daily digest for user (list columns only, plus description if requested)."""
         keywords = self.get_top_interests(user_id, 95)
+        options = list_view_options(ContentItem.description) if with_description else list_view_options()
+        # Near-duplicates are represented by the first item of their cluster
+        query = self.db_session.query(ContentItem).options(options).filter(ContentItem.duplicate_of.is_(None))
         if not keywords:
-            return self.db_session.query(ContentItem).order_by(ContentItem.published_at.desc()).limit(max_items).all()
+            return query.order_by(ContentItem.published_at.desc()).limit(max_items).all()
         tag_filters = or_(*[Tag.name.ilike(f"%{kw}%") for kw in keywords])
-        return self.db_session.query(ContentItem).join(ContentItem.tags).filter(tag_filters).order_by(ContentItem.published_at.desc()).limit(max_items).all()
+        return query.join(ContentItem.tags).filter(tag_filters).order_by(ContentItem.published_at.desc()).limit(max_items).all()
 
     def update_content_for_user(self, user_id: int) -> int:
         """Fetch and save new content based on user interests."""
         keywords = self.get_top_interests(user_id, 95)
         if not keywords:
             return 0
-        items = self.aggregate_by_keywords(keywords, max_per_source=50)
-        return self.save_content_items(items)
+        items = self.aggregate_by_keywords(keywords, max_per_source=50, since_last_run=True)
+        saved = self.save_content_items(items)
+        self._commit_watermarks()
+        return saved
+
+    def update_content_for_users(self, user_ids: List[int], keywords_limit: int = 95,
+                                 max_per_user: int = 50) -> Dict[int, List[ContentItem]]:
+        """Fetch content once for the union of users' interests and attribute new items to users.
+
+        Each keyword is requested from the sources only once, however many users
+        share it, and each article is saved once. New items are then assigned to
+        every user whose interests match the item's tags (exact name), title or
+        description (whole words).
+        """
+        user_keywords = {}
+        for user_id in user_ids:
+            keywords = self.get_top_interests(user_id, keywords_limit)
+            if keywords:
+                user_keywords[user_id] = [kw.strip().lower() for kw in keywords if kw and kw.strip()]
+
+        results: Dict[int, List[ContentItem]] = {user_id: [] for user_id in user_ids}
+        if not user_keywords:
+            return results
+
+        # Union of keywords: shared interests first, then by first appearance
+        frequency = defaultdict(int)
+        for keywords in user_keywords.values():
+            for kw in set(keywords):
+                frequency[kw] += 1
+        first_seen = {}
+        for keywords in user_keywords.values():
+            for kw in keywords:
+                first_seen.setdefault(kw, len(first_seen))
+        union_keywords = sorted(first_seen, key=lambda kw: (-frequency[kw], first_seen[kw]))
+
+        fetched = []
+        for start in range(0, len(union_keywords), 95):
+            chunk = union_keywords[start:start + 95]
+            # Each user sharing the chunk's keywords gets as many results as a separate fetch would give
+            chunk_keywords = set(chunk)
+            users = sum(1 for keywords in user_keywords.values() if chunk_keywords.intersection(keywords))
+            fetched.extend(self.aggregate_by_keywords(
+                chunk, max_per_source=max_per_user * users, since_last_run=True
+            ))
+
+        seen = set()
+        unique_items = []
+        for item in fetched:
+            key = (item.source_id, item.platform)
+            if key not in seen:
+                seen.add(key)
+                unique_items.append(item)
+
+        saved_items = self._save_new_content_items(unique_items)
+        self._commit_watermarks()
+        logger.info(f"Пакетное обновление: {len(union_keywords)} уникальных ключевых слов, "
+                    f"{len(unique_items)} найдено, {len(saved_items)} новых для {len(user_keywords)} пользователей")
+
+        user_phrases = {
+            user_id: [(kw, ' '.join(_words(kw))) for kw in keywords]
+            for user_id, keywords in user_keywords.items()
+        }
+        for item in saved_items:
+            tag_names = {tag.name.lower() for tag in (item.tags or []) if tag.name}
+            item_words = _words(f"{item.title or ''} {item.description or ''}")
+            words, text = set(item_words), f" {' '.join(item_words)} "
+            for user_id, phrases in user_phrases.items():
+                if len(results[user_id]) >= max_per_user:
+                    continue
+                if any(_matches_keyword(kw, phrase, tag_names, words, text) for kw, phrase in phrases):
+                    results[user_id].append(item)
+        return results
 
     def search_content(self, keywords: List[str], max_results: int = 50) -> List[ContentItem]:
         """Search content items by keywords."""
-        query = self.db_session.query(ContentItem).distinct()
+        return [item for item, _ in self.search_content_with_snippets(keywords, max_results)]
+
+    def search_content_with_snippets(self, keywords: List[str], max_results: int = 50) -> List[Tuple[ContentItem, Optional[str]]]:
+        """Search content items with FTS5 (BM25 ranking and snippets), falling back to LIKE search."""
+        keywords = [kw for kw in keywords if kw and kw.strip()]
+        if keywords:
+            matches = fts.search(self.db_session.connection(), keywords, max_results)
+            if matches is not None:
+                ids = [content_id for content_id, _ in matches]
+                items = {item.id: item for item in self.db_session.query(ContentItem).options(
+                    list_view_options()
+                ).filter(ContentItem.id.in_(ids)).all()} if ids else {}
+                return [(items[content_id], snippet) for content_id, snippet in matches if content_id in items]
+        return [(item, None) for item in self._search_content_like(keywords, max_results)]
+
+    def _search_content_like(self, keywords: List[str], max_results: int = 50) -> List[ContentItem]:
+        """Search content items with LIKE predicates (used when FTS5 is unavailable)."""
+        query = self.db_session.query(ContentItem).options(list_view_options()).distinct()
         if keywords:
             conditions = [or_(ContentItem.title.ilike(f"%{k}%"), ContentItem.description.ilike(f"%{k}%"), Tag.name.ilike(f"%{k}%")) for k in keywords]
             query = query.outerjoin(ContentItem.tags).filter(or_(*conditions))
         return query.order_by(ContentItem.published_at.desc()).limit(max_results).all()
 
+    def rebuild_search_index(self) -> int:
+        """Rebuild the full-text search index from all stored content items."""
+        count = rebuild_fulltext_index(self.db_session)
+        self.db_session.commit()
+        return count
+
+    def rebuild_similarity_index(self) -> int:
+        """Rebuild the similar-content index (item neighbours, tag co-occurrence)."""
+        count = rebuild_similarity_index(self.db_session)
+        self.db_session.commit()
+        return count
+
+    def rebuild_duplicate_index(self) -> int:
+        """Recompute near-duplicate signatures and clusters for all stored items."""
+        count = rebuild_duplicate_index(self.db_session)
+        self.db_session.commit()
+        return count
+
+    def rebuild_text_index(self) -> int:
+        """Rebuild the TF-IDF text index used for "more like this"."""
+        return rebuild_text_index(self.db_session)
+
+    def more_like_this(self, content_id: int, max_results: int = 10) -> List[ContentItem]:
+        """Items with the most similar text; falls back to tag neighbours without a text index.
+
+        Near-duplicates of the item are skipped and each other cluster is shown once.
+        """
+        from app.core import similarity, text_index  # NumPy: imported on first use, not at startup
+        index = text_index.get_index()
+        try:
+            ranked = index.similar([content_id], max_results * 2) if index is not None else []
+        except (OSError, ValueError) as e:
+            logger.warning(f"Text index unavailable: {e}")
+            ranked = []
+        if not ranked:
+            ranked = [row[1:] for row in similarity.neighbors(self.db_session.connection(), [content_id])]
+        ids = [similar_id for similar_id, _ in ranked]
+        if not ids:
+            return []
+        items = {item.id: item for item in self.db_session.query(ContentItem).options(
+            list_view_options()
+        ).filter(ContentItem.id.in_(ids + [content_id])).all()}
+
+        source = items.get(content_id)
+        seen_clusters = {source.duplicate_of or source.id} if source else set()
+        results = []
+        for similar_id in ids:
+            item = items.get(similar_id)
+            if item is None or (item.duplicate_of or item.id) in seen_clusters:
+                continue
+            seen_clusters.add(item.duplicate_of or item.id)
+            results.append(item)
+            if len(results) == max_results:
+                break
+        return results
+
     def search_live(self, keywords: List[str], source_name: str = "habr", max_results: int = 50) -> List[ContentItem]:
         """Search content in real-time from specified source."""
 
@@ -218,15 +379,15 @@ class ContentAggregator:
 
     def save_selected_items(self, items: List[ContentItem], source_name: str = "habr", user_id: Optional[int] = None) -> List[ContentItem]:
         """Save selected content items and update user interests."""
+        existing = get_content_items_by_keys(self.db_session, ((item.source_id, item.platform) for item in items))
+        new_items = save_new_content_items(self.db_session, items)
+        new_by_key = {(str(item.source_id), item.platform): item for item in new_items}
         saved = []
         for item in items:
-            exists = self.db_session.query(ContentItem).filter_by(source_id=item.source_id, platform=item.platform).first()
-            if not exists:
-                self.db_session.add(item)
-                saved.append(item)
-            else:
-                saved.append(exists)
-        self.db_session.commit()
+            key = (str(item.source_id), item.platform)
+            stored = existing.get(key) or new_by_key.get(key)
+            if stored is not None and stored not in saved:
+                saved.append(stored)
         if user_id:
             self.add_user_interests_from_content(user_id, saved)
         return saved
@@ -238,12 +399,7 @@ class ContentAggregator:
             self.db_session.add(sq)
             self.db_session.commit()
             keywords = [w.lower().strip() for w in query.split() if len(w) >= 3]
-            for kw in keywords:
-                interest = self.db_session.query(UserInterest).filter_by(user_id=user_id, tag_name=kw).first()
-                if interest:
-                    interest.mark_used(2)
-                else:
-                    self.db_session.add(UserInterest(user_id=user_id, tag_name=kw, priority=6))
+            self._bump_interests(user_id, keywords, increment=2, new_priority=6)
             self.db_session.commit()
             self._trim_interests_to_limit(user_id, 95)
             return True
@@ -253,20 +409,26 @@ class ContentAggregator:
 
     def add_user_interests_from_content(self, user_id: int, content_items: List[ContentItem]) -> None:
         """Обновить интересы на основе тегов статей."""
-        for item in content_items:
-            for tag in item.tags:
-                interest = self.db_session.query(UserInterest).filter_by(user_id=user_id, tag_name=tag.name.lower()).first()
-                if interest:
-                    interest.mark_used(1)
-                else:
-                    self.db_session.add(UserInterest(user_id=user_id, tag_name=tag.name.lower(), priority=5))
+        # Saved items come back with expired tags: load them for all items at once
+        pending_ids = [
+            sa_inspect(item).identity[0] for item in content_items
+            if sa_inspect(item).persistent and 'tags' in sa_inspect(item).unloaded
+        ]
+        for start in range(0, len(pending_ids), BULK_QUERY_BATCH_SIZE):
+            self.db_session.query(ContentItem).options(
+                load_only(ContentItem.id), selectinload(ContentItem.tags)
+            ).filter(ContentItem.id.in_(pending_ids[start:start + BULK_QUERY_BATCH_SIZE])).all()
+
+        tag_names = [tag.name for item in content_items for tag in item.tags]
+        self._bump_interests(user_id, tag_names, increment=1, new_priority=5)
         self.db_session.commit()
         self._trim_interests_to_limit(user_id, 95)
 
     def check_and_update_content_for_all_users(self) -> Dict[int, int]:
         """Update content for all users with auto-update enabled."""
         users = self.db_session.query(User).join(UserSettings).filter(UserSettings.auto_update_content == True).all()
-        return {u.id: self.update_content_for_user(u.id) for u in users}
+        results = self.update_content_for_users([u.id for u in users])
+        return {user_id: len(items) for user_id, items in results.items()}
 
     def check_missed_digests(self) -> Dict[int, bool]:
         """Placeholder for missed digest check."""
@@ -276,6 +438,8 @@ def update_all_content() -> Dict[str, int]:
     """Update content for all users."""
     session = SessionLocal()
     aggregator = ContentAggregator(db_session=session)
-    results = {u.username: aggregator.update_content_for_user(u.id) for u in session.query(User).all()}
+    users = session.query(User).all()
+    updated = aggregator.update_content_for_users([u.id for u in users])
+    results = {u.username: len(updated[u.id]) for u in users}
     session.close()
     return results
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Catch-up of missed scheduled jobs off the startup path.
+
+On startup the application only checks the local database for due jobs and, if
+there are any, starts ``main.py catch-up`` as a detached process. That process
+runs the due jobs under a lock file, so concurrent invocations never duplicate
+the work, and leaves a report that the interactive menu shows when it is done.
+While a ``run-scheduler`` process is running it runs due jobs itself, so no
+catch-up is started.
+"""
+
+import datetime
+import json
+import logging
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.core.lock_file import LockFile
+from app.database import SessionLocal
+from app.services.scheduler import JobResult, JobScheduler, has_due_jobs
+
+logger = logging.getLogger(__name__)
+
+MAIN_SCRIPT = Path(__file__).resolve().parents[2] / 'main.py'
+
+
+def get_lock() -> LockFile:
+    """Lock held while missed jobs are being run (by catch-up or run-scheduler)."""
+    return LockFile(settings.catch_up_lock_path)
+
+
+def is_running() -> bool:
+    """Check whether another process is running missed jobs right now."""
+    return get_lock().is_locked()
+
+
+def get_scheduler_lock() -> LockFile:
+    """Lock held by a run-scheduler process for its whole lifetime."""
+    return LockFile(settings.scheduler_lock_path)
+
+
+def scheduler_is_running() -> bool:
+    """Check whether a run-scheduler process is running (it runs due jobs itself)."""
+    return get_scheduler_lock().is_locked()
+
+
+def start_in_background() -> bool:
+    """Start a detached catch-up process if jobs are due and nothing runs them. Local work only."""
+    if is_running() or scheduler_is_running():
+        return False
+    session = SessionLocal()
+    try:
+        if not has_due_jobs(session):
+            return False
+    finally:
+        session.close()
+
+    log_path = Path(settings.catch_up_log_path)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    options = {}
+    if os.name == 'nt':
+        options['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        options['start_new_session'] = True
+    with open(log_path, 'ab') as log:
+        subprocess.Popen(
+            [sys.executable, str(MAIN_SCRIPT), 'catch-up', '--report', '--app-skip-check'],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, close_fds=True, **options
+        )
+    return True
+
+
+def run(write_report: bool = False) -> Optional[List[JobResult]]:
+    """Run every due job under the lock; returns None if another process holds it or a scheduler runs."""
+    if scheduler_is_running():
+        return None
+    lock = get_lock()
+    if not lock.acquire():
+        return None
+    try:
+        results = JobScheduler().run_pending()
+        if write_report and results:
+            _write_report(results)
+        return results
+    finally:
+        lock.release()
+
+
+def _report_path(user_id: int) -> Path:
+    path = Path(settings.catch_up_report_path)
+    return path.with_name(f"{path.stem}.{user_id}{path.suffix}")
+
+
+def _write_report(results: List[JobResult]) -> None:
+    """Store results for the interactive menu, one file per user (replaced atomically).
+
+    Entries not shown yet are kept; only the catch-up process (under the lock) writes.
+    """
+    finished_at = datetime.datetime.utcnow().isoformat()
+    entries: Dict[int, List[Dict[str, Any]]] = {}
+    for r in results:
+        for user_id in r.user_ids:
+            entries.setdefault(user_id, []).append({
+                'kind': r.kind, 'ok': r.ok, 'error': r.error,
+                'titles': r.titles.get(user_id, []), 'finished_at': finished_at,
+            })
+    for user_id, user_entries in entries.items():
+        path = _report_path(user_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            user_entries = json.loads(path.read_text(encoding='utf-8'))['results'] + user_entries
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({'results': user_entries}, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+
+def take_report(user_id: Optional[int]) -> Optional[Dict[str, Any]]:
+    """Return a user's background catch-up results not shown yet (once), or None."""
+    if user_id is None:
+        return None
+    path = _report_path(user_id)
+    # Claim the file first, so concurrent menus of the same user show it once
+    claimed = path.with_name(f"{path.name}.{os.getpid()}")
+    try:
+        os.replace(path, claimed)
+    except OSError:
+        return None
+    try:
+        return json.loads(claimed.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    finally:
+        claimed.unlink(missing_ok=True)
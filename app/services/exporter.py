@@ -3,7 +3,6 @@ import datetime
 from typing import Dict, Any, List
 from pathlib import Path
 from sqlalchemy.orm import Session
-from docx import Document
 
 from app.database import User, UserProgress, ContentItem, get_db_session, SessionLocal
 
@@ -59,6 +58,7 @@ class ProgressExporter:
     def export_to_docx(self, user_id: int, filepath: str) -> bool:
         """Export user data to DOCX format."""
         try:
+            from docx import Document  # python-docx is only needed for this export
             data = self._generate_resume_data(user_id)
             doc = Document()
 
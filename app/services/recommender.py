@@ -6,15 +6,22 @@ from sqlalchemy import and_, or_, not_
 from sqlalchemy import desc
 
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional, Set
 from datetime import datetime, timedelta
 
 from sqlalchemy import and_, or_, not_, desc
 from sqlalchemy.orm import Session, joinedload
 
+import numpy as np
+
 from app.database import (
     ContentItem, User, UserProgress, Tag, DifficultyLevel,
-    FavoriteContent, SearchQuery, get_db_session, SessionLocal
+    FavoriteContent, SearchQuery, get_db_session, SessionLocal,
+    BULK_QUERY_BATCH_SIZE, content_tags, list_view_options, rank_user_interests
+)
+from app.core import similarity, text_index
+from app.services.scoring import (
+    DIFFICULTY_CODES, best_per_cluster, load_candidates, score_strategies, time_decay, top_k
 )
 from app.config import settings
 
@@ -27,114 +34,132 @@ class ContentRecommender:
         self.db_session = db_session or SessionLocal()
 
     def get_recommendations(self, user_id: int, max_recommendations: int = 5) -> List[ContentItem]:
-        """Generate personalized recommendations using weighted scoring and time decay."""
+        """Generate personalized recommendations using weighted scoring and time decay.
+
+        All items sharing a tag with the user's completed items, favorites or
+        interests are scored at once (see app.services.scoring). Strategies, in
+        priority order: next level, similar, text, interests, favorites. "Similar"
+        and "next level" use the precomputed neighbour index (app.core.similarity)
+        when it is available, otherwise any shared tag with completed items.
+        "Text" is the TF-IDF neighbourhood of completed and favorite items
+        (app.core.text_index), which may include items without shared tags.
+        """
         user = self.db_session.query(User).get(user_id)
         if not user:
             return []
 
         # Get user preference weights
         weights = self.get_user_preference_weights(user_id)
-        
-        # Get completed items to filter them out
-        completed_items = [p.content for p in user.progress if p.completed and p.content]
-        completed_ids = {c.id for c in completed_items}
-        completed_tags = list(set(t.name for c in completed_items for t in c.tags))
-
-        # Extract favorite content tags
-        favorites = self.db_session.query(FavoriteContent).filter_by(user_id=user_id).all()
-        favorite_items = [fc.content for fc in favorites if fc.content]
-        try:
-            favorite_tags = list(set(t.name for c in favorite_items for t in c.tags))
-        except AttributeError:
-            favorite_tags = []
-
-        # Strategies
-        strategies = {
-            'next_level': (self._get_next_level_content(user_id, completed_tags), weights.get('completed', 1.2)),
-            'similar': (self._get_similar_content(user_id, [c.id for c in completed_items if c.id]), weights.get('similar', 1.0)),
-            'interests': (self._get_content_based_on_interests(user_id), weights.get('interests', 1.5)),
-            'favorites': (self._get_content_based_on_favorites(user_id, favorite_tags), weights.get('favorites', 2.0))
-        }
-
-        # Scoring
-        scored_items = {}  # item_id -> (item, score, match_count)
-        now = datetime.utcnow()
-
-        for strat_name, (items, weight) in strategies.items():
-            for item in items:
-                if item.id in completed_ids:
-                    continue
-                
-                if item.id not in scored_items:
-                    # Base score calculation with time decay
-                    days_old = (now - item.published_at).days if item.published_at else 30
-                    time_decay = 0.95 ** (days_old / 7)
-                    base_score = 1.0 * time_decay
-                    scored_items[item.id] = [item, base_score * weight, 1]
-                else:
-                    scored_items[item.id][1] += 1.0 * weight
-                    scored_items[item.id][2] += 1  # Increment match count
-
-        # Apply multi-strategy bonus
-        for item_data in scored_items.values():
-            if item_data[2] > 1:  # Matched by multiple strategies
-                item_data[1] *= 1.5
-
-        # Sort by score and return
-        sorted_items = sorted(scored_items.values(), key=lambda x: x[1], reverse=True)
-        return [item[0] for item in sorted_items[:max_recommendations]]
-
-    def _get_next_level_content(self, user_id: int, completed_tags: List[str]) -> List[ContentItem]:
-        """Find content that progresses the user's difficulty level."""
-        # Simplified: find intermediate content for tags where user finished beginner
-        return self.db_session.query(ContentItem).join(ContentItem.tags).filter(
-            Tag.name.in_(completed_tags),
-            ContentItem.difficulty != DifficultyLevel.BEGINNER
-        ).limit(10).all()
-
-    def _get_similar_content(self, user_id: int, liked_content_ids: List[int]) -> List[ContentItem]:
-        """Find content similar to what user has already completed."""
-        if not liked_content_ids:
-            return []
-        
-        tags = self.db_session.query(Tag).join(Tag.content_items).filter(
-            ContentItem.id.in_(liked_content_ids)
-        ).all()
-        tag_names = [t.name for t in tags]
-        
-        return self.db_session.query(ContentItem).join(ContentItem.tags).filter(
-            Tag.name.in_(tag_names)
-        ).limit(10).all()
-
-    def _get_content_based_on_interests(self, user_id: int) -> List[ContentItem]:
-        """Find content matching user's explicit interests."""
-        from app.services.aggregator import ContentAggregator
 
-        aggregator = ContentAggregator(db_session=self.db_session)
-        interest_tags = aggregator.get_top_interests(user_id, 95)
-
-        if not interest_tags:
+        completed_ids = self._completed_content_ids(user_id)
+        completed_tag_ids = self._tag_ids_of_content(completed_ids)
+        favorite_ids = [row[0] for row in self.db_session.query(FavoriteContent.content_id).filter(
+            FavoriteContent.user_id == user_id
+        ).all()]
+        favorite_tag_ids = self._tag_ids_of_content(favorite_ids)
+        interest_tag_ids = self._interest_tag_ids(user_id)
+
+        connection = self.db_session.connection()
+        use_index = similarity.is_enabled(connection)
+        related_tag_ids = set(similarity.related_tags(connection, completed_tag_ids, 10)) if use_index else set()
+
+        text_ids = self._text_similar_ids(completed_ids | set(favorite_ids))
+
+        candidates = load_candidates(
+            self.db_session, completed_tag_ids | favorite_tag_ids | interest_tag_ids | related_tag_ids,
+            content_ids=text_ids
+        )
+        if not len(candidates):
             return []
 
-        return self.db_session.query(ContentItem).join(ContentItem.tags).filter(
-            Tag.name.in_(interest_tags)
-        ).order_by(ContentItem.added_at.desc()).limit(10).all()
+        above_beginner = candidates.difficulty > DIFFICULTY_CODES[DifficultyLevel.BEGINNER]
+        if use_index:
+            next_level, similar = self._neighbor_masks(candidates, completed_ids)
+            # adjacent topics (tags that co-occur with completed ones) also count as the next step
+            next_level |= candidates.has_any_tag(related_tag_ids) & above_beginner
+        else:
+            similar = candidates.has_any_tag(completed_tag_ids)
+            next_level = similar & above_beginner
+        masks = np.column_stack([
+            next_level,
+            similar,
+            candidates.contains(text_ids),
+            candidates.has_any_tag(interest_tag_ids),
+            candidates.has_any_tag(favorite_tag_ids),
+        ])
+        strategy_weights = np.array([
+            weights.get('completed', 1.2), weights.get('similar', 1.0), weights.get('text', 1.3),
+            weights.get('interests', 1.5), weights.get('favorites', 2.0),
+        ])
+
+        scores = score_strategies(masks, strategy_weights, time_decay(candidates.age_days))
+        # Near-duplicates: skip copies of completed items, recommend one item per cluster
+        completed = candidates.contains(completed_ids)
+        scores[completed | np.isin(candidates.cluster, candidates.cluster[completed])] = -np.inf
+        scores = best_per_cluster(candidates.cluster, scores)
+        top_ids = top_k(candidates.ids, scores, max_recommendations)
+        if not top_ids:
+            return []
 
-    def _get_content_based_on_favorites(self, user_id: int, favorite_tags: List[str]) -> List[ContentItem]:
-        """Find content matching tags from user's favorite items."""
-        if not favorite_tags:
+        items = {item.id: item for item in self.db_session.query(ContentItem).options(
+            list_view_options()
+        ).filter(ContentItem.id.in_(top_ids)).all()}
+        return [items[content_id] for content_id in top_ids if content_id in items]
+
+    def _neighbor_masks(self, candidates, completed_ids: Set[int]):
+        """Masks (next level, similar) from the precomputed neighbours of completed items.
+
+        Similar: a neighbour of any completed item. Next level: a neighbour that
+        is harder than its completed seed (and above beginner).
+        """
+        rows = similarity.neighbors(self.db_session.connection(), completed_ids)
+        if not rows:
+            empty = np.zeros(len(candidates), dtype=bool)
+            return empty, empty.copy()
+        seeds = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        neighbor_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+        floor = np.maximum(candidates.difficulty_of(seeds), DIFFICULTY_CODES[DifficultyLevel.BEGINNER])
+        harder = candidates.difficulty_of(neighbor_ids) > floor
+        return candidates.contains(neighbor_ids[harder]), candidates.contains(neighbor_ids)
+
+    def _text_similar_ids(self, seed_ids: Set[int], limit: int = 50) -> List[int]:
+        """Ids of items whose text is closest to the seed items (empty without a text index)."""
+        index = text_index.get_index()
+        if index is None or not seed_ids:
+            return []
+        try:
+            return [content_id for content_id, _ in index.similar(seed_ids, limit)]
+        except (OSError, ValueError) as e:
+            logger.warning(f"Text index unavailable: {e}")
             return []
 
-        completed_ids = self.db_session.query(UserProgress.content_id).filter(
+    def _completed_content_ids(self, user_id: int) -> Set[int]:
+        """Ids of content the user has completed."""
+        rows = self.db_session.query(UserProgress.content_id).filter(
             UserProgress.user_id == user_id,
-            UserProgress.completed == True
+            UserProgress.completed == True,
+            UserProgress.content_id.isnot(None)
         ).all()
-        completed_ids = [r[0] for r in completed_ids]
-
-        return self.db_session.query(ContentItem).join(ContentItem.tags).filter(
-            Tag.name.in_(favorite_tags),
-            not_(ContentItem.id.in_(completed_ids))
-        ).limit(10).all()
+        return {row[0] for row in rows}
+
+    def _tag_ids_of_content(self, content_ids: Iterable[int]) -> Set[int]:
+        """Ids of all tags attached to the given content items."""
+        content_ids = list(content_ids)
+        tag_ids = set()
+        for start in range(0, len(content_ids), BULK_QUERY_BATCH_SIZE):
+            rows = self.db_session.query(content_tags.c.tag_id).filter(
+                content_tags.c.content_id.in_(content_ids[start:start + BULK_QUERY_BATCH_SIZE])
+            ).distinct().all()
+            tag_ids.update(row[0] for row in rows)
+        return tag_ids
+
+    def _interest_tag_ids(self, user_id: int) -> Set[int]:
+        """Ids of tags matching the user's top interests."""
+        top, _ = rank_user_interests(self.db_session, user_id, 95)
+        names = [tag_name for _, tag_name in top]
+        if not names:
+            return set()
+        return {row[0] for row in self.db_session.query(Tag.id).filter(Tag.name.in_(names)).all()}
 
     def get_interest_suggestions(self, user_id: int, max_suggestions: int = 10) -> List[str]:
             """Предложить интересы на основе избранного, завершенного контента и поисковых запросов пользователя."""
@@ -185,7 +210,7 @@ class ContentRecommender:
 
     def get_user_preference_weights(self, user_id: int) -> Dict[str, float]:
         """Получить веса предпочтений пользователя для алгоритма рекомендаций."""
-        defaults = {'interests': 1.5, 'favorites': 2.0, 'completed': 1.2, 'similar': 1.0}
+        defaults = {'interests': 1.5, 'favorites': 2.0, 'completed': 1.2, 'similar': 1.0, 'text': 1.3}
         try:
             user = self.db_session.query(User).get(user_id)
             if not user:
@@ -0,0 +1,381 @@
+"""
+Job scheduler: per-user fetch and digest jobs kept in a min-heap by due time and
+run by a worker pool.
+
+Due times come from UserSettings (auto_download_hour, digest_hour) plus a stable
+per-user offset within the hour, so work is spread out instead of starting for
+everyone at once; users with auto-update but no download hour get a stable hour
+of their own. Fetch jobs due together are batched, so shared interests are
+requested once per source. Job state lives in the scheduled_jobs table: runs
+missed while the application was not running are caught up (once) on the next
+start.
+"""
+
+import datetime
+import heapq
+import logging
+import threading
+import zlib
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import ScheduledJob, SessionLocal, User, UserSettings
+from app.services.aggregator import ContentAggregator
+from app.sources import available_sources
+from app.services.email_sender import EmailSender
+
+logger = logging.getLogger(__name__)
+
+FETCH = 'fetch'
+DIGEST = 'digest'
+
+# A digest this late counts as missed (see UserSettings.missed_digest_send)
+DIGEST_GRACE = datetime.timedelta(hours=1)
+
+# Longest sleep of the scheduler loop, so stop requests are noticed
+MAX_WAIT_SECONDS = 30.0
+
+
+class JobResult(NamedTuple):
+    """Outcome of a finished job (a fetch batch covers several users)."""
+    kind: str
+    user_ids: List[int]
+    ok: bool
+    titles: Dict[int, List[str]]  # titles of new articles per user (fetch jobs)
+    error: Optional[str] = None
+
+
+def spread_offset(user_id: int, kind: str) -> datetime.timedelta:
+    """Stable offset of a user's job within its hour."""
+    minutes = max(1, settings.scheduler_spread_minutes)
+    return datetime.timedelta(minutes=zlib.crc32(f"{kind}:{user_id}".encode()) % minutes)
+
+
+def job_hours(user_settings: UserSettings) -> Dict[str, Optional[int]]:
+    """Hour of day of each job kind for a user, None if the job is off."""
+    fetch_hour = user_settings.auto_download_hour
+    if fetch_hour is None and user_settings.auto_update_content:
+        fetch_hour = zlib.crc32(f"hour:{user_settings.user_id}".encode()) % 24
+    digest_hour = user_settings.digest_hour if user_settings.digest_enabled and user_settings.email_digest else None
+    return {FETCH: fetch_hour, DIGEST: digest_hour}
+
+
+def next_occurrence(hour: int, offset: datetime.timedelta, after: datetime.datetime) -> datetime.datetime:
+    """First ``hour:00 + offset`` strictly after ``after``."""
+    candidate = datetime.datetime.combine(after.date(), datetime.time(hour % 24)) + offset
+    while candidate <= after:
+        candidate += datetime.timedelta(days=1)
+    return candidate
+
+
+def has_due_jobs(session: Session, now: Optional[datetime.datetime] = None) -> bool:
+    """Cheap local check: is any enabled job due, or missing its row (see ``JobScheduler.refresh``)?"""
+    now = now or datetime.datetime.utcnow()
+    jobs = {(user_id, kind): next_run_at
+            for user_id, kind, next_run_at in session.query(
+                ScheduledJob.user_id, ScheduledJob.kind, ScheduledJob.next_run_at)}
+    for user_settings in session.query(UserSettings).join(User).all():
+        for kind, hour in job_hours(user_settings).items():
+            if hour is None:
+                continue
+            next_run_at = jobs.get((user_settings.user_id, kind))
+            if next_run_at is None or next_run_at <= now:
+                return True
+    return False
+
+
+class _FetchBatch:
+    """Fetch jobs dispatched together; finished when every source task is done."""
+
+    def __init__(self, user_ids: List[int], tasks: int):
+        self.user_ids = user_ids
+        self.remaining = tasks
+        self.titles: Dict[int, List[str]] = {user_id: [] for user_id in user_ids}
+        self.errors: List[str] = []
+
+
+class JobScheduler:
+    """Runs scheduled fetch and digest jobs (see module docstring)."""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, workers: Optional[int] = None):
+        self.session_factory = session_factory
+        self.workers = max(1, workers or settings.scheduler_workers)
+        self._heap: List[Tuple[datetime.datetime, str, int]] = []
+        self._jobs: Dict[Tuple[int, str], datetime.datetime] = {}
+        self._missed_digest_send: Dict[int, bool] = {}
+        self._last_download: Dict[int, Optional[datetime.datetime]] = {}
+        self._running: Set[Tuple[int, str]] = set()
+        self._futures: Dict[Future, Tuple[str, object]] = {}
+        self._source_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._source_limiters: Dict[str, 'RateLimiter'] = {}
+        self._source_lock = threading.Lock()
+        self._results: List[JobResult] = []
+        self._stop = threading.Event()
+
+    # --- job state ---
+
+    def refresh(self, now: Optional[datetime.datetime] = None) -> None:
+        """Sync job rows with user settings and rebuild the heap of due times."""
+        now = now or datetime.datetime.utcnow()
+        session = self.session_factory()
+        try:
+            jobs = {(job.user_id, job.kind): job for job in session.query(ScheduledJob).all()}
+            wanted = set()
+            self._missed_digest_send = {}
+            self._last_download = {}
+            for user_settings in session.query(UserSettings).join(User).all():
+                self._missed_digest_send[user_settings.user_id] = bool(user_settings.missed_digest_send)
+                self._last_download[user_settings.user_id] = user_settings.last_auto_download
+                for kind, hour in job_hours(user_settings).items():
+                    if hour is None:
+                        continue
+                    key = (user_settings.user_id, kind)
+                    wanted.add(key)
+                    job = jobs.get(key)
+                    offset = spread_offset(user_settings.user_id, kind)
+                    if job is None:
+                        if kind == FETCH:
+                            # Never downloaded: the last occurrence is already due (catch-up)
+                            after = user_settings.last_auto_download or now - datetime.timedelta(days=1)
+                        else:
+                            after = now
+                        session.add(ScheduledJob(user_id=user_settings.user_id, kind=kind, hour=hour,
+                                                 next_run_at=next_occurrence(hour, offset, after), attempts=0))
+                    elif job.hour != hour:
+                        job.hour = hour
+                        job.next_run_at = next_occurrence(hour, offset, job.last_run_at or now)
+                        job.attempts = 0
+            for key, job in jobs.items():
+                if key not in wanted:
+                    session.delete(job)
+            session.commit()
+
+            self._jobs = {
+                (job.user_id, job.kind): job.next_run_at
+                for job in session.query(ScheduledJob).all()
+            }
+        finally:
+            session.close()
+        self._heap = [(due, kind, user_id) for (user_id, kind), due in self._jobs.items()
+                      if (user_id, kind) not in self._running]
+        heapq.heapify(self._heap)
+
+    def _reschedule(self, session: Session, kind: str, user_id: int, now: datetime.datetime,
+                    ok: bool, status: str, error: Optional[str] = None) -> None:
+        """Store the outcome of a run and the job's next due time."""
+        job = session.query(ScheduledJob).filter_by(user_id=user_id, kind=kind).first()
+        if job is None:
+            return
+        job.last_run_at = now
+        job.last_status = status
+        job.last_error = error
+        offset = spread_offset(user_id, kind)
+        if ok or (job.attempts or 0) + 1 >= settings.scheduler_max_attempts:
+            job.attempts = 0
+            # One run covers every missed occurrence
+            job.next_run_at = next_occurrence(job.hour, offset, now)
+        else:
+            job.attempts = (job.attempts or 0) + 1
+            delay = datetime.timedelta(minutes=settings.scheduler_retry_minutes * 2 ** (job.attempts - 1))
+            job.next_run_at = min(now + delay, next_occurrence(job.hour, offset, now))
+        self._jobs[(user_id, kind)] = job.next_run_at
+        heapq.heappush(self._heap, (job.next_run_at, kind, user_id))
+
+    def _finish(self, result: JobResult) -> None:
+        """Persist a finished job's state and keep its result."""
+        now = datetime.datetime.utcnow()
+        session = self.session_factory()
+        try:
+            status = 'ok' if result.ok else 'failed'
+            for user_id in result.user_ids:
+                self._running.discard((user_id, result.kind))
+                self._reschedule(session, result.kind, user_id, now, result.ok, status, result.error)
+                if result.kind == FETCH and result.ok:
+                    user_settings = session.query(UserSettings).filter_by(user_id=user_id).first()
+                    if user_settings:
+                        user_settings.last_auto_download = now
+                        user_settings.last_content_update = now
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Не удалось сохранить состояние задач {result.kind}: {e}")
+        finally:
+            session.close()
+        self._results.append(result)
+
+    # --- dispatch ---
+
+    def _take_due(self, now: datetime.datetime) -> Dict[str, List[int]]:
+        """Pop due jobs from the heap, grouped by kind; stale heap entries are dropped.
+
+        Fetch jobs already covered by a manual download and digests missed for too
+        long (or with missed_digest_send off) are moved to their next occurrence.
+        """
+        due: Dict[str, List[int]] = {FETCH: [], DIGEST: []}
+        skipped = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, kind, user_id = heapq.heappop(self._heap)
+            key = (user_id, kind)
+            if self._jobs.get(key) != due_at or key in self._running:
+                continue
+            last_download = self._last_download.get(user_id)
+            if kind == FETCH and last_download and last_download >= due_at:
+                skipped.append(key)
+                continue
+            if kind == DIGEST and now - due_at > DIGEST_GRACE and (
+                    not self._missed_digest_send.get(user_id, True)
+                    or now - due_at > datetime.timedelta(days=settings.digest_retry_days)):
+                skipped.append(key)
+                continue
+            due[kind].append(user_id)
+        if skipped:
+            session = self.session_factory()
+            try:
+                for user_id, kind in skipped:
+                    self._reschedule(session, kind, user_id, now, True, 'skipped')
+                session.commit()
+            finally:
+                session.close()
+            logger.info(f"Пропущено задач (уже выполнены или устарели): {len(skipped)}")
+        return due
+
+    def _dispatch(self, pool: ThreadPoolExecutor, now: datetime.datetime) -> None:
+        """Submit every due job to the pool."""
+        due = self._take_due(now)
+        if due[FETCH]:
+            sources = available_sources()
+            batch = _FetchBatch(due[FETCH], len(sources))
+            self._running.update((user_id, FETCH) for user_id in due[FETCH])
+            if not sources:
+                self._finish(JobResult(FETCH, batch.user_ids, False, batch.titles, "Нет доступных источников"))
+            for source in sources:
+                future = pool.submit(self._run_fetch, source, batch.user_ids)
+                self._futures[future] = (FETCH, batch)
+            logger.info(f"Запущена загрузка для {len(due[FETCH])} пользователей из {len(sources)} источников")
+        for user_id in due[DIGEST]:
+            self._running.add((user_id, DIGEST))
+            self._futures[pool.submit(self._run_digest, user_id)] = (DIGEST, user_id)
+
+    def _collect(self, futures) -> None:
+        """Record the outcome of finished tasks."""
+        for future in futures:
+            kind, target = self._futures.pop(future)
+            error = None
+            try:
+                outcome = future.result()
+            except Exception as e:
+                outcome, error = None, str(e)
+                logger.error(f"Ошибка задачи {kind}: {e}")
+            if kind == DIGEST:
+                self._finish(JobResult(DIGEST, [target], error is None, {}, error))
+                continue
+            batch = target
+            batch.remaining -= 1
+            if error is not None:
+                batch.errors.append(error)
+            else:
+                for user_id, titles in outcome.items():
+                    batch.titles.setdefault(user_id, []).extend(titles)
+            if not batch.remaining:
+                self._finish(JobResult(FETCH, batch.user_ids, not batch.errors, batch.titles,
+                                       '; '.join(batch.errors) or None))
+
+    # --- jobs (run in worker threads, each with its own session) ---
+
+    def _source_slot(self, platform: str) -> Tuple[threading.BoundedSemaphore, 'RateLimiter']:
+        from app.core.http_client import RateLimiter  # pulls in requests; not needed at startup
+        with self._source_lock:
+            if platform not in self._source_slots:
+                self._source_slots[platform] = threading.BoundedSemaphore(max(1, settings.scheduler_jobs_per_source))
+                self._source_limiters[platform] = RateLimiter(settings.scheduler_source_batches_per_minute / 60.0)
+        return self._source_slots[platform], self._source_limiters[platform]
+
+    def _run_fetch(self, source, user_ids: List[int]) -> Dict[int, List[str]]:
+        """Fetch and save new content for users from one source; returns new titles per user."""
+        slot, limiter = self._source_slot(source.platform)
+        with slot:
+            limiter.acquire()
+            session = self.session_factory()
+            try:
+                aggregator = ContentAggregator(sources=[source], db_session=session)
+                results = aggregator.update_content_for_users(user_ids, keywords_limit=90, max_per_user=30)
+                return {
+                    user_id: [item.title for item in sorted(
+                        items, key=lambda x: x.published_at or datetime.datetime.min, reverse=True
+                    )]
+                    for user_id, items in results.items()
+                }
+            finally:
+                session.close()
+
+    def _run_digest(self, user_id: int) -> None:
+        """Send the daily digest to a user; raises if sending fails so the job is retried."""
+        session = self.session_factory()
+        try:
+            user = session.query(User).get(user_id)
+            if not user or not user.settings or not user.settings.email_digest:
+                return
+            aggregator = ContentAggregator(sources=[], db_session=session)
+            digest = aggregator.get_daily_digest(user_id, settings.digest_max_items, with_description=True)
+            if not digest:
+                logger.info(f"Нет контента для дайджеста пользователя {user_id}")
+                return
+            if not EmailSender().send_digest(user, digest, email_override=user.settings.email_digest):
+                raise RuntimeError("не удалось отправить email")
+        finally:
+            session.close()
+
+    # --- entry points ---
+
+    def run_pending(self, now: Optional[datetime.datetime] = None) -> List[JobResult]:
+        """Run every job that is due (including missed runs) and wait for them to finish."""
+        self._results = []
+        self.refresh(now)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scheduler") as pool:
+            self._dispatch(pool, now or datetime.datetime.utcnow())
+            while self._futures:
+                done, _ = wait(list(self._futures), return_when=FIRST_COMPLETED)
+                self._collect(done)
+        return self._results
+
+    def run_forever(self, on_result: Optional[Callable[[JobResult], None]] = None) -> None:
+        """Run jobs as they become due until ``stop`` is called."""
+        self._results = []
+        refresh_interval = datetime.timedelta(minutes=max(1, settings.scheduler_refresh_minutes))
+        next_refresh = datetime.datetime.utcnow()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scheduler") as pool:
+            while not self._stop.is_set():
+                now = datetime.datetime.utcnow()
+                if now >= next_refresh:
+                    self.refresh(now)
+                    next_refresh = now + refresh_interval
+                self._dispatch(pool, now)
+                # _dispatch records some failures itself (e.g. no enabled sources)
+                self._report(on_result)
+
+                wake_at = min(next_refresh, self._heap[0][0]) if self._heap else next_refresh
+                timeout = min(max((wake_at - datetime.datetime.utcnow()).total_seconds(), 0.0), MAX_WAIT_SECONDS)
+                if self._futures:
+                    done, _ = wait(list(self._futures), timeout=timeout, return_when=FIRST_COMPLETED)
+                    self._collect(done)
+                    self._report(on_result)
+                else:
+                    self._stop.wait(timeout)
+            # Let running jobs finish so their state is saved
+            if self._futures:
+                self._collect(wait(list(self._futures)).done)
+                self._report(on_result)
+
+    def _report(self, on_result: Optional[Callable[[JobResult], None]]) -> None:
+        """Pass results recorded since the last call to ``on_result``."""
+        results, self._results = self._results, []
+        if on_result:
+            for result in results:
+                on_result(result)
+
+    def stop(self) -> None:
+        """Ask ``run_forever`` to return after the running jobs finish."""
+        self._stop.set()
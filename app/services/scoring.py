@@ -0,0 +1,171 @@
+"""
+Vectorized recommendation scoring: candidates are loaded into NumPy arrays with one
+query and every strategy is a boolean mask over them.
+"""
+
+import datetime
+from typing import Iterable, List, NamedTuple
+
+import numpy as np
+from sqlalchemy import case, func, literal
+from sqlalchemy.orm import Session
+
+from app.database import BULK_QUERY_BATCH_SIZE, ContentItem, DifficultyLevel, content_tags
+
+# Integer codes for difficulty arrays (-1 = unknown)
+DIFFICULTY_CODES = {
+    DifficultyLevel.BEGINNER: 0,
+    DifficultyLevel.INTERMEDIATE: 1,
+    DifficultyLevel.ADVANCED: 2,
+    DifficultyLevel.EXPERT: 3,
+}
+UNKNOWN_DIFFICULTY = -1
+
+# Age assumed for items without a publication date
+DEFAULT_AGE_DAYS = 30
+
+# Tag id of the pair added for candidates loaded by id
+NO_TAG = -1
+
+# Score multiplier for items matched by more than one strategy
+MULTI_STRATEGY_BONUS = 1.5
+
+
+class CandidateSet(NamedTuple):
+    """Candidate items as arrays, plus their (item, tag) pairs for tag masks."""
+    ids: np.ndarray          # content ids, int64, sorted
+    age_days: np.ndarray     # whole days since publication, float64
+    difficulty: np.ndarray   # DIFFICULTY_CODES values, int8
+    pair_item: np.ndarray    # index into ``ids`` for every (item, tag) pair
+    pair_tag: np.ndarray     # tag id for every (item, tag) pair
+    cluster: np.ndarray      # near-duplicate cluster id (duplicate_of, or the item's own id)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def has_any_tag(self, tag_ids: Iterable[int]) -> np.ndarray:
+        """Boolean mask of candidates that have at least one of the tags."""
+        tag_ids = np.fromiter(tag_ids, dtype=np.int64)
+        if not len(self.ids) or not len(tag_ids):
+            return np.zeros(len(self.ids), dtype=bool)
+        matched_pairs = np.isin(self.pair_tag, tag_ids)
+        return np.bincount(self.pair_item[matched_pairs], minlength=len(self.ids)) > 0
+
+    def contains(self, content_ids: Iterable[int]) -> np.ndarray:
+        """Boolean mask of candidates whose id is in ``content_ids``."""
+        return np.isin(self.ids, np.fromiter(content_ids, dtype=np.int64))
+
+    def difficulty_of(self, content_ids: np.ndarray) -> np.ndarray:
+        """Difficulty codes for ``content_ids`` (UNKNOWN_DIFFICULTY for non-candidates)."""
+        content_ids = np.asarray(content_ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(len(content_ids), UNKNOWN_DIFFICULTY, dtype=np.int8)
+        positions = np.minimum(np.searchsorted(self.ids, content_ids), len(self.ids) - 1)
+        found = self.ids[positions] == content_ids
+        return np.where(found, self.difficulty[positions], UNKNOWN_DIFFICULTY).astype(np.int8)
+
+
+def empty_candidates() -> CandidateSet:
+    """Return a candidate set with no items."""
+    return CandidateSet(
+        np.empty(0, dtype=np.int64), np.empty(0), np.empty(0, dtype=np.int8),
+        np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    )
+
+
+def load_candidates(session: Session, tag_ids: Iterable[int],
+                    now: datetime.datetime = None, content_ids: Iterable[int] = ()) -> CandidateSet:
+    """Load every item tagged with any of ``tag_ids``, plus ``content_ids``, into arrays.
+
+    Fetches (content id, tag id, published_at, difficulty, cluster) rows, one
+    per matching tag link; tag id lists longer than the bind limit are split.
+    Items added by id get a pair with tag id NO_TAG, which matches no tag mask.
+    """
+    tag_ids = sorted(set(tag_ids))
+    content_ids = sorted(set(content_ids))
+    if not tag_ids and not content_ids:
+        return empty_candidates()
+    now = now or datetime.datetime.utcnow()
+
+    difficulty_code = case(
+        *[(ContentItem.difficulty == level, code) for level, code in DIFFICULTY_CODES.items()],
+        else_=UNKNOWN_DIFFICULTY
+    )
+    cluster = func.coalesce(ContentItem.duplicate_of, ContentItem.id)
+    rows = []
+    for start in range(0, len(tag_ids), BULK_QUERY_BATCH_SIZE):
+        rows.extend(session.query(
+            content_tags.c.content_id, content_tags.c.tag_id, ContentItem.published_at, difficulty_code, cluster
+        ).join(
+            ContentItem, ContentItem.id == content_tags.c.content_id
+        ).filter(
+            content_tags.c.tag_id.in_(tag_ids[start:start + BULK_QUERY_BATCH_SIZE])
+        ).all())
+    for start in range(0, len(content_ids), BULK_QUERY_BATCH_SIZE):
+        rows.extend(session.query(
+            ContentItem.id, literal(NO_TAG), ContentItem.published_at, difficulty_code, cluster
+        ).filter(
+            ContentItem.id.in_(content_ids[start:start + BULK_QUERY_BATCH_SIZE])
+        ).all())
+    if not rows:
+        return empty_candidates()
+
+    pair_content = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    pair_tag = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+    ids, first_row, pair_item = np.unique(pair_content, return_index=True, return_inverse=True)
+
+    published = np.array([rows[i][2] for i in first_row], dtype='datetime64[s]')
+    age_days = np.floor((np.datetime64(now, 's') - published) / np.timedelta64(1, 'D'))
+    age_days[np.isnat(published)] = DEFAULT_AGE_DAYS
+    difficulty = np.fromiter((rows[i][3] for i in first_row), dtype=np.int8, count=len(first_row))
+    clusters = np.fromiter((rows[i][4] for i in first_row), dtype=np.int64, count=len(first_row))
+
+    return CandidateSet(ids, age_days, difficulty, pair_item.reshape(-1), pair_tag, clusters)
+
+
+def time_decay(age_days: np.ndarray, rate: float = 0.95, period_days: float = 7.0) -> np.ndarray:
+    """Freshness factor ``rate ** (age / period)``."""
+    return rate ** (age_days / period_days)
+
+
+def score_strategies(masks: np.ndarray, weights: np.ndarray, decay: np.ndarray) -> np.ndarray:
+    """Combine strategy matches into scores.
+
+    ``masks`` is an (items x strategies) boolean matrix in strategy priority
+    order. The first matching strategy contributes ``decay * weight``, every
+    further match adds its plain weight, and items matched by several
+    strategies get MULTI_STRATEGY_BONUS. Items matched by none score -inf.
+    """
+    masks = np.asarray(masks, dtype=bool)
+    weights = np.asarray(weights, dtype=np.float64)
+    match_count = masks.sum(axis=1)
+    first_weight = weights[masks.argmax(axis=1)]
+
+    scores = decay * first_weight + (masks @ weights - first_weight)
+    scores = np.where(match_count > 1, scores * MULTI_STRATEGY_BONUS, scores)
+    return np.where(match_count > 0, scores, -np.inf)
+
+
+def best_per_cluster(clusters: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """Keep only the best score of every near-duplicate cluster (others become -inf)."""
+    scores = scores.copy()
+    if not len(scores):
+        return scores
+    order = np.lexsort((-scores, clusters))
+    is_first = np.ones(len(order), dtype=bool)
+    is_first[1:] = clusters[order][1:] != clusters[order][:-1]
+    scores[order[~is_first]] = -np.inf
+    return scores
+
+
+def top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> List[int]:
+    """Return ids of the k best finite scores, best first (ties by lower id)."""
+    valid = np.isfinite(scores)
+    ids, scores = ids[valid], scores[valid]
+    if k <= 0 or not len(ids):
+        return []
+    if k < len(ids):
+        part = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[part], scores[part]
+    order = np.lexsort((ids, -scores))
+    return [int(content_id) for content_id in ids[order]]
@@ -1,15 +1,68 @@
 """
 Content sources for educational platforms.
+
+Source modules (and their API client libraries) are imported on first use:
+``available_sources`` imports and instantiates only the sources enabled in the
+configuration, and the source classes below are resolved lazily.
 """
 
-from app.sources.base import ContentSource
-from app.sources.youtube import YouTubeSource
-from app.sources.habr import HabrSource
-from app.sources.coursera import CourseraSource
+import importlib
+from typing import Any, Callable, Dict, List, Tuple
+
+from app.config import settings
+
+# Source name -> (module, class name, enabled in configuration)
+SOURCE_REGISTRY: Dict[str, Tuple[str, str, Callable[[], bool]]] = {
+    'youtube': ('app.sources.youtube', 'YouTubeSource',
+                lambda: settings.youtube_enabled and bool(settings.youtube_api_key)),
+    'habr': ('app.sources.habr', 'HabrSource', lambda: settings.habr_enabled),
+    'coursera': ('app.sources.coursera', 'CourseraSource',
+                 lambda: settings.coursera_enabled and bool(settings.coursera_api_key)),
+}
+
+
+def source_class(name: str):
+    """Import and return the class of a registered source."""
+    module, class_name, _ = SOURCE_REGISTRY[name]
+    return getattr(importlib.import_module(module), class_name)
+
+
+def is_source_enabled(name: str) -> bool:
+    """Check whether a registered source is enabled in the configuration."""
+    return SOURCE_REGISTRY[name][2]()
+
+
+def create_source(name: str) -> Any:
+    """Instantiate a registered source."""
+    return source_class(name)()
+
+
+def available_sources() -> List[Any]:
+    """Create the content sources enabled in the configuration (others are not imported)."""
+    return [create_source(name) for name in SOURCE_REGISTRY if is_source_enabled(name)]
+
+
+_LAZY_CLASSES = {
+    'ContentSource': ('app.sources.base', 'ContentSource'),
+    **{class_name: (module, class_name) for module, class_name, _ in SOURCE_REGISTRY.values()},
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_CLASSES:
+        module, class_name = _LAZY_CLASSES[name]
+        return getattr(importlib.import_module(module), class_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     'ContentSource',
     'YouTubeSource',
     'HabrSource',
     'CourseraSource',
-]
\ No newline at end of file
+    'SOURCE_REGISTRY',
+    'available_sources',
+    'create_source',
+    'is_source_enabled',
+    'source_class',
+]
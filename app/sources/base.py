@@ -17,6 +17,13 @@ class ContentSource(abc.ABC):
         """Fetch content from source based on keywords."""
         pass
 
+    def fetch_new_content(self, keywords: List[str], max_results: int, session=None) -> List[ContentItem]:
+        """Fetch content published since the previous run; sources without high-water marks fetch everything."""
+        return self.fetch_content(keywords, max_results)
+
+    def commit_watermarks(self, session) -> None:
+        """Persist high-water marks of the last ``fetch_new_content`` call, once its items are saved."""
+
     @abc.abstractmethod
     def fetch_full_text(self, url: str) -> str:
         """Fetch full text content from URL."""
@@ -0,0 +1,238 @@
+"""
+HTML-to-text extraction for article pages.
+"""
+
+import logging
+import re
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+from app.config import settings
+from app.core.article_text import EXTRA_MATERIALS_HEADER
+
+logger = logging.getLogger(__name__)
+
+# Elements that never contain article text
+UNWANTED_TAGS = frozenset(['script', 'style', 'nav', 'aside', 'footer', 'header', 'noscript', 'iframe'])
+
+# Ad-related class/id patterns
+AD_PATTERN = re.compile(r'ad|advertisement|banner|promo|commercial', re.I)
+
+# Main article container candidates (priority order)
+CONTAINER_SELECTORS = [
+    ('div', {'class': 'tm-article-body'}),
+    ('div', {'class': 'article-formatted-body'}),
+    ('div', {'class': 'post__text'}),
+    ('div', {'class': 'tm-article-presenter__content'}),
+    ('div', {'class': 'article__content'}),
+    ('article', {}),
+    ('div', {'class': 'content'}),
+    ('div', {'class': 'tm-article-presenter__body'}),
+    ('div', {'class': 'tm-page-article__body'}),
+    ('div', {'id': 'post-content-body'}),
+]
+
+# Title keywords used to estimate article difficulty
+BEGINNER_KEYWORDS = ["основы", "введение", "новичков"]
+ADVANCED_KEYWORDS = ["сложные", "архитектура", "внутреннее устройство"]
+
+_parser_name: Optional[str] = None
+
+
+def get_html_parser() -> str:
+    """Return the extractor backend to use: lxml when installed (or configured), else html.parser."""
+    global _parser_name
+    if _parser_name is None:
+        configured = (settings.habr_html_parser or 'auto').lower()
+        if configured == 'auto':
+            try:
+                import lxml.html  # noqa: F401
+                _parser_name = 'lxml'
+            except ImportError:
+                _parser_name = 'html.parser'
+        else:
+            _parser_name = configured
+    return _parser_name
+
+
+def _is_unwanted(name: str, classes: Optional[str], element_id: Optional[str]) -> bool:
+    """Check whether an element is boilerplate (script/nav/...) or an ad block."""
+    if name in UNWANTED_TAGS:
+        return True
+    if classes and AD_PATTERN.search(classes):
+        return True
+    return bool(element_id) and bool(AD_PATTERN.search(element_id))
+
+
+def _finish(main_text: str, extra_text: Optional[str]) -> str:
+    """Append extra materials if substantial and normalize blank lines."""
+    if extra_text and len(extra_text) > 100:
+        main_text += EXTRA_MATERIALS_HEADER + extra_text
+    # Clean up excessive whitespace (max 2 consecutive newlines)
+    main_text = re.sub(r'\n{3,}', '\n\n', main_text)
+    return main_text.strip()
+
+
+# --- BeautifulSoup backend (html.parser, always available) ---
+
+def remove_unwanted_elements(soup: 'BeautifulSoup') -> None:
+    """Remove boilerplate and ad elements in a single walk, skipping removed subtrees."""
+    from bs4 import Tag
+    stack = [soup]
+    while stack:
+        node = stack.pop()
+        for child in node.contents[:]:
+            if not isinstance(child, Tag):
+                continue
+            classes = child.attrs.get('class')
+            if isinstance(classes, list):
+                classes = ' '.join(classes)
+            if _is_unwanted(child.name, classes, child.attrs.get('id')):
+                child.extract()
+            else:
+                stack.append(child)
+
+
+def find_article_container(soup: 'BeautifulSoup'):
+    """Find the main article container, trying the known Habr container first."""
+    for name, attrs in CONTAINER_SELECTORS:
+        container = soup.find(name, attrs)
+        if container:
+            return container
+    return None
+
+
+def _extract_with_soup(html: Union[str, bytes], url: str, parser: str) -> str:
+    """Extract article text using a BeautifulSoup tree."""
+    from bs4 import BeautifulSoup  # BeautifulSoup is imported on first use, not at startup
+    soup = BeautifulSoup(html, parser)
+    remove_unwanted_elements(soup)
+
+    container = find_article_container(soup)
+    if not container:
+        logger.warning(f"Не найден контейнер для статьи {url}, используется fallback")
+        return _finish(soup.get_text(separator='\n', strip=True), None)
+
+    logger.debug(f"Найден контейнер для статьи {url}")
+    main_text = container.get_text(separator='\n', strip=True)
+    # Remove container to avoid duplication in extra content
+    container.extract()
+    return _finish(main_text, soup.get_text(separator='\n', strip=True))
+
+
+# --- lxml backend (C parser and tree, no BeautifulSoup objects) ---
+
+def _xpath_for(name: str, attrs: dict) -> str:
+    """Translate a container selector into an XPath expression."""
+    if 'class' in attrs:
+        return f"//{name}[contains(concat(' ', normalize-space(@class), ' '), ' {attrs['class']} ')]"
+    if 'id' in attrs:
+        return f"//{name}[@id='{attrs['id']}']"
+    return f"//{name}"
+
+
+_CONTAINER_XPATHS = [_xpath_for(name, attrs) for name, attrs in CONTAINER_SELECTORS]
+
+
+def _lxml_text(element) -> str:
+    """Equivalent of BeautifulSoup get_text(separator='\\n', strip=True) for an lxml element."""
+    return '\n'.join(part for part in (text.strip() for text in element.itertext()) if part)
+
+
+def _extract_with_lxml(html: Union[str, bytes], url: str) -> str:
+    """Extract article text using lxml.html directly."""
+    from lxml import etree
+    from lxml import html as lxml_html
+
+    if isinstance(html, bytes):
+        html = html.decode('utf-8')
+    root = lxml_html.document_fromstring(html)
+
+    unwanted = [
+        element for element in root.iter(etree.Element)
+        if _is_unwanted(element.tag, element.get('class'), element.get('id'))
+    ]
+    for element in unwanted:
+        element.drop_tree()  # keeps the tail text, like BeautifulSoup extract()
+
+    container = None
+    for xpath in _CONTAINER_XPATHS:
+        found = root.xpath(xpath)
+        if found:
+            container = found[0]
+            break
+
+    if container is None:
+        logger.warning(f"Не найден контейнер для статьи {url}, используется fallback")
+        return _finish(_lxml_text(root), None)
+
+    logger.debug(f"Найден контейнер для статьи {url}")
+    main_text = _lxml_text(container)
+    container.drop_tree()
+    return _finish(main_text, _lxml_text(root))
+
+
+def extract_article_text(html: Union[str, bytes], url: str = "", parser: Optional[str] = None) -> str:
+    """Extract article text from a page, appending remaining page text as extra materials."""
+    parser = parser or get_html_parser()
+    if parser == 'lxml':
+        try:
+            return _extract_with_lxml(html, url)
+        except (UnicodeDecodeError, ValueError) as e:
+            logger.debug(f"lxml не смог разобрать {url}: {e}, используется html.parser")
+            parser = 'html.parser'
+    return _extract_with_soup(html, url, parser)
+
+
+def html_to_text(html: str) -> str:
+    """Strip HTML tags from a fragment (e.g. an RSS summary)."""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser').get_text(separator=' ')
+
+
+def clean_summary(html: str, max_length: int = 500) -> str:
+    """Remove HTML tags from an RSS summary and truncate text."""
+    text = html_to_text(html)
+    return text[:max_length] + "..." if len(text) > max_length else text
+
+
+def estimate_difficulty(title: str) -> str:
+    """Estimate difficulty from article title. Returns a DifficultyLevel value."""
+    lowered = title.lower()
+    if any(kw in lowered for kw in BEGINNER_KEYWORDS):
+        return 'beginner'
+    if any(kw in lowered for kw in ADVANCED_KEYWORDS):
+        return 'advanced'
+    return 'intermediate'
+
+
+def parse_entry_payload(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """CPU stage for one article: description, tags, difficulty and full text.
+
+    Runs in worker processes, so input and output are plain picklable dicts.
+    Only the fields present in the payload are computed; page bytes in
+    ``html`` produce ``full_text``. Returns None if the entry is unusable.
+    """
+    url = payload.get('url') or ''
+    try:
+        result: Dict[str, Any] = {}
+        if 'summary' in payload:
+            result['description'] = clean_summary(payload['summary'])
+        if 'title' in payload:
+            result['difficulty'] = estimate_difficulty(payload['title'])
+        if 'tags' in payload:
+            # Normalize tag names to lowercase
+            result['tags'] = sorted({name.lower() for name in payload['tags']})
+    except Exception as e:
+        logger.error(f"Error processing Habr entry {url}: {e}")
+        return None
+
+    if payload.get('html') is not None:
+        try:
+            result['full_text'] = extract_article_text(payload['html'], url=url)
+        except Exception as e:
+            logger.warning(f"Error fetching full text from {url}: {e}")
+            result['full_text'] = ""
+    return result
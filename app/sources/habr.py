@@ -1,18 +1,23 @@
-from typing import List, Dict, Any
-
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from collections import defaultdict
 import datetime
 import logging
+import threading
 import urllib.parse
-import feedparser
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from requests.exceptions import RequestException, Timeout
-from bs4 import BeautifulSoup
 from sqlalchemy.orm import Session
 
+from app.core.http_cache import cached_get
+from app.core.http_client import RateLimiter
+from app.core.process_pool import map_cpu_bound
 from app.sources.base import ContentSource
-from app.database import ContentItem, Tag, ContentType, DifficultyLevel
+from app.sources.extractors import extract_article_text, parse_entry_payload
+from app.database import (
+    ContentItem, Tag, ContentType, DifficultyLevel, content_key, existing_content_keys, save_new_content_items,
+    load_feed_watermarks, save_feed_watermarks
+)
 from app.config import settings
 
 class HabrSource(ContentSource):
@@ -22,12 +27,45 @@ class HabrSource(ContentSource):
 
     def __init__(self):
         super().__init__(name="Habr", platform="habr", content_type=ContentType.HABR_ARTICLE)
-
-    def fetch_content(self, keywords: List[str], max_results: int = 30) -> List[ContentItem]:
-            """Fetch articles from Habr RSS with OR logic and fallback search."""
+        self._host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_semaphores_lock = threading.Lock()
+        self._search_rate_limiter = RateLimiter(settings.habr_search_requests_per_second)
+        # Fresh entries (and mark keys) of each feed read by the last fetch, and marks to store once the items are saved
+        self._feed_entries: Dict[str, Tuple[List[str], List[Any], bool]] = {}
+        self._feed_entries_lock = threading.Lock()
+        self._pending_watermarks: Dict[str, Tuple[datetime.datetime, set]] = {}
+
+    def fetch_new_content(self, keywords: List[str], max_results: int = 30,
+                          session: Optional[Session] = None) -> List[ContentItem]:
+        """Fetch only articles newer than each feed's high-water mark from the previous run.
+
+        Older entries are dropped right after the RSS download, before any page
+        download or DB lookup. Marks move forward only in ``commit_watermarks``,
+        to be called once the returned items are saved.
+        """
+        watermarks = load_feed_watermarks(session) if session is not None else {}
+        return self.fetch_content(keywords, max_results, watermarks=watermarks)
+
+    def commit_watermarks(self, session: Session) -> None:
+        """Persist the high-water marks of the last ``fetch_new_content`` call."""
+        save_feed_watermarks(session, self._pending_watermarks)
+        self._pending_watermarks = {}
+
+    def fetch_content(self, keywords: List[str], max_results: int = 30, with_full_text: bool = True,
+                      watermarks: Optional[Dict[str, Tuple[datetime.datetime, set]]] = None) -> List[ContentItem]:
+            """Fetch articles from Habr RSS with OR logic and fallback search.
+
+            With ``with_full_text=False`` items are built from RSS data only and
+            ``full_text`` stays None until loaded with ``load_full_texts``.
+            With ``watermarks`` (mark key -> mark, see ``_mark_keys``) entries
+            already seen in a feed are skipped and new marks are collected
+            (see fetch_new_content).
+            """
             logger = logging.getLogger(__name__)
-            all_items = []
+            selected_entries = []
             seen_ids = set()
+            considered_ids = set()  # entries reached before the result limit, selected or not
+            self._feed_entries = {}
 
             logger.info(f"Habr поиск запущен с {len(keywords)} ключевыми словами: {keywords}, максимум: {max_results}")
 
@@ -47,6 +85,7 @@ class HabrSource(ContentSource):
                 return []
 
             try:
+                # Entries are collected first; article pages are downloaded afterwards in parallel
                 # Level 1: Combined OR search
                 # FIX: Use +OR+ separator to prevent InvalidURL caused by spaces in query
                 encoded_keywords = [urllib.parse.quote_plus(kw) for kw in normalized_keywords]
@@ -54,55 +93,50 @@ class HabrSource(ContentSource):
                 rss_url = f"https://habr.com/ru/rss/search/?q={query}&with_hubs=true&with_tags=true&limit=100"
                 logger.info(f"Habr поиск Уровень 1 (OR запрос): {rss_url}")
 
-                feed = feedparser.parse(rss_url)
-                for entry in feed.entries:
-                    if len(all_items) >= max_results:
+                feed = self._parse_feed(rss_url)
+                for entry in self._fresh_entries(rss_url, self._mark_keys('search', normalized_keywords),
+                                                 feed.entries, watermarks):
+                    if len(selected_entries) >= max_results:
                         break
+                    considered_ids.add(entry.id)
                     if entry.id not in seen_ids:
-                        item = self._process_entry(entry)
-                        if item:
-                            all_items.append(item)
-                            seen_ids.add(entry.id)
-
-                # Level 2: Individual keyword search if results are low
-                if len(all_items) < max_results // 2:
-                    logger.info(f"Запуск Уровня 2: поиск по отдельным ключевым словам")
-                    for keyword in normalized_keywords:
-                        if len(all_items) >= max_results:
+                        selected_entries.append(entry)
+                        seen_ids.add(entry.id)
+
+                # Level 2: Sharded keyword search if results are low
+                if len(selected_entries) < max_results // 2:
+                    shards = self._plan_keyword_shards(normalized_keywords)
+                    logger.info(f"Запуск Уровня 2: поиск по {len(shards)} группам ключевых слов")
+                    for entry in self._search_shards(shards, exclude_ids=seen_ids, watermarks=watermarks):
+                        if len(selected_entries) >= max_results:
                             break
-
-                        query = urllib.parse.quote_plus(keyword)
-                        rss_url = f"https://habr.com/ru/rss/search/?q={query}&with_hubs=true&with_tags=true&limit=50"
-                        feed = feedparser.parse(rss_url)
-
-                        for entry in feed.entries:
-                            if len(all_items) >= max_results:
-                                break
-                            if entry.id not in seen_ids:
-                                item = self._process_entry(entry)
-                                if item:
-                                    all_items.append(item)
-                                    seen_ids.add(entry.id)
+                        considered_ids.add(entry.id)
+                        selected_entries.append(entry)
+                        seen_ids.add(entry.id)
 
                 # Level 3: General feed fallback
-                if len(all_items) < max_results:
+                if len(selected_entries) < max_results:
                     logger.info(f"Запуск Уровня 3: общая RSS лента с фильтрацией")
-                    feed = feedparser.parse(self.RSS_URL)
+                    feed = self._parse_feed(self.RSS_URL)
 
-                    for entry in feed.entries:
-                        if len(all_items) >= max_results:
+                    # The general feed is filtered by keywords, so it is marked per keyword as well
+                    for entry in self._fresh_entries(self.RSS_URL, self._mark_keys('all', normalized_keywords),
+                                                     feed.entries, watermarks):
+                        if len(selected_entries) >= max_results:
                             break
+                        considered_ids.add(entry.id)
                         if entry.id not in seen_ids:
                             # Filter by keywords in title/summary
                             title_lower = entry.title.lower()
                             summary_lower = entry.summary.lower() if hasattr(entry, 'summary') else ""
 
                             if any(kw in title_lower or kw in summary_lower for kw in normalized_keywords):
-                                item = self._process_entry(entry)
-                                if item:
-                                    all_items.append(item)
-                                    seen_ids.add(entry.id)
+                                selected_entries.append(entry)
+                                seen_ids.add(entry.id)
 
+                all_items = self._process_entries(selected_entries, with_full_text=with_full_text)
+                if watermarks is not None:
+                    self._collect_watermarks(considered_ids | seen_ids, watermarks)
                 logger.info(f"Итог: найдено {len(all_items)} уникальных статей")
                 return all_items
 
@@ -110,39 +144,284 @@ class HabrSource(ContentSource):
                 logger.error(f"Ошибка Habr RSS: {e}", exc_info=True)
                 return []
 
-    def _process_entry(self, entry) -> Optional[ContentItem]:
-        """Process RSS entry into ContentItem with full text loading."""
-        logger = logging.getLogger(__name__)
+    def _plan_keyword_shards(self, keywords: List[str]) -> List[List[str]]:
+        """Group keywords into OR-queries whose encoded length stays within the configured limit."""
+        max_length = settings.habr_shard_max_query_length
+        shards = []
+        current = []
+        current_length = 0
+        for keyword in keywords:
+            encoded_length = len(urllib.parse.quote_plus(keyword))
+            added_length = encoded_length + (len('+OR+') if current else 0)
+            if current and current_length + added_length > max_length:
+                shards.append(current)
+                current = []
+                current_length = 0
+                added_length = encoded_length
+            current.append(keyword)
+            current_length += added_length
+        if current:
+            shards.append(current)
+        return shards
+
+    @staticmethod
+    def _entry_published(entry) -> Optional[datetime.datetime]:
+        """Publication time of an RSS entry (UTC), if present."""
+        published = entry.get('published_parsed')
+        return datetime.datetime(*published[:6]) if published else None
+
+    @staticmethod
+    def _mark_keys(feed_kind: str, keywords: List[str]) -> List[str]:
+        """Watermark keys of a feed: one per keyword, so marks survive changes of the keyword list."""
+        return [f"{feed_kind}:{keyword}" for keyword in sorted(set(keywords))]
+
+    @staticmethod
+    def _feed_mark(mark_keys: List[str],
+                   watermarks: Dict[str, Tuple[datetime.datetime, set]]) -> Optional[Tuple[datetime.datetime, set]]:
+        """Mark of a feed over several keywords: the lowest keyword mark, None if a keyword has none.
+
+        An entry below it was read before under every keyword it could match.
+        """
+        marks = [watermarks.get(key) for key in mark_keys]
+        if not marks or any(mark is None for mark in marks):
+            return None
+        lowest = min(mark[0] for mark in marks)
+        return lowest, set().union(*(mark[1] for mark in marks if mark[0] == lowest))
+
+    def _fresh_entries(self, feed_url: str, mark_keys: List[str], entries: List[Any],
+                       watermarks: Optional[Dict[str, Tuple[datetime.datetime, set]]]) -> List[Any]:
+        """Drop entries at or below the feed's high-water mark and remember the feed of the others."""
+        if watermarks is None:
+            return entries
+        mark = self._feed_mark(mark_keys, watermarks)
+        fresh = []
+        for entry in entries:
+            published = self._entry_published(entry)
+            if mark and published and (published < mark[0] or (published == mark[0] and entry.get('id') in mark[1])):
+                continue
+            fresh.append(entry)
+        # A feed whose entries are all newer than its mark may have skipped some in between
+        # (result limit), so its marks only move if it reached back to the mark
+        reached_mark = mark is None or len(fresh) < len(entries)
+        with self._feed_entries_lock:
+            self._feed_entries[feed_url] = (mark_keys, fresh, reached_mark)
+        if mark and len(fresh) < len(entries):
+            logging.getLogger(__name__).debug(
+                f"Пропущено {len(entries) - len(fresh)} уже просмотренных записей ленты {feed_url}"
+            )
+        return fresh
+
+    def _collect_watermarks(self, considered_ids: set, watermarks: Dict[str, Tuple[datetime.datetime, set]]) -> None:
+        """Move pending marks of each feed's keywords up to the newest entry read from the feed.
+
+        Entries cut off by the result limit were never looked at, so a mark
+        stays below the oldest of them and they are read again next time.
+        Existing marks of every keyword read are kept pending as well, so
+        saving them records that they are still in use.
+        """
+        for mark_keys, entries, reached_mark in self._feed_entries.values():
+            for key in mark_keys:
+                if key in watermarks and key not in self._pending_watermarks:
+                    self._pending_watermarks[key] = (watermarks[key][0], set(watermarks[key][1]))
+            if not reached_mark:
+                continue
+            dated = [(self._entry_published(entry), entry.get('id')) for entry in entries]
+            dated = [(published, entry_id) for published, entry_id in dated if published is not None]
+            skipped = [published for published, entry_id in dated if entry_id not in considered_ids]
+            limit = min(skipped) if skipped else None
+            for published, entry_id in dated:
+                if limit is not None and published >= limit:
+                    continue
+                for key in mark_keys:
+                    current = self._pending_watermarks.get(key)
+                    if current is None or published > current[0]:
+                        self._pending_watermarks[key] = (published, {entry_id})
+                    elif published == current[0]:
+                        current[1].add(entry_id)
+
+    def _search_shards(self, shards: List[List[str]], exclude_ids: Optional[set] = None,
+                       watermarks: Optional[Dict[str, Tuple[datetime.datetime, set]]] = None) -> List[Any]:
+        """Run shard queries concurrently and merge entries, ranking by number of matching shards.
+
+        Entries matched by the same number of shards keep the order in which they
+        first appeared (shard order, then feed order).
+        """
+        if not shards:
+            return []
+        exclude_ids = exclude_ids or set()
+
+        def run_shard(shard: List[str]):
+            query = '+OR+'.join(urllib.parse.quote_plus(kw) for kw in shard)
+            rss_url = f"https://habr.com/ru/rss/search/?q={query}&with_hubs=true&with_tags=true&limit=50"
+            self._search_rate_limiter.acquire()
+            return self._fresh_entries(rss_url, self._mark_keys('search', shard),
+                                       self._parse_feed(rss_url).entries, watermarks)
+
+        workers = max(1, min(settings.habr_fetch_workers, len(shards)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="habr-search") as executor:
+            shard_results = list(executor.map(run_shard, shards))
+
+        entries_by_id = {}
+        match_counts = defaultdict(int)
+        for entries in shard_results:
+            for entry in entries:
+                entry_id = entry.get('id')
+                if not entry_id or entry_id in exclude_ids:
+                    continue
+                if entry_id not in entries_by_id:
+                    entries_by_id[entry_id] = entry
+                match_counts[entry_id] += 1
+
+        ranked_ids = sorted(entries_by_id, key=lambda entry_id: -match_counts[entry_id])
+        return [entries_by_id[entry_id] for entry_id in ranked_ids]
+
+    def _parse_feed(self, url: str):
+        """Download RSS feed through the HTTP cache and parse it with feedparser."""
         try:
-            title = entry.title
-            summary = entry.summary
+            body = cached_get(url)
+        except RequestException as e:
+            logging.getLogger(__name__).warning(f"Ошибка загрузки RSS {url}: {e}")
+            body = None
+        import feedparser  # imported on first feed, not at startup
+        return feedparser.parse(body or b"")
+
+    def _process_entries(self, entries: List[Any], with_full_text: bool = True) -> List[ContentItem]:
+        """Process RSS entries into ContentItems.
+
+        Runs in two stages: article pages are downloaded concurrently in threads
+        (I/O), then summaries and pages are parsed in worker processes (CPU).
+        ContentItems are built here from the plain-dict results. Order follows
+        the entries; entries that fail to process are skipped.
+        """
+        prepared = []
+        for entry in entries:
+            payload = self._entry_payload(entry)
+            if payload is not None:
+                prepared.append((entry, payload))
+
+        if with_full_text:
+            pages = self._download_pages([payload['url'] for _, payload in prepared])
+            for (_, payload), page in zip(prepared, pages):
+                payload['html'] = page
+
+        results = self._parse_payloads([payload for _, payload in prepared])
+
+        items = []
+        for (entry, _), parsed in zip(prepared, results):
+            item = self._process_entry(entry, parsed, with_full_text=with_full_text)
+            if item:
+                items.append(item)
+        return items
+
+    def _entry_payload(self, entry) -> Optional[Dict[str, Any]]:
+        """Copy the fields needed by the CPU stage from a feedparser entry into a plain dict."""
+        try:
+            tag_names = []
+            if hasattr(entry, 'tags'):
+                for t in entry.tags:
+                    tag_names.append(t.term if hasattr(t, 'term') else str(t))
+            return {
+                'title': entry.title,
+                'summary': entry.summary,
+                'tags': tag_names,
+                'url': getattr(entry, 'link', None),
+            }
+        except Exception as e:
+            logging.getLogger(__name__).error(
+                f"Error processing Habr entry {getattr(entry, 'link', 'unknown')}: {e}"
+            )
+            return None
+
+    def _parse_payloads(self, payloads: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Run the CPU stage, in worker processes for large batches with article pages."""
+        if not any(payload.get('html') for payload in payloads):
+            # Summaries only: less work than sending the batch to other processes
+            return [parse_entry_payload(payload) for payload in payloads]
+        return map_cpu_bound(
+            parse_entry_payload, payloads,
+            processes=settings.habr_parse_processes,
+            min_batch=settings.habr_parse_process_threshold,
+        )
+
+    def load_full_texts(self, items: List[ContentItem]) -> int:
+        """Download missing full texts for items fetched without them. Returns number of loaded texts."""
+        pending = [item for item in items if item.full_text is None and item.url]
+        if not pending:
+            return 0
+
+        full_texts = self._fetch_full_texts([item.url for item in pending])
+        for item, full_text in zip(pending, full_texts):
+            item.full_text = full_text
+        return sum(1 for text in full_texts if text)
+
+    def _fetch_full_texts(self, urls: List[Optional[str]]) -> List[str]:
+        """Download and extract full texts for several URLs, preserving input order."""
+        if not urls:
+            return []
 
-            tags = self._extract_tags(entry)
-            description = self._clean_html(summary)
+        pages = self._download_pages(urls)
+        payloads = [{'url': url, 'html': page} for url, page in zip(urls, pages)]
+        results = self._parse_payloads(payloads)
+        return [(parsed or {}).get('full_text', "") for parsed in results]
 
-            # Estimate difficulty
-            difficulty = DifficultyLevel.INTERMEDIATE
-            if any(kw in title.lower() for kw in ["основы", "введение", "новичков"]):
-                difficulty = DifficultyLevel.BEGINNER
-            elif any(kw in title.lower() for kw in ["сложные", "архитектура", "внутреннее устройство"]):
-                difficulty = DifficultyLevel.ADVANCED
+    def _download_pages(self, urls: List[Optional[str]]) -> List[Optional[bytes]]:
+        """Download article pages in parallel, preserving input order. Failed downloads are None."""
+        if not urls:
+            return []
+
+        workers = max(1, min(settings.habr_fetch_workers, len(urls)))
+        if workers == 1:
+            return [self._download_page_limited(url) for url in urls]
 
-            # Fetch FULL TEXT immediately
-            full_text = self.fetch_full_text(entry.link)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="habr-fetch") as executor:
+            return list(executor.map(self._download_page_limited, urls))
+
+    def _download_page_limited(self, url: Optional[str]) -> Optional[bytes]:
+        """Download page bytes while holding the per-host concurrency slot."""
+        if not url:
+            return None
+        try:
+            with self._get_host_semaphore(url):
+                return cached_get(url, timeout=10)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Error fetching full text from {url}: {e}")
+            return None
+
+    def _get_host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        """Return the semaphore limiting concurrent connections to the URL's host."""
+        host = urllib.parse.urlparse(url).netloc.lower()
+        with self._host_semaphores_lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(max(1, settings.habr_max_connections_per_host))
+                self._host_semaphores[host] = semaphore
+            return semaphore
+
+    def _process_entry(self, entry, parsed: Optional[Dict[str, Any]], with_full_text: bool = True) -> Optional[ContentItem]:
+        """Build a ContentItem from an RSS entry and its CPU stage result.
+
+        Without ``with_full_text`` the item is created with ``full_text=None``
+        so that the text can be loaded later on demand.
+        """
+        logger = logging.getLogger(__name__)
+        if parsed is None:
+            return None
+        try:
+            full_text = parsed.get('full_text', "") if with_full_text else None
 
             source_data = {
                 'id': entry.id,
-                'title': title,
-                'description': description,
+                'title': entry.title,
+                'description': parsed['description'],
                 'full_text': full_text,
                 'url': entry.link,
                 'published_at': datetime.datetime(*entry.published_parsed[:6]) if hasattr(entry, 'published_parsed') else None,
-                'difficulty': difficulty,
+                'difficulty': DifficultyLevel(parsed['difficulty']),
                 'duration_minutes': 10  # Default for articles
             }
 
-            logger.debug(f"Processed Habr article: {title}")
-            return self._create_content_item(source_data, tags)
+            logger.debug(f"Processed Habr article: {entry.title}")
+            return self._create_content_item(source_data, [Tag(name=name) for name in parsed['tags']])
         except Exception as e:
             logger.error(f"Error processing Habr entry {getattr(entry, 'link', 'unknown')}: {e}")
             return None
@@ -154,145 +433,40 @@ class HabrSource(ContentSource):
             if not session:
                 return articles
 
-            filtered_articles = []
-            for item in articles:
-                exists = session.query(ContentItem).filter_by(
-                    source_id=item.source_id,
-                    platform=self.platform
-                ).first()
-                if not exists:
-                    filtered_articles.append(item)
-            return filtered_articles
+            # One IN query for all results instead of a lookup per article
+            existing = existing_content_keys(session, (content_key(item) for item in articles))
+            return [item for item in articles if content_key(item) not in existing]
         except Exception as e:
             print(f"Habr live search error: {e}")
             return []
 
     def save_selected_items(self, items: List[ContentItem], session: Session) -> List[ContentItem]:
         """Save selected ContentItem objects to database, handling duplicate detection."""
-        saved_items = []
-        tag_cache = {}
         try:
-            for item in items:
-                exists = session.query(ContentItem).filter_by(
-                    source_id=item.source_id,
-                    platform=self.platform
-                ).first()
-
-                if not exists:
-                    # Загрузить полный текст статьи, если его еще нет
-                    if not item.full_text:
-                        item.full_text = self.fetch_full_text(item.url)
-
-                    new_tags = []
-                    for tag in (item.tags or []):
-                        # Normalize tag name to lowercase for consistency
-                        tag_name = tag.name.lower() if tag.name else ""
-                        if tag_name in tag_cache:
-                            db_tag = tag_cache[tag_name]
-                        else:
-                            db_tag = session.query(Tag).filter_by(name=tag_name).first()
-                            if not db_tag:
-                                db_tag = Tag(name=tag_name)
-                                session.add(db_tag)
-                            tag_cache[tag_name] = db_tag
-                        new_tags.append(db_tag)
-                    item.tags = new_tags
-                    session.add(item)
-                    saved_items.append(item)
-
-            session.commit()
-            return saved_items
+            # Загрузить полный текст только для новых статей, у которых его еще нет
+            return save_new_content_items(session, items, prepare=self._fill_missing_full_texts)
         except Exception as e:
             session.rollback()
             print(f"Error saving Habr items: {e}")
             return []
 
-    def _extract_tags(self, entry: Dict[str, Any]) -> List[Tag]:
-        """Extract tags from RSS entry."""
-        tag_names = set()
-        if hasattr(entry, 'tags'):
-            for t in entry.tags:
-                # Normalize tag names to lowercase
-                tag_name = t.term.lower() if hasattr(t, 'term') else str(t).lower()
-                tag_names.add(tag_name)
-        return [Tag(name=name) for name in tag_names]
-
-    def _clean_html(self, html: str) -> str:
-        """Remove HTML tags and truncate text."""
-        soup = BeautifulSoup(html, "html.parser")
-        text = soup.get_text(separator=' ')
-        return text[:500] + "..." if len(text) > 500 else text
+    def _fill_missing_full_texts(self, items: List[ContentItem]) -> None:
+        """Download full texts in parallel for items that have none."""
+        pending = [item for item in items if not item.full_text and item.url]
+        full_texts = self._fetch_full_texts([item.url for item in pending])
+        for item, full_text in zip(pending, full_texts):
+            item.full_text = full_text
 
     def fetch_full_text(self, url: str, timeout: int = 10) -> str:
         """Fetch full text content from Habr article URL with ads and extra content separated."""
-        import re
-        import logging
         logger = logging.getLogger(__name__)
-
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
         try:
-            response = requests.get(url, headers=headers, timeout=timeout)
-            if response.status_code != 200:
+            # User-Agent, keep-alive and retries come from the shared HTTP session
+            body = cached_get(url, timeout=timeout)
+            if body is None:
                 return ""
-
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            # Remove unwanted elements before extracting text
-            for tag in soup(['script', 'style', 'nav', 'aside', 'footer', 'header', 'noscript', 'iframe']):
-                tag.extract()
-
-            # Remove ad-related elements by class/id patterns
-            try:
-                for element in soup.find_all(class_=re.compile(r'ad|advertisement|banner|promo|commercial', re.I)):
-                    element.extract()
-                for element in soup.find_all(id=re.compile(r'ad|advertisement|banner|promo|commercial', re.I)):
-                    element.extract()
-            except Exception:
-                pass  # Continue if regex fails
-
-            # Find main article container (priority order)
-            container = (
-                soup.find('div', class_='tm-article-body') or 
-                soup.find('div', class_='article-formatted-body') or
-                soup.find('div', class_='post__text') or 
-                soup.find('div', class_='tm-article-presenter__content') or
-                soup.find('div', class_='article__content') or
-                soup.find('article') or
-                soup.find('div', class_='content') or
-                soup.find('div', class_='tm-article-presenter__body') or
-                soup.find('div', class_='tm-page-article__body') or
-                soup.find('div', {'id': 'post-content-body'})
-            )
-
-            if container:
-                logger.debug(f"Найден контейнер для статьи {url}")
-                # Extract main article text
-                main_text = container.get_text(separator='\n', strip=True)
-
-                # Remove container to avoid duplication in extra content
-                container.extract()
-
-                # Extract remaining content (sidebars, additional materials)
-                extra_text = soup.get_text(separator='\n', strip=True)
-
-                # Append extra content with marker if substantial
-                if extra_text and len(extra_text) > 100:
-                    main_text += '\n\n' + '='*40 + '\n[ДОПОЛНИТЕЛЬНЫЕ МАТЕРИАЛЫ]\n' + '='*40 + '\n\n' + extra_text
-            else:
-                logger.warning(f"Не найден контейнер для статьи {url}, используется fallback")
-                # Fallback: extract all remaining text
-                main_text = soup.get_text(separator='\n', strip=True)
-
-            # Clean up excessive whitespace (max 2 consecutive newlines)
-            try:
-                main_text = re.sub(r'\n{3,}', '\n\n', main_text)
-            except Exception:
-                pass  # Return uncleaned text if regex fails
-
-            return main_text.strip()
+            return extract_article_text(body, url=url)
 
         except (RequestException, Timeout, Exception) as e:
             logger.warning(f"Error fetching full text from {url}: {e}")
-            return ""
\ No newline at end of file
+            return ""
@@ -1,13 +1,11 @@
 import datetime
 import re
 from typing import List, Dict, Any, Optional
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 import logging
 from sqlalchemy.orm import Session
 
 from app.sources.base import ContentSource
-from app.database import ContentItem, Tag, ContentType, DifficultyLevel
+from app.database import ContentItem, Tag, ContentType, DifficultyLevel, save_new_content_items
 from app.config import settings
 
 class YouTubeSource(ContentSource):
@@ -31,6 +29,8 @@ class YouTubeSource(ContentSource):
             return None
 
         try:
+            # Imported here: the API client library is slow to import and only needed with an API key
+            from googleapiclient.discovery import build
             self._client = build(self.API_SERVICE_NAME, self.API_VERSION,
                                 developerKey=settings.youtube_api_key)
             return self._client
@@ -44,6 +44,7 @@ class YouTubeSource(ContentSource):
         client = self._get_client()
         if client is None:
             return []
+        from googleapiclient.errors import HttpError
 
         try:
             query = " OR ".join(keywords)
@@ -162,42 +163,15 @@ class YouTubeSource(ContentSource):
     def save_selected_items(self, items: List[ContentItem], session: Session) -> List[ContentItem]:
         """Save selected YouTube ContentItem objects to database, handling duplicate detection and full text loading."""
         logger = logging.getLogger(__name__)
-        saved_items = []
-        tag_cache = {}
         try:
-            for item in items:
-                # Check for duplicates by source_id and platform
-                exists = session.query(ContentItem).filter_by(
-                    source_id=item.source_id, 
-                    platform=self.platform
-                ).first()
-
-                if not exists:
-                    # Ensure full text exists
-                    if not item.full_text:
-                        item.full_text = self.fetch_full_text(item.url)
-
-                    new_tags = []
-                    for tag in (item.tags or []):
-                        tag_name = tag.name.lower() if tag.name else ""
-                        if tag_name in tag_cache:
-                            db_tag = tag_cache[tag_name]
-                        else:
-                            db_tag = session.query(Tag).filter_by(name=tag_name).first()
-                            if not db_tag:
-                                db_tag = Tag(name=tag_name)
-                                session.add(db_tag)
-                            tag_cache[tag_name] = db_tag
-                        new_tags.append(db_tag)
-
-                    item.tags = new_tags
-                    session.add(item)
-                    saved_items.append(item)
-
-            session.commit()
-            return saved_items
+            return save_new_content_items(session, items, prepare=self._fill_missing_full_texts)
         except Exception as e:
             session.rollback()
             logger.error(f"Error saving YouTube items: {e}")
             return []
 
+    def _fill_missing_full_texts(self, items: List[ContentItem]) -> None:
+        """Ensure full text exists for items that are about to be saved."""
+        for item in items:
+            if not item.full_text:
+                item.full_text = self.fetch_full_text(item.url)
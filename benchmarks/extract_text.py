@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark and golden-output check for Habr article text extraction.
+
+Checks the extractor in app.sources.extractors, with every available parser,
+against golden outputs and reports per-page parse time next to the original
+html.parser implementation. Exits non-zero on any mismatch.
+
+Corpus: a directory of *.html files, by default benchmarks/data/extract_text
+(Habr page layouts: current article, legacy post, short news, ads and
+entities, page without an article container). A file page.txt next to
+page.html is the golden output for that page; pages without one (and pages
+from the HTTP cache, --cache) are compared with the original implementation.
+
+Usage:
+    python benchmarks/extract_text.py [--corpus DIR] [--cache] [--repeat 3] [--write-golden]
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bs4 import BeautifulSoup
+
+from app.config import settings
+from app.sources.extractors import extract_article_text
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent / 'data' / 'extract_text'
+
+
+def legacy_extract(html) -> str:
+    """Reference implementation: the original html.parser based extraction."""
+    soup = BeautifulSoup(html, "html.parser")
+
+    for tag in soup(['script', 'style', 'nav', 'aside', 'footer', 'header', 'noscript', 'iframe']):
+        tag.extract()
+
+    for element in soup.find_all(class_=re.compile(r'ad|advertisement|banner|promo|commercial', re.I)):
+        element.extract()
+    for element in soup.find_all(id=re.compile(r'ad|advertisement|banner|promo|commercial', re.I)):
+        element.extract()
+
+    container = (
+        soup.find('div', class_='tm-article-body') or
+        soup.find('div', class_='article-formatted-body') or
+        soup.find('div', class_='post__text') or
+        soup.find('div', class_='tm-article-presenter__content') or
+        soup.find('div', class_='article__content') or
+        soup.find('article') or
+        soup.find('div', class_='content') or
+        soup.find('div', class_='tm-article-presenter__body') or
+        soup.find('div', class_='tm-page-article__body') or
+        soup.find('div', {'id': 'post-content-body'})
+    )
+
+    if container:
+        main_text = container.get_text(separator='\n', strip=True)
+        container.extract()
+        extra_text = soup.get_text(separator='\n', strip=True)
+        if extra_text and len(extra_text) > 100:
+            main_text += '\n\n' + '=' * 40 + '\n[ДОПОЛНИТЕЛЬНЫЕ МАТЕРИАЛЫ]\n' + '=' * 40 + '\n\n' + extra_text
+    else:
+        main_text = soup.get_text(separator='\n', strip=True)
+
+    main_text = re.sub(r'\n{3,}', '\n\n', main_text)
+    return main_text.strip()
+
+
+def available_parsers() -> list:
+    """Return BeautifulSoup tree builders installed in this environment."""
+    parsers = ['html.parser']
+    try:
+        import lxml  # noqa: F401
+        parsers.append('lxml')
+    except ImportError:
+        pass
+    return parsers
+
+
+def load_corpus(corpus_dir, include_cache: bool = False) -> list:
+    """Load (name, html bytes, golden text or None) triples."""
+    pages = []
+    for path in sorted(Path(corpus_dir).glob('*.html')):
+        golden_path = path.with_suffix('.txt')
+        golden = golden_path.read_text(encoding='utf-8') if golden_path.exists() else None
+        pages.append((path.name, path.read_bytes(), golden))
+
+    cache_path = Path(settings.http_cache_path)
+    if include_cache and cache_path.exists():
+        import sqlite3
+        import zlib
+        conn = sqlite3.connect(str(cache_path))
+        rows = conn.execute("SELECT url, body FROM responses WHERE url LIKE '%/articles/%'").fetchall()
+        conn.close()
+        for url, body in rows:
+            pages.append((url, zlib.decompress(body), None))
+    return pages
+
+
+def time_extractor(func, pages, repeat: int) -> float:
+    """Return average seconds per page over all pages and repeats."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, html, _ in pages:
+            func(html)
+    return (time.perf_counter() - start) / (repeat * len(pages))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=str(DEFAULT_CORPUS),
+                        help='Directory with *.html pages (and *.txt golden outputs)')
+    parser.add_argument('--cache', action='store_true', help='Also check article pages from the HTTP cache')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions per page')
+    parser.add_argument('--write-golden', action='store_true',
+                        help='Write the original implementation\'s output as *.txt for corpus pages without one')
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus, include_cache=args.cache)
+    if not pages:
+        print("Корпус пуст")
+        sys.exit(1)
+
+    mismatches = 0
+    for name, html, golden in pages:
+        expected = golden if golden is not None else legacy_extract(html)
+        if args.write_golden and golden is None and Path(args.corpus, name).exists():
+            Path(args.corpus, name).with_suffix('.txt').write_text(expected, encoding='utf-8')
+        for parser_name in available_parsers():
+            if extract_article_text(html, parser=parser_name) != expected:
+                mismatches += 1
+                print(f"MISMATCH [{parser_name}] {name}")
+
+    print(f"pages: {len(pages)}, mismatches: {mismatches}\n")
+    print(f"{'extractor':<22} {'ms/page':>10}")
+    legacy_seconds = time_extractor(legacy_extract, pages, args.repeat)
+    print(f"{'legacy html.parser':<22} {legacy_seconds * 1000:>10.2f}")
+    for parser_name in available_parsers():
+        seconds = time_extractor(lambda html: extract_article_text(html, parser=parser_name), pages, args.repeat)
+        print(f"{'new ' + parser_name:<22} {seconds * 1000:>10.2f}   x{legacy_seconds / seconds:.2f}")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
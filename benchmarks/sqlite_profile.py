@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ingest and query throughput with default SQLite settings vs the tuned PRAGMA profile,
+and the database file size before and after migrating from the version 2 storage layout
+(plain-text full_text and an FTS table with its own copy of every text).
+
+Usage:
+    python benchmarks/sqlite_profile.py [--items 5000] [--batch 100] [--queries 2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core import fts, minhash, similarity
+from app.core.article_text import EXTRA_MATERIALS_HEADER
+from app.database import (
+    Base, ContentItem, ContentType, Tag, attach_sqlite_pragmas, existing_content_keys,
+    migrate_sqlite, save_new_content_items, sqlite_pragmas_from_settings
+)
+
+# FTS table of schema version 2: stores its own copy of the indexed texts
+LEGACY_FTS_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE {fts.FTS_TABLE} USING fts5("
+    "title, description, full_text, tags, tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+
+def make_item(i: int) -> ContentItem:
+    """Create a synthetic Habr article."""
+    return ContentItem(
+        source_id=f"bench-{i}",
+        title=f"Статья {i} о Python и базах данных",
+        description="Описание статьи " * 10,
+        full_text=f"Статья {i}: полный текст про SQLite, индексы и производительность. " * 80
+                  + EXTRA_MATERIALS_HEADER + "Похожие публикации и обсуждения в сайдбаре. " * 40,
+        url=f"https://habr.com/ru/articles/{i}/",
+        content_type=ContentType.HABR_ARTICLE,
+        platform="habr",
+        tags=[Tag(name=f"tag{i % 50}"), Tag(name="python")],
+    )
+
+
+def run_profile(name: str, pragmas: dict, items: int, batch: int, queries: int) -> dict:
+    """Run ingest and query workloads against a fresh database file."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        settings.text_index_path = str(Path(tmp_dir) / 'text_index')
+        engine = create_engine(f"sqlite:///{Path(tmp_dir) / 'bench.db'}")
+        attach_sqlite_pragmas(engine, pragmas)
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            fts.ensure_fts_table(connection)
+            similarity.ensure_tables(connection)
+
+        session = Session(bind=engine)
+        start = time.perf_counter()
+        for offset in range(0, items, batch):
+            save_new_content_items(session, [make_item(i) for i in range(offset, min(offset + batch, items))])
+        ingest_seconds = time.perf_counter() - start
+
+        rng = random.Random(42)
+        start = time.perf_counter()
+        for _ in range(queries):
+            key = (f"bench-{rng.randrange(items)}", "habr")
+            existing_content_keys(session, [key])
+            session.query(ContentItem.id, ContentItem.title).order_by(
+                ContentItem.published_at.desc()
+            ).offset(rng.randrange(max(1, items - 15))).limit(15).all()
+        query_seconds = time.perf_counter() - start
+
+        session.close()
+        engine.dispose()
+
+    return {
+        'profile': name,
+        'ingest_per_sec': items / ingest_seconds,
+        'queries_per_sec': queries * 2 / query_seconds,
+    }
+
+
+def database_size(engine, path: Path) -> int:
+    """Size of the database file in bytes, with the WAL checkpointed into it."""
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(path)
+
+
+def to_legacy_layout(engine) -> None:
+    """Rewrite a current database into the version 2 layout: plain-text full_text, FTS with its own copy."""
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f"DROP TABLE {fts.FTS_TABLE}")
+        connection.exec_driver_sql(f"DROP VIEW {fts.FTS_SOURCE}")
+        connection.exec_driver_sql(LEGACY_FTS_TABLE_SQL)
+        rows = connection.exec_driver_sql(
+            "SELECT c.id, c.title, c.description, c.full_text, "
+            "(SELECT group_concat(t.name, ' ') FROM content_tags ct JOIN tags t ON t.id = ct.tag_id "
+            "WHERE ct.content_id = c.id) FROM content_items c"
+        ).fetchall()
+        texts = [(content_id, zlib.decompress(full_text).decode('utf-8'))
+                 for content_id, _, _, full_text, _ in rows]
+        connection.exec_driver_sql("UPDATE content_items SET full_text = ? WHERE id = ?",
+                                   [(text, content_id) for content_id, text in texts])
+        connection.exec_driver_sql(
+            f"INSERT INTO {fts.FTS_TABLE} (rowid, title, description, full_text, tags) VALUES (?, ?, ?, ?, ?)",
+            [(row[0], row[1], row[2], text, row[4] or '') for row, (_, text) in zip(rows, texts)]
+        )
+        connection.exec_driver_sql("PRAGMA user_version = 2")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql("VACUUM")
+
+
+def run_migration_size(items: int, batch: int) -> dict:
+    """Database file size in the version 2 layout and after migrate_sqlite()."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        settings.text_index_path = str(Path(tmp_dir) / 'text_index')
+        path = Path(tmp_dir) / 'bench.db'
+        engine = create_engine(f"sqlite:///{path}")
+        attach_sqlite_pragmas(engine, sqlite_pragmas_from_settings())
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            fts.ensure_fts_table(connection)
+            similarity.ensure_tables(connection)
+            minhash.ensure_table(connection)
+        session = Session(bind=engine)
+        for offset in range(0, items, batch):
+            save_new_content_items(session, [make_item(i) for i in range(offset, min(offset + batch, items))])
+        session.close()
+
+        to_legacy_layout(engine)
+        before = database_size(engine, path)
+        migrate_sqlite(engine, 2)
+        after = database_size(engine, path)
+        engine.dispose()
+    return {'before': before, 'after': after}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=5000, help='Number of articles to ingest')
+    parser.add_argument('--batch', type=int, default=100, help='Articles per commit')
+    parser.add_argument('--queries', type=int, default=2000, help='Number of lookup + page query pairs')
+    args = parser.parse_args()
+
+    results = [
+        run_profile('default', {}, args.items, args.batch, args.queries),
+        run_profile('tuned', sqlite_pragmas_from_settings(), args.items, args.batch, args.queries),
+    ]
+
+    print(f"{'profile':<10} {'ingest items/s':>16} {'queries/s':>12}")
+    for result in results:
+        print(f"{result['profile']:<10} {result['ingest_per_sec']:>16.0f} {result['queries_per_sec']:>12.0f}")
+    base, tuned = results
+    print(f"\ningest speedup: x{tuned['ingest_per_sec'] / base['ingest_per_sec']:.2f}, "
+          f"query speedup: x{tuned['queries_per_sec'] / base['queries_per_sec']:.2f}")
+
+    sizes = run_migration_size(args.items, args.batch)
+    print(f"\ndatabase size: {sizes['before'] / 2 ** 20:.1f} MiB in the version 2 layout, "
+          f"{sizes['after'] / 2 ** 20:.1f} MiB after migration (x{sizes['before'] / sizes['after']:.1f} smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark: startup cost of the CLI entry point.
+
+Imports ``main`` in fresh interpreters with ``python -X importtime`` and reports
+the median cumulative import time, the slowest modules imported by main, and the
+wall time of a short command (``main.py --help``).
+
+The budget is relative to a reference measured in the same run: importing the
+third-party stack main cannot avoid (SQLAlchemy, pydantic-settings, click,
+colorama). Fails if main takes more than ``--overhead-ms`` on top of it, so the
+check follows the speed of the machine, or if a module that should load lazily
+(NumPy and the indexes built on it, API clients, python-docx, BeautifulSoup,
+feedparser, the interactive menu) is imported.
+
+Usage:
+    python benchmarks/startup_time.py [--runs 7] [--overhead-ms 150]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Must not be imported just to start the CLI
+LAZY_MODULES = ('numpy', 'app.core.minhash', 'app.core.similarity', 'app.core.text_index',
+                'app.services.recommender', 'googleapiclient', 'docx', 'bs4', 'feedparser', 'app.interactive')
+
+# Third-party modules every start needs: their import time is the reference
+REFERENCE_IMPORTS = ('sqlalchemy', 'sqlalchemy.orm', 'sqlalchemy.ext.declarative', 'sqlalchemy.dialects.sqlite',
+                     'pydantic_settings', 'dotenv', 'click', 'colorama')
+
+
+def import_times(modules: Tuple[str, ...] = ('main',)) -> Tuple[float, Dict[str, float], List[str]]:
+    """Import modules once in a fresh interpreter.
+
+    Returns (total ms, cumulative ms of modules imported by them, all imported modules).
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {', '.join(modules)}"],
+        cwd=ROOT, capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=str(ROOT)),
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {', '.join(modules)} failed:\n{result.stderr[-2000:]}")
+    roots = {name.split('.')[0] for name in modules}
+    total = 0.0
+    direct: Dict[str, float] = {}
+    imported = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # two spaces per nesting level
+        imported.append(name.strip())
+        if depth == 0 and name.strip().split('.')[0] in roots:
+            total += int(cumulative) / 1000
+        elif depth == 1:
+            direct[name.strip()] = int(cumulative) / 1000
+    return total, direct, imported
+
+
+def command_wall_ms(database_url: str) -> float:
+    """Wall time of ``main.py --help`` (no catch-up, no network)."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, str(ROOT / 'main.py'), '--help', '--app-skip-check'],
+                   cwd=ROOT, capture_output=True, env=dict(os.environ, DATABASE_URL=database_url))
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=7, help='Number of fresh interpreters per measurement')
+    parser.add_argument('--overhead-ms', type=float, default=150.0,
+                        help='Allowed median import time of main on top of the reference imports')
+    args = parser.parse_args()
+
+    import_times()  # warm the bytecode cache
+    totals, references, direct, modules = [], [], {}, []
+    for _ in range(args.runs):
+        # Interleaved, so both measurements see the same machine load
+        total, direct, modules = import_times()
+        totals.append(total)
+        references.append(import_times(REFERENCE_IMPORTS)[0])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_url = f"sqlite:///{Path(tmp_dir) / 'startup.db'}"
+        walls = [command_wall_ms(database_url) for _ in range(args.runs)]
+
+    print("slowest imports of main (ms, cumulative, last run):")
+    for name, ms in sorted(direct.items(), key=lambda item: -item[1])[:10]:
+        print(f"  {ms:8.1f}  {name}")
+    median = statistics.median(totals)
+    reference = statistics.median(references)
+    print(f"import main: median {median:.0f} ms, min {min(totals):.0f} ms")
+    print(f"reference imports: median {reference:.0f} ms; main overhead {median - reference:.0f} ms "
+          f"(budget {args.overhead_ms:.0f} ms)")
+    print(f"main.py --help: median {statistics.median(walls):.0f} ms")
+
+    eager = sorted({lazy for name in modules for lazy in LAZY_MODULES
+                    if name == lazy or name.startswith(lazy + '.')})
+    if eager:
+        print(f"imported at startup but should be lazy: {', '.join(eager)}")
+    sys.exit(0 if median - reference <= args.overhead_ms and not eager else 1)
+
+
+if __name__ == "__main__":
+    main()
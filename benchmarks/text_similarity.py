@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: "more like this" query latency of the TF-IDF text index.
+
+Builds an index over a synthetic corpus of Russian/English technical texts
+in a temporary directory, then times similarity queries for random seed
+articles and an incremental add of a small batch.
+
+Usage:
+    python benchmarks/text_similarity.py [--docs 100000] [--words 150] [--queries 200] [--budget-ms 100]
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.text_index import TextIndex
+
+STEMS = [
+    "python", "asyncio", "sqlite", "postgres", "индекс", "запрос", "кэш", "сервер", "клиент", "поток",
+    "процесс", "память", "профилирование", "оптимизация", "архитектура", "микросервис", "контейнер",
+    "kubernetes", "docker", "linux", "ядро", "сеть", "протокол", "тестирование", "нагрузка", "очередь",
+    "транзакция", "репликация", "шардирование", "компилятор", "интерпретатор", "типизация", "rust", "go",
+    "javascript", "react", "фронтенд", "бэкенд", "безопасность", "шифрование", "алгоритм", "структура",
+    "данные", "модель", "обучение", "нейросеть", "трансформер", "вектор", "поиск", "ранжирование",
+]
+SUFFIXES = ["", "а", "ы", "ов", "ами", "ом", "ая", "ой", "ение", "ения"]
+
+
+def make_corpus(docs: int, words: int, seed: int = 42):
+    """Yield (id, text) pairs where each document is centred on a few topics."""
+    rng = random.Random(seed)
+    vocabulary = [f"{stem}{suffix}" for stem in STEMS for suffix in SUFFIXES]
+    vocabulary += [f"термин{i}" for i in range(20000)]
+    for content_id in range(1, docs + 1):
+        topics = rng.sample(STEMS, 3)
+        body = [
+            f"{rng.choice(topics)}{rng.choice(SUFFIXES)}" if rng.random() < 0.3 else rng.choice(vocabulary)
+            for _ in range(words)
+        ]
+        yield content_id, f"{' '.join(topics)}\n{' '.join(body)}"
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=100000, help='Number of synthetic articles')
+    parser.add_argument('--words', type=int, default=150, help='Words per article')
+    parser.add_argument('--queries', type=int, default=200, help='Number of "more like this" queries')
+    parser.add_argument('--budget-ms', type=float, default=100.0, help='Allowed p95 query latency')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = TextIndex(Path(tmp_dir) / 'text_index')
+        start = time.perf_counter()
+        count = index.build(make_corpus(args.docs, args.words))
+        print(f"build: {count} docs in {time.perf_counter() - start:.1f} s")
+
+        rng = random.Random(7)
+        index.similar([1])  # map the segment files
+        latencies = []
+        for _ in range(args.queries):
+            seed = rng.randrange(1, args.docs + 1)
+            start = time.perf_counter()
+            index.similar([seed], 10)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        batch = [(args.docs + i, text) for i, (_, text) in enumerate(make_corpus(30, args.words, seed=1), 1)]
+        start = time.perf_counter()
+        index.add(batch)
+        add_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        index.similar([args.docs + 1], 10)
+        after_add_ms = (time.perf_counter() - start) * 1000
+
+    p95 = percentile(latencies, 0.95)
+    print(f"query ms: p50 {percentile(latencies, 0.5):.1f}, p95 {p95:.1f}, max {max(latencies):.1f}")
+    print(f"add 30 docs: {add_ms:.1f} ms, query after add: {after_add_ms:.1f} ms")
+    sys.exit(0 if p95 <= args.budget_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
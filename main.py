@@ -26,8 +26,7 @@ from app.database import (
     init_database, SessionLocal, UserSettings, 
     User, ContentItem, Tag
 )
-from app.services.aggregator import ContentAggregator
-from app.sources.habr import HabrSource
+from app.services import catch_up
 from app.config import settings
 
 logging.basicConfig(
@@ -38,114 +37,8 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def _check_missed_auto_downloads() -> None:
-    """Проверить и выполнить пропущенные автозагрузки для всех пользователей."""
-    session = SessionLocal()
-    try:
-        # Найти пользователей с настроенной автозагрузкой
-        users_with_auto = session.query(User).join(UserSettings).filter(
-            UserSettings.auto_download_hour.isnot(None)
-        ).all()
-        
-        if not users_with_auto:
-            return
-        
-        now = datetime.utcnow()
-        habr_source = HabrSource()
-        aggregator = ContentAggregator(db_session=session)
-        
-        for user in users_with_auto:
-            settings_obj = user.settings
-            if not settings_obj or settings_obj.auto_download_hour is None:
-                continue
-            
-            # Проверить, нужна ли загрузка
-            should_download = False
-            
-            if settings_obj.last_auto_download is None:
-                # Никогда не загружали - загрузить
-                should_download = True
-            else:
-                # Проверить, прошёл ли назначенный час с последней загрузки
-                last_download_date = settings_obj.last_auto_download.date()
-                today = now.date()
-                
-                if last_download_date < today:
-                    # Последняя загрузка была вчера или раньше
-                    # Проверить, прошёл ли уже назначенный час сегодня
-                    if now.hour >= settings_obj.auto_download_hour:
-                        should_download = True
-            
-            if should_download:
-                logger.info(f"Running missed auto-download for user {user.id} ({user.username})")
-                
-                # Получить интересы пользователя (лимит 90)
-                keywords = aggregator.get_top_interests(user.id, 90)
-                if not keywords:
-                    logger.info(f"User {user.id} has no interests, skipping auto-download")
-                    continue
-                
-                # Получить статьи из Habr
-                articles = habr_source.fetch_content(keywords, max_results=30)
-                
-                if not articles:
-                    logger.info(f"No articles found for user {user.id}")
-                    continue
-                
-                # Сортировать по дате (свежие первыми)
-                articles.sort(key=lambda x: x.published_at or datetime.min, reverse=True)
-                
-                # Сохранить только новые статьи с кэшем тегов
-                saved_count = 0
-                saved_titles = []
-                tag_cache = {}  # Кэш для предотвращения дублирования тегов
-                
-                for item in articles:
-                    exists = session.query(ContentItem).filter_by(
-                        source_id=item.source_id, platform=item.platform
-                    ).first()
-                    if not exists:
-                        # Обработка тегов с кэшем
-                        new_tags = []
-                        for tag in (item.tags or []):
-                            tag_name = tag.name.lower() if tag.name else ""
-                            if tag_name:
-                                # Проверить кэш
-                                if tag_name not in tag_cache:
-                                    db_tag = session.query(Tag).filter_by(name=tag_name).first()
-                                    if not db_tag:
-                                        db_tag = Tag(name=tag_name)
-                                        session.add(db_tag)
-                                        session.flush()  # Немедленно сохранить тег в БД
-                                    tag_cache[tag_name] = db_tag
-                                new_tags.append(tag_cache[tag_name])
-                        item.tags = new_tags
-                        session.add(item)
-                        saved_count += 1
-                        saved_titles.append(item.title)
-                
-                if saved_count > 0:
-                    session.commit()
-                    logger.info(f"Auto-downloaded {saved_count} articles for user {user.id}")
-                    
-                    # Показать названия скачанных статей
-                    print(f"\n{Fore.CYAN}═══ АВТОЗАГРУЗКА ДЛЯ {user.username} ═══{Style.RESET_ALL}")
-                    print(f"{Fore.GREEN}Загружено {saved_count} новых статей:{Style.RESET_ALL}")
-                    for title in saved_titles[:10]:
-                        print(f"  • {title[:60]}{'...' if len(title) > 60 else ''}")
-                    if len(saved_titles) > 10:
-                        print(f"  ... и ещё {len(saved_titles) - 10} статей")
-                
-                # Обновить время последней загрузки
-                settings_obj.last_auto_download = now
-                session.commit()
-                
-    except Exception as e:
-        logger.error(f"Error in auto-download check: {e}")
-        session.rollback()
-    finally:
-        session.close()
-
+# Commands that run scheduled jobs themselves
+JOB_COMMANDS = {'catch-up', 'run-scheduler'}
 
 
 def main() -> None:
@@ -208,24 +101,14 @@ def main() -> None:
             else:
                 logger.error(f"Invalid hour {hour}. Must be 0-23.")
 
-        # Check for missed content updates unless skipped
-        if not parsed_args.app_skip_check:
-            try:
-                aggregator = ContentAggregator()
-                results = aggregator.check_and_update_content_for_all_users()
-                if results:
-                    total = sum(results.values())
-                    logger.info(f"Automated update: added {total} items for {len(results)} users")
-                else:
-                    logger.info("No missed updates detected")
-            except Exception as e:
-                logger.error(f"Error checking for missed updates: {e}")
-            
-            # Check for missed auto-downloads
+        # Catch up on missed downloads and digests in a detached process: only a local
+        # check runs here, so commands never wait for network fetches
+        if not parsed_args.app_skip_check and not JOB_COMMANDS & set(sys.argv[1:]):
             try:
-                _check_missed_auto_downloads()
+                if catch_up.start_in_background():
+                    logger.info("Started background catch-up of missed updates")
             except Exception as e:
-                logger.error(f"Error checking for missed auto-downloads: {e}")
+                logger.error(f"Error starting background catch-up: {e}")
 
         # Call Click CLI with standalone_mode=False to handle exceptions here
         cli(standalone_mode=False)